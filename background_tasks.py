@@ -0,0 +1,160 @@
+# background_tasks.py
+import inspect
+import traceback
+
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal, pyqtSlot
+
+from cancellation import CancellationToken, TaskCancelled
+
+
+class WorkerSignals(QObject):
+    """Сигналы для Worker'а"""
+    finished = pyqtSignal(object) # Сигнал завершения с результатом
+    error = pyqtSignal(str)       # Сигнал ошибки
+    cancelled = pyqtSignal()      # Задача остановлена по CancellationToken
+    progress = pyqtSignal(int)    # Сигнал прогресса (0-100)
+    log = pyqtSignal(str, str)    # Сигнал для логирования (message, level)
+    await_user = pyqtSignal(object) # Задача приостановлена до ответа пользователя (AwaitUser)
+    partial_result = pyqtSignal(object, bool) # Промежуточные строки для таблицы (DataFrame, очистить таблицу перед добавлением)
+
+
+class AwaitUser:
+    """
+    Запрос ответа пользователя, на котором приостанавливается фоновая задача-генератор:
+        answer = yield AwaitUser('name_review', данные_для_окна)
+    Worker передает запрос в основной поток сигналом await_user и освобождает поток пула.
+    Основной поток показывает окно и вызывает resolve(ответ): задача сразу продолжается в пуле,
+    ответ становится значением выражения yield. Повторные вызовы resolve игнорируются.
+    """
+
+    def __init__(self, kind, payload=None):
+        self.kind = kind
+        self.payload = payload
+        self._continuation = None
+        self._resolved = False
+
+    def resolve(self, answer=None):
+        if self._resolved:
+            return
+        self._resolved = True
+        if self._continuation is not None:
+            self._continuation(answer)
+
+
+class _TaskRun:
+    """Выполнение задачи-генератора по шагам между запросами AwaitUser."""
+
+    def __init__(self, name, generator, signals, thread_pool):
+        self.name = name
+        self.generator = generator
+        self.signals = signals
+        self.thread_pool = thread_pool
+
+    def step(self, answer=None):
+        """Выполняет задачу до следующего запроса к пользователю или до завершения."""
+        try:
+            request = self.generator.send(answer)
+            if not isinstance(request, AwaitUser):
+                self.generator.close()
+                raise TypeError(f"задача передала через yield {type(request).__name__} вместо AwaitUser")
+        except StopIteration as stop:
+            self.signals.log.emit(f"Задача {self.name} завершена.", "DEBUG")
+            self.signals.finished.emit(stop.value)
+            return
+        except TaskCancelled:
+            _report_cancelled(self.signals, self.name)
+            return
+        except Exception as e:
+            _report_error(self.signals, self.name, e)
+            return
+        request._continuation = self.resume
+        self.signals.log.emit(f"Задача {self.name} ожидает ответа пользователя ({request.kind}).", "DEBUG")
+        self.signals.await_user.emit(request)
+
+    def resume(self, answer):
+        """Продолжает задачу с ответом пользователя в потоке пула (вызывается из основного потока)."""
+        self.thread_pool.start(_TaskContinuation(self, answer))
+
+
+class _TaskContinuation(QRunnable):
+    """Следующий шаг приостановленной задачи в пуле потоков."""
+
+    def __init__(self, task_run, answer):
+        super().__init__()
+        self.task_run = task_run
+        self.answer = answer
+
+    @pyqtSlot()
+    def run(self):
+        self.task_run.step(self.answer)
+
+
+def _report_cancelled(signals, name):
+    signals.log.emit(f"Задача {name} отменена.", "INFO")
+    signals.cancelled.emit()
+
+
+def _report_error(signals, name, e):
+    error_msg = f"Ошибка в фоновой задаче {name}: {e}\n{traceback.format_exc()}"
+    signals.log.emit(error_msg, "ERROR")
+    signals.error.emit(str(e))
+
+
+class Worker(QRunnable):
+    """
+    Исполнитель задач в отдельном потоке.
+    Обычная функция выполняется целиком. Функция-генератор выполняется шагами: на каждом
+    yield AwaitUser(...) поток пула освобождается, а после ответа пользователя задача продолжается
+    в пуле thread_pool (по умолчанию - глобальном). Результат такой задачи - значение ее return.
+    Функции передаются сигналы (параметр signals) и признак отмены (параметр cancel_token),
+    если она их принимает; задача, остановленная по признаку отмены, завершается сигналом cancelled.
+    """
+    def __init__(self, fn, *args, **kwargs):
+        super().__init__()
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = WorkerSignals()
+        self.cancel_token = CancellationToken()
+        self.thread_pool = None # Пул для продолжения приостановленной задачи
+        self._parameters = inspect.signature(fn).parameters
+
+    def accepts(self, name):
+        """Принимает ли функция задачи параметр name (явно или через **kwargs)."""
+        return name in self._parameters or any(param.kind == param.VAR_KEYWORD
+                                               for param in self._parameters.values())
+
+    @property
+    def cancellable(self):
+        """Проверяет ли задача признак отмены (иначе cancel() не остановит ее)."""
+        return self.accepts('cancel_token')
+
+    def cancel(self):
+        self.cancel_token.cancel()
+
+    @pyqtSlot()
+    def run(self):
+        try:
+            self.signals.log.emit(f"Запуск задачи {self.fn.__name__} в фоновом потоке...", "DEBUG")
+            self.cancel_token.check() # Задача могла быть отменена, пока ждала свободного потока
+
+            final_kwargs = self.kwargs.copy()
+            if self.accepts('signals'):
+                final_kwargs['signals'] = self.signals
+            if self.cancellable:
+                final_kwargs['cancel_token'] = self.cancel_token
+
+            result = self.fn(*self.args, **final_kwargs)
+        except TaskCancelled:
+            _report_cancelled(self.signals, self.fn.__name__)
+            return
+        except Exception as e:
+            _report_error(self.signals, self.fn.__name__, e)
+            return
+        if inspect.isgenerator(result):
+            # Первый шаг выполняется в этом же потоке
+            _TaskRun(self.fn.__name__, result, self.signals,
+                     self.thread_pool or QThreadPool.globalInstance()).step()
+            return
+        self.signals.log.emit(f"Задача {self.fn.__name__} завершена.", "DEBUG")
+        self.signals.finished.emit(result)
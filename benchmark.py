@@ -0,0 +1,328 @@
+# benchmark.py
+"""
+Бенчмарк обработки списков сотрудников на синтетических данных.
+
+Генерирует реалистичные списки (ФИО, даты рождения в разных форматах, организации, должности)
+с "грязными" случаями: неразрывные пробелы, двойные дефисы, латинские буквы в кириллических ФИО,
+числовые даты Excel, пустые строки, пропуски обязательных полей. Замеряет этапы DataProcessor
+и обработку файла целиком (чтение пакетами, удаление пустых строк, очистка и валидация) и пишет
+результаты в JSON: время, строк в секунду и пиковую память (tracemalloc, только главный процесс).
+
+Запуск:
+    python benchmark.py                                   # 1k, 10k, 100k, 1M строк
+    python benchmark.py --sizes 1000 10000 --output new.json --compare old.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from data_processing import DataProcessor, ProcessingExecutor, RuleSet, process_data_chunk
+from file_manager import FileManager
+from stage_timings import StageTimings
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+
+# --- Словари для генерации ---
+SURNAMES = [  # (мужская форма, женская форма)
+    ('Иванов', 'Иванова'), ('Смирнов', 'Смирнова'), ('Кузнецов', 'Кузнецова'), ('Попов', 'Попова'),
+    ('Васильев', 'Васильева'), ('Петров', 'Петрова'), ('Соколов', 'Соколова'), ('Михайлов', 'Михайлова'),
+    ('Новиков', 'Новикова'), ('Федоров', 'Федорова'), ('Морозов', 'Морозова'), ('Волков', 'Волкова'),
+    ('Алексеев', 'Алексеева'), ('Лебедев', 'Лебедева'), ('Семенов', 'Семенова'), ('Егоров', 'Егорова'),
+    ('Павлов', 'Павлова'), ('Козлов', 'Козлова'), ('Степанов', 'Степанова'), ('Николаев', 'Николаева'),
+    ('Орлов', 'Орлова'), ('Андреев', 'Андреева'), ('Макаров', 'Макарова'), ('Никитин', 'Никитина'),
+    ('Захаров', 'Захарова'), ('Зайцев', 'Зайцева'), ('Соловьев', 'Соловьева'), ('Борисов', 'Борисова'),
+    ('Яковлев', 'Яковлева'), ('Григорьев', 'Григорьева'), ('Романов', 'Романова'), ('Воробьев', 'Воробьева'),
+    ('Сергеев', 'Сергеева'), ('Фролов', 'Фролова'), ('Александров', 'Александрова'), ('Дмитриев', 'Дмитриева'),
+    ('Королев', 'Королева'), ('Гусев', 'Гусева'), ('Киселев', 'Киселева'), ('Ильин', 'Ильина'),
+    ('Максимов', 'Максимова'), ('Поляков', 'Полякова'), ('Сорокин', 'Сорокина'), ('Виноградов', 'Виноградова'),
+    ('Ковалев', 'Ковалева'), ('Белов', 'Белова'), ('Медведев', 'Медведева'), ('Антонов', 'Антонова'),
+    ('Тарасов', 'Тарасова'), ('Жуков', 'Жукова'), ('Баранов', 'Баранова'), ('Филиппов', 'Филиппова'),
+    ('Комаров', 'Комарова'), ('Давыдов', 'Давыдова'), ('Беляев', 'Беляева'), ('Герасимов', 'Герасимова'),
+    ('Богданов', 'Богданова'), ('Осипов', 'Осипова'), ('Сидоров', 'Сидорова'), ('Матвеев', 'Матвеева'),
+    ('Римский-Корсаков', 'Римская-Корсакова'), ('Петров-Водкин', 'Петрова-Водкина'),
+    ('Островский', 'Островская'), ('Чайковский', 'Чайковская'), ('Толстой', 'Толстая'), ('Ким', 'Ким'),
+]
+MALE_NAMES = ['Александр', 'Дмитрий', 'Максим', 'Сергей', 'Андрей', 'Алексей', 'Артем', 'Илья', 'Кирилл',
+              'Михаил', 'Никита', 'Матвей', 'Роман', 'Егор', 'Иван', 'Владимир', 'Николай', 'Павел',
+              'Олег', 'Юрий', 'Виктор', 'Константин', 'Денис', 'Евгений', 'Игорь', 'Петр']
+FEMALE_NAMES = ['Анна', 'Мария', 'Елена', 'Ольга', 'Наталья', 'Татьяна', 'Ирина', 'Екатерина', 'Светлана',
+                'Юлия', 'Анастасия', 'Дарья', 'Алина', 'Ксения', 'Полина', 'Виктория', 'Марина',
+                'Людмила', 'Галина', 'Валентина', 'Софья', 'Алёна', 'Вера', 'Надежда']
+PATRONYMICS = [  # (мужская форма, женская форма)
+    ('Александрович', 'Александровна'), ('Дмитриевич', 'Дмитриевна'), ('Сергеевич', 'Сергеевна'),
+    ('Андреевич', 'Андреевна'), ('Алексеевич', 'Алексеевна'), ('Михайлович', 'Михайловна'),
+    ('Иванович', 'Ивановна'), ('Владимирович', 'Владимировна'), ('Николаевич', 'Николаевна'),
+    ('Павлович', 'Павловна'), ('Олегович', 'Олеговна'), ('Юрьевич', 'Юрьевна'), ('Викторович', 'Викторовна'),
+    ('Евгеньевич', 'Евгеньевна'), ('Игоревич', 'Игоревна'), ('Петрович', 'Петровна'), ('Ильич', 'Ильинична'),
+    ('Романович', 'Романовна'), ('Константинович', 'Константиновна'), ('Федорович', 'Федоровна'),
+]
+CITIES = ['г. Москва', 'г. Санкт-Петербург', 'г. Новосибирск', 'г. Екатеринбург', 'г. Казань',
+          'г. Нижний Новгород', 'г. Челябинск', 'г. Самара', 'г. Омск', 'г. Ростов-на-Дону', 'г. Уфа',
+          'г. Красноярск', 'г. Воронеж', 'г. Пермь', 'г. Волгоград', 'Московская обл., г. Химки',
+          'Ленинградская обл., г. Гатчина', 'Республика Татарстан, г. Набережные Челны']
+STREETS = ['ул. Ленина', 'ул. Советская', 'ул. Мира', 'пр-т Победы', 'ул. Гагарина', 'ул. Садовая',
+           'ул. Школьная', 'ул. Молодежная', 'Ленинский пр-т', 'ул. Строителей']
+ORGANIZATIONS = ['ООО "Ромашка"', 'АО "Стройинвест"', 'ООО "ТехноСервис"', 'ПАО "Энергосбыт"',
+                 'ООО "Альфа-Монтаж"', 'ИП Сидоров А.В.', 'ГПХ', 'ГПХ (договор подряда)', 'ООО "СК Гарант"',
+                 'АО "Мосэнергоремонт"', 'ООО "ЧОП Щит"', 'ООО "Клининг-Профи"', 'ФГУП "Охрана"']
+POSITIONS = ['Инженер', 'Монтажник', 'Электромонтажник', 'Сварщик', 'Прораб', 'Охранник', 'Водитель',
+             'Уборщик', 'Менеджер', 'Разработчик', 'Системный администратор', 'Аналитик', 'Бухгалтер',
+             'Слесарь-ремонтник', 'Мастер участка', 'Кладовщик', 'Подсобный рабочий']
+
+# Латинские буквы, совпадающие по начертанию с кириллическими
+LOOKALIKES = str.maketrans({'а': 'a', 'е': 'e', 'о': 'o', 'р': 'p', 'с': 'c', 'х': 'x', 'А': 'A', 'В': 'B',
+                            'Е': 'E', 'К': 'K', 'М': 'M', 'Н': 'H', 'О': 'O', 'Р': 'P', 'С': 'C', 'Т': 'T'})
+
+# Доли "грязных" случаев в сгенерированных данных
+DIRTY_SHARES = {
+    'empty_row': 0.01,          # Полностью пустая строка (кроме номера)
+    'nbsp': 0.02,               # Неразрывный пробел в ФИО и организации
+    'double_hyphen': 0.01,      # Двойной дефис в фамилии
+    'lookalike': 0.02,          # Латинские буквы в кириллической фамилии
+    'edge_spaces': 0.02,        # Пробелы по краям и двойные пробелы
+    'missing_name': 0.01,       # Нет имени
+    'missing_organization': 0.01,  # Нет организации
+    'bad_date': 0.01,           # Нераспознаваемая дата или год раньше 1900
+}
+# Форматы дат рождения и их доли
+DATE_FORMATS = {'dotted': 0.45, 'datetime': 0.2, 'excel_serial': 0.15, 'iso': 0.1, 'slashed': 0.1}
+
+EXCEL_EPOCH = np.datetime64('1899-12-30')
+
+
+def generate_people(rows, seed=0):
+    """Генерирует DataFrame со списком из rows сотрудников в формате входного файла."""
+    rng = np.random.default_rng(seed)
+
+    def pick(values, size=rows):
+        return np.array(values, dtype=object)[rng.integers(len(values), size=size)]
+
+    def share(name):
+        return rng.random(rows) < DIRTY_SHARES[name]
+
+    female = rng.random(rows) < 0.5
+    surname_pairs = rng.integers(len(SURNAMES), size=rows)
+    surnames = np.where(female, np.array([f for _, f in SURNAMES], dtype=object)[surname_pairs],
+                        np.array([m for m, _ in SURNAMES], dtype=object)[surname_pairs])
+    names = np.where(female, pick(FEMALE_NAMES), pick(MALE_NAMES))
+    patronymic_pairs = rng.integers(len(PATRONYMICS), size=rows)
+    patronymics = np.where(female, np.array([f for _, f in PATRONYMICS], dtype=object)[patronymic_pairs],
+                           np.array([m for m, _ in PATRONYMICS], dtype=object)[patronymic_pairs])
+
+    df = pd.DataFrame({
+        '№ п/п': np.arange(1, rows + 1),
+        'Фамилия': surnames,
+        'Имя': names,
+        'Отчество': patronymics,
+        'Дата рождения': _birth_dates(rng, rows),
+        'Место рождения': pick(CITIES),
+        'Адрес регистрации': pd.Series(pick(CITIES)) + ', ' + pd.Series(pick(STREETS)) + ', д. '
+                             + pd.Series(rng.integers(1, 150, size=rows)).astype(str),
+        'Организация': pick(ORGANIZATIONS),
+        'Должность': pick(POSITIONS),
+    })
+
+    # --- Грязные случаи ---
+    mask = share('nbsp')
+    df.loc[mask, 'Фамилия'] = df.loc[mask, 'Фамилия'] + '\u00A0'
+    df.loc[mask, 'Организация'] = df.loc[mask, 'Организация'].str.replace(' ', '\u00A0', regex=False)
+    mask = share('double_hyphen')
+    df.loc[mask, 'Фамилия'] = df.loc[mask, 'Фамилия'].str.replace('-', '--', regex=False).where(
+        df.loc[mask, 'Фамилия'].str.contains('-', regex=False), df.loc[mask, 'Фамилия'] + '--Петров')
+    mask = share('lookalike')
+    df.loc[mask, 'Фамилия'] = df.loc[mask, 'Фамилия'].str.translate(LOOKALIKES)
+    mask = share('edge_spaces')
+    df.loc[mask, 'Имя'] = '  ' + df.loc[mask, 'Имя'] + '  '
+    df.loc[mask, 'Отчество'] = df.loc[mask, 'Отчество'].str.replace('ич', 'и  ч', regex=False)
+    df.loc[share('missing_name'), 'Имя'] = None
+    df.loc[share('missing_organization'), 'Организация'] = None
+    mask = share('bad_date')
+    df.loc[mask, 'Дата рождения'] = pick(['31.12.1890', 'нет данных', '00.00.0000', '1850-06-01'],
+                                         size=int(mask.sum()))
+    df.loc[share('empty_row'), df.columns[1:]] = None
+    return df
+
+
+def _birth_dates(rng, rows):
+    """Даты рождения 1955-2005 годов в разных форматах (строки, datetime, числовые даты Excel)."""
+    days = rng.integers(0, (np.datetime64('2005-12-31') - np.datetime64('1955-01-01')).astype(int), size=rows)
+    dates = pd.Series(np.datetime64('1955-01-01') + days.astype('timedelta64[D]'))
+    formats = np.array(list(DATE_FORMATS))[rng.choice(len(DATE_FORMATS), size=rows, p=list(DATE_FORMATS.values()))]
+    values = np.empty(rows, dtype=object)
+    for name, fmt in [('dotted', '%d.%m.%Y'), ('iso', '%Y-%m-%d'), ('slashed', '%d/%m/%Y')]:
+        mask = formats == name
+        values[mask] = dates[mask].dt.strftime(fmt).to_numpy()
+    mask = formats == 'datetime'
+    values[mask] = dates[mask].astype(object).to_numpy()  # pd.Timestamp - подкласс datetime
+    mask = formats == 'excel_serial'
+    values[mask] = (dates[mask].to_numpy().astype('datetime64[D]') - EXCEL_EPOCH).astype(float)
+    return values
+
+
+def write_input_file(df, directory, file_format):
+    """Сохраняет сгенерированный список во входной файл нужного формата."""
+    file_name = os.path.join(directory, f"people_{len(df)}.{file_format}")
+    if file_format == 'xlsx':
+        df.to_excel(file_name, index=False)
+    elif file_format == 'csv':
+        df.to_csv(file_name, index=False, sep=';', encoding='utf-8-sig')
+    elif file_format == 'parquet':
+        df.astype({'Дата рождения': str}).to_parquet(file_name, index=False)
+    else:
+        raise ValueError(f"Неподдерживаемый формат файла: {file_format}")
+    return file_name
+
+
+def process_file(file_name, processor, executor):
+    """Обработка файла целиком, как при загрузке: чтение пакетами, удаление пустых строк, очистка и валидация."""
+    timings = StageTimings()
+    parts = []
+    for batch, _, _ in FileManager().iter_input_batches(file_name, timings=timings):
+        with timings.stage('drop_empty', len(batch)) as stage:
+            batch, _ = processor.drop_empty_rows(batch)
+            stage['rows_out'] = len(batch)
+        if not batch.empty:
+            parts.append(executor.process(batch, timings=timings))
+    return (pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()), timings
+
+
+def measure(func, repeat, track_memory):
+    """Лучшее время из repeat запусков и (отдельным запуском) пиковая память по tracemalloc."""
+    best = None
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    peak_mb = None
+    if track_memory:
+        # Отдельный запуск: tracemalloc заметно замедляет выполнение и не должен влиять на время
+        tracemalloc.start()
+        try:
+            func()
+            peak_mb = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 1)
+        finally:
+            tracemalloc.stop()
+    return best, peak_mb, result
+
+
+def run_benchmarks(sizes, repeat=1, track_memory=True, file_format='xlsx', xlsx_max_rows=200_000, seed=0):
+    """Выполняет все замеры для каждого размера и возвращает список результатов."""
+    processor = DataProcessor()
+    executor = ProcessingExecutor()
+    # Правила отдельных этапов валидации (даты, подозрительные ФИО) замеряются и по отдельности
+    stage_rule_sets = {stage: RuleSet([rule for rule in processor.rules.rules if rule.stage == stage])
+                       for stage in ('dates', 'suspicious_names')}
+    results = []
+    try:
+        with tempfile.TemporaryDirectory(prefix='accr_bench_') as directory:
+            for rows in sizes:
+                print(f"--- {rows} строк ---", flush=True)
+                df = generate_people(rows, seed)
+                cleaned = processor.clean_dataframe(df)
+                benchmarks = [
+                    ('clean_dataframe', lambda: processor.clean_dataframe(df)),
+                    ('validate_data', lambda: processor.validate_data(cleaned)),
+                    ('rules:dates', lambda: stage_rule_sets['dates'].evaluate(cleaned)),
+                    ('rules:suspicious_names', lambda: stage_rule_sets['suspicious_names'].evaluate(cleaned)),
+                    ('process_data_chunk', lambda: process_data_chunk(df)),
+                ]
+                for name, func in benchmarks:
+                    seconds, peak_mb, _ = measure(func, repeat, track_memory)
+                    results.append(_result(name, rows, seconds, peak_mb))
+                    _print_result(results[-1])
+
+                fmt = file_format if file_format != 'xlsx' or rows <= xlsx_max_rows else 'csv'
+                file_name = write_input_file(df, directory, fmt)
+                seconds, peak_mb, (_, timings) = measure(lambda: process_file(file_name, processor, executor),
+                                                         repeat, track_memory)
+                results.append(_result('process_file', rows, seconds, peak_mb, file_format=fmt,
+                                       stages=timings.to_dict()['stages']))
+                _print_result(results[-1])
+                os.remove(file_name)
+    finally:
+        executor.shutdown()
+    return results
+
+
+def _result(name, rows, seconds, peak_mb, **extra):
+    return {'benchmark': name, 'rows': rows, 'seconds': round(seconds, 4),
+            'rows_per_sec': round(rows / seconds) if seconds > 0 else None, 'peak_mb': peak_mb, **extra}
+
+
+def _print_result(result):
+    memory = f", пик {result['peak_mb']} МБ" if result['peak_mb'] is not None else ""
+    print(f"{result['benchmark']:<24} {result['seconds']:>9.3f} с {result['rows_per_sec'] or 0:>10} строк/с{memory}",
+          flush=True)
+
+
+def environment_info():
+    """Сведения об окружении, без которых результаты разных запусков нельзя сравнивать."""
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'processor_version': DataProcessor.VERSION,
+    }
+
+
+def compare(results, previous):
+    """Печатает сравнение с результатами предыдущего запуска (по названию замера и числу строк)."""
+    old = {(r['benchmark'], r['rows']): r for r in previous['results']}
+    print(f"\n{'Замер':<24} {'Строк':>9} {'Было, с':>9} {'Стало, с':>9} {'Ускорение':>10}")
+    for result in results:
+        before = old.get((result['benchmark'], result['rows']))
+        if before and result['seconds']:
+            print(f"{result['benchmark']:<24} {result['rows']:>9} {before['seconds']:>9.3f} "
+                  f"{result['seconds']:>9.3f} {before['seconds'] / result['seconds']:>9.2f}x")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарк обработки списков сотрудников на синтетических данных.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="Размеры списков в строках")
+    parser.add_argument('--repeat', type=int, default=1, help="Число запусков каждого замера (берется лучшее время)")
+    parser.add_argument('--file-format', choices=['xlsx', 'csv', 'parquet'], default='xlsx',
+                        help="Формат входного файла для замера обработки файла целиком")
+    parser.add_argument('--xlsx-max-rows', type=int, default=200_000,
+                        help="Списки больше этого размера сохраняются в CSV вместо xlsx (запись xlsx слишком долгая)")
+    parser.add_argument('--no-memory', action='store_true', help="Не замерять пиковую память")
+    parser.add_argument('--seed', type=int, default=0, help="Зерно генератора данных")
+    parser.add_argument('--output', default='benchmark_results.json', help="Файл для результатов в JSON")
+    parser.add_argument('--compare', help="JSON с результатами предыдущего запуска для сравнения")
+    parser.add_argument('--verbose', action='store_true', help="Не отключать журнал обработки")
+    args = parser.parse_args(argv)
+
+    if not args.verbose:
+        # Журнал обработки (предупреждение на каждую нераспознанную дату) искажает замеры
+        logging.disable(logging.WARNING)
+        warnings.filterwarnings('ignore', category=UserWarning)
+
+    results = run_benchmarks(args.sizes, repeat=max(1, args.repeat), track_memory=not args.no_memory,
+                             file_format=args.file_format, xlsx_max_rows=args.xlsx_max_rows, seed=args.seed)
+    report = {'environment': environment_info(), 'seed': args.seed, 'results': results}
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\nРезультаты сохранены в {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,67 @@
+# cancellation.py
+import threading
+from contextlib import contextmanager
+
+from config import get_logger
+
+
+class TaskCancelled(BaseException):
+    """
+    Фоновая задача остановлена пользователем.
+    Наследуется от BaseException (как asyncio.CancelledError), чтобы обработчики except Exception
+    внутри задачи не принимали отмену за ошибку и не продолжали работу.
+    """
+
+
+class CancellationToken:
+    """
+    Признак отмены фоновой задачи. Задача проверяет его в контрольных точках (между пакетами,
+    чанками и строками) через check() или cancelled. cancel() вызывается из любого потока: отмечает токен
+    и вызывает привязанные обработчики - отмену выполняющихся запросов БД, остановку пула процессов.
+    """
+
+    def __init__(self):
+        self.logger = get_logger(__name__)
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                self.logger.exception("Ошибка обработчика отмены задачи.")
+
+    def check(self):
+        """Прерывает задачу исключением TaskCancelled, если она отменена."""
+        if self._event.is_set():
+            raise TaskCancelled()
+
+    @contextmanager
+    def linked(self, callback):
+        """
+        На время блока привязывает callback к отмене: он будет вызван при отмене токена
+        (сразу, если токен уже отменен). После блока callback отвязывается.
+        """
+        with self._lock:
+            run_now = self._event.is_set()
+            if not run_now:
+                self._callbacks.append(callback)
+        if run_now:
+            callback()
+        try:
+            yield
+        finally:
+            with self._lock:
+                if callback in self._callbacks:
+                    self._callbacks.remove(callback)
@@ -26,6 +26,14 @@ def get_logger(name):
     """Возвращает настроенный логгер."""
     return logging.getLogger(name)
 
+def _env_int(env_name, default, minimum=0):
+    """Целое число из переменной окружения, не меньше minimum; при неверном значении - default с предупреждением."""
+    try:
+        return max(minimum, int(os.getenv(env_name, default)))
+    except (ValueError, TypeError):
+        get_logger(__name__).warning(f"Неверное значение для {env_name}: {os.getenv(env_name)}. Используется {default}.")
+        return default
+
 def get_scheduler_output_dir():
     """Возвращает путь к папке для вывода файлов планировщика."""
     default_dir = os.path.join(os.getcwd(), "scheduler_output") # По умолчанию папка в корне проекта
@@ -33,6 +41,135 @@ def get_scheduler_output_dir():
     # Можно добавить проверку существования и создание папки здесь или в планировщике
     return output_dir
 
+def get_processing_config():
+    """
+    Загружает настройки пула обработки файлов из .env.
+    PROC_WORKERS - число процессов пула (по умолчанию: число ядер - 1),
+    PROC_MIN_ROWS_FOR_POOL - минимальное число строк, с которого имеет смысл пул,
+    PROC_CHUNKS_PER_WORKER - сколько чанков приходится на один процесс,
+    PROC_MIN_CHUNK_ROWS - минимальный размер чанка в строках.
+    """
+    defaults = {
+        'workers': max(1, (os.cpu_count() or 2) - 1),
+        'min_rows_for_pool': 2000,
+        'chunks_per_worker': 4,
+        'min_chunk_rows': 250,
+    }
+    return {key: _env_int(f'PROC_{key.upper()}', default, minimum=1) for key, default in defaults.items()}
+
+def get_ingest_config():
+    """
+    Загружает настройки потокового чтения входных файлов из .env.
+    INGEST_BATCH_ROWS - размер пакета строк, который сразу передается в обработку.
+    """
+    return {'batch_rows': _env_int('INGEST_BATCH_ROWS', 5000, minimum=1)}
+
+def get_result_cache_config():
+    """
+    Загружает настройки кэша результатов обработки файлов из .env.
+    RESULT_CACHE_DIR - папка кэша (по умолчанию - пользовательская папка кэша ОС),
+    RESULT_CACHE_MAX_MB - предельный размер кэша в МБ (0 - кэш отключен),
+    RESULT_CACHE_STATUS_TTL_MIN - сколько минут статусы БД неизмененных строк считаются актуальными
+    при повторной загрузке файла (0 - статусы всегда проверяются заново).
+    """
+    if os.name == 'nt':
+        base_dir = os.getenv('LOCALAPPDATA') or os.path.join(os.path.expanduser('~'), 'AppData', 'Local')
+    else:
+        base_dir = os.getenv('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    default_dir = os.path.join(base_dir, 'AccreditationApp', 'results')
+    max_mb = _env_int('RESULT_CACHE_MAX_MB', 512)
+    status_ttl_min = _env_int('RESULT_CACHE_STATUS_TTL_MIN', 30)
+    return {'dir': os.getenv('RESULT_CACHE_DIR', default_dir), 'max_bytes': max_mb * 1024 * 1024,
+            'status_ttl_sec': status_ttl_min * 60}
+
+def get_stage_timings_config():
+    """
+    Загружает настройки записи замеров этапов загрузки из .env.
+    STAGE_TIMINGS_FILE - файл, в который дописываются замеры каждой загрузки (по строке JSON);
+    если не задан, замеры только выводятся в лог.
+    """
+    return {'file': os.getenv('STAGE_TIMINGS_FILE') or None}
+
+def get_validation_rules_config():
+    """
+    Загружает настройки правил валидации из .env.
+    VALIDATION_RULES_FILE - JSON-файл с дополнительными правилами (список объектов с полями type, name
+    и параметрами правила: required, regex, range, length или cross). Если не задан - только встроенные правила.
+    """
+    logger = get_logger(__name__)
+    rules_file = os.getenv('VALIDATION_RULES_FILE') or None
+    if rules_file and not os.path.isfile(rules_file):
+        logger.warning(f"Файл правил валидации не найден: {rules_file}. Используются только встроенные правила.")
+        rules_file = None
+    return {'rules_file': rules_file}
+
+def get_status_check_config():
+    """
+    Загружает настройки проверки статусов сотрудников в БД при загрузке файла из .env.
+    STATUS_CHECK_MODE - snapshot (снимок всех личностей БД и сопоставление в памяти, по умолчанию)
+    или query (отдельный запрос к БД на каждую строку),
+    STATUS_SNAPSHOT_FULL_REFRESH_MIN - через сколько минут снимок загружается заново целиком
+    (в промежутке дозагружаются только измененные записи),
+    STATUS_SNAPSHOT_OVERLAP_SEC - на сколько секунд раньше предыдущего снимка начинается дозагрузка
+    (запас на расхождение часов клиентов и незавершенные транзакции).
+    """
+    logger = get_logger(__name__)
+    mode = os.getenv('STATUS_CHECK_MODE', 'snapshot').strip().lower()
+    if mode not in ('snapshot', 'query'):
+        logger.warning(f"Неверное значение для STATUS_CHECK_MODE: {mode}. Используется snapshot.")
+        mode = 'snapshot'
+    return {'mode': mode,
+            'full_refresh_min': _env_int('STATUS_SNAPSHOT_FULL_REFRESH_MIN', 60),
+            'overlap_sec': _env_int('STATUS_SNAPSHOT_OVERLAP_SEC', 300)}
+
+def get_search_config():
+    """
+    Загружает настройки поиска сотрудников по мере ввода из .env.
+    SEARCH_DEBOUNCE_MS - пауза после последнего нажатия клавиши, после которой запускается поиск,
+    SEARCH_LOCAL_MAX_LEN - запросы до этой длины, продолжающие предыдущий запрос, фильтруются
+    по его результатам без обращения к БД,
+    SEARCH_STATEMENT_TIMEOUT_MS - предельное время запроса поиска в БД (0 - без ограничения),
+    SEARCH_PAGE_SIZE - число строк, догружаемых при прокрутке результатов поиска до конца
+    (первая страница подбирается по высоте таблицы),
+    SEARCH_EXACT_COUNT_MAX - до какой оценки числа результатов оно уточняется запросом COUNT
+    (при большей оценке показывается приблизительное число).
+    """
+    return {
+        'debounce_ms': _env_int('SEARCH_DEBOUNCE_MS', 300),
+        'local_max_len': _env_int('SEARCH_LOCAL_MAX_LEN', 3),
+        'statement_timeout_ms': _env_int('SEARCH_STATEMENT_TIMEOUT_MS', 5000),
+        'page_size': _env_int('SEARCH_PAGE_SIZE', 500, minimum=1),
+        'exact_count_max': _env_int('SEARCH_EXACT_COUNT_MAX', 20000),
+    }
+
+def get_notes_cache_config():
+    """
+    Загружает настройки кэша примечаний сотрудников из .env.
+    NOTES_CACHE_SIZE - сколько сотрудников хранится в кэше (0 - кэш отключен),
+    NOTES_CACHE_TTL_SEC - через сколько секунд примечание считается устаревшим и читается из БД
+    заново (их могут изменить другие пользователи; 0 - без ограничения),
+    NOTES_PREFETCH_ROWS - сколько строк выше и ниже видимой части таблицы загружается заранее.
+    """
+    return {
+        'max_entries': _env_int('NOTES_CACHE_SIZE', 5000),
+        'ttl_sec': _env_int('NOTES_CACHE_TTL_SEC', 300),
+        'prefetch_rows': _env_int('NOTES_PREFETCH_ROWS', 50),
+    }
+
+def get_message_bus_config():
+    """
+    Загружает настройки передачи логов и прогресса фоновых задач в окно из .env.
+    LOG_FLUSH_MS - как часто накопленные строки лога добавляются в окно одной порцией,
+    PROGRESS_MAX_PER_SEC - не больше скольких обновлений прогресса в секунду показывается
+    (промежуточные значения пропускаются, последнее показывается всегда),
+    LOG_VIEW_MAX_LINES - сколько последних строк хранит лог в окне (полный лог - в файле).
+    """
+    return {
+        'flush_ms': _env_int('LOG_FLUSH_MS', 100, minimum=1),
+        'progress_max_per_sec': _env_int('PROGRESS_MAX_PER_SEC', 10, minimum=1),
+        'max_lines': _env_int('LOG_VIEW_MAX_LINES', 5000, minimum=1),
+    }
+
 def get_db_config():
     logger = get_logger(__name__)
     config = {
@@ -56,6 +193,16 @@ def get_db_config():
     logger.info(f"Конфигурация БД загружена: host={config['host']}, port={config['port']}, dbname={config['database']}, user={config['user']}")
     return config
 
+def get_load_test_db_config():
+    """
+    Конфигурация БД для нагрузочного теста (db_load_test.py).
+    Параметры подключения те же, что у основной БД (DB_USER, DB_PASSWORD, DB_HOST, DB_PORT),
+    но база отдельная: LOADTEST_DB_NAME (по умолчанию accr_loadtest). Тест очищает ее таблицы.
+    """
+    config = get_db_config()
+    config['database'] = os.getenv('LOADTEST_DB_NAME', 'accr_loadtest')
+    return config
+
 def get_schedule_config(job_name_prefix, default_hour, default_minute, default_day_of_week=None):
     """
     Загружает настройки cron (час, минута, день недели) для задачи из .env.
@@ -1,63 +1,783 @@
 # data_processing.py
+from abc import ABC, abstractmethod
 from datetime import datetime, date
 
+import hashlib
+import json
+import numpy as np
 import pandas as pd
 import re
+import threading
+import time
 import unicodedata
 import logging
-from config import get_logger
+from multiprocessing import Pool, TimeoutError as PoolTimeoutError
+from config import get_logger, get_processing_config, get_validation_rules_config
+from stage_timings import StageTimings
 
+# Экземпляр DataProcessor, создаваемый один раз на процесс (в процессах пула - через инициализатор)
+_worker_processor = None
 
-def process_data_chunk(df_chunk):
+
+def _init_worker():
+    """Инициализатор процесса пула: создает DataProcessor один раз на весь срок жизни процесса."""
+    global _worker_processor
+    _worker_processor = DataProcessor()
+
+
+def _get_processor():
+    """Возвращает DataProcessor текущего процесса, создавая его при первом обращении."""
+    global _worker_processor
+    if _worker_processor is None:
+        _worker_processor = DataProcessor()
+    return _worker_processor
+
+
+def _warmup_worker():
+    """Пустая задача для прогрева пула (заставляет процесс выполнить импорт и инициализацию)."""
+    return True
+
+
+def process_data_chunk(df_chunk, timings=None):
     """
     Функция, которая выполняет ПОЛНУЮ очистку и валидацию одного чанка DataFrame.
-    Эта функция будет выполняться в отдельном процессе.
+    Может выполняться как в процессе пула, так и в текущем процессе.
+    timings (StageTimings) - куда добавить замеры этапов очистки и валидации.
     """
-    # Создаем экземпляр процессора внутри функции для каждого процесса
-    processor = DataProcessor()
+    timings = timings if timings is not None else StageTimings()
+    # DataProcessor создается один раз на процесс, а не на каждый чанк
+    processor = _get_processor()
 
     # Последовательно применяем все шаги обработки:
 
     # 1. Очистка строк
-    df_cleaned = processor.clean_dataframe(df_chunk)
+    with timings.stage('clean', len(df_chunk)):
+        df_cleaned = processor.clean_dataframe(df_chunk)
+
+    # 2. Проверка набором правил валидации (создает колонки 'Validation_Errors' и 'Name_Check_Required')
+    df_validated_fields = processor.validate_data(df_cleaned, timings)
+
+    # Возвращаем полностью обработанный чанк
+    return df_validated_fields
+
+
+def process_timed_chunk(df_chunk):
+    """Обрабатывает чанк в процессе пула и возвращает (обработанный чанк, замеры этапов)."""
+    timings = StageTimings()
+    return process_data_chunk(df_chunk, timings), timings.stages
+
+
+def chunk_bounds(rows, num_chunks):
+    """Делит rows строк на num_chunks последовательных диапазонов [start, stop)."""
+    num_chunks = max(1, min(num_chunks, rows))
+    bounds = [round(i * rows / num_chunks) for i in range(num_chunks + 1)]
+    return [(bounds[i], bounds[i + 1]) for i in range(num_chunks)]
 
-    # 2. Валидация обязательных полей (создает колонку 'Validation_Errors')
-    df_validated_fields = processor.validate_data(df_cleaned)
 
-    # 3. Валидация дат (добавляет ошибки в ту же колонку 'Validation_Errors')
-    date_errors = processor.validate_dates(df_validated_fields, min_year=1900)
-    for idx, error_msg in date_errors.items():
-        current_errors = df_validated_fields.loc[idx, 'Validation_Errors']
-        if pd.isna(current_errors):
-            df_validated_fields.loc[idx, 'Validation_Errors'] = error_msg
+class ProcessingExecutor:
+    """
+    Долгоживущий исполнитель обработки файлов (очистка и валидация).
+    Пул процессов создается лениво при первой необходимости и переиспользуется между загрузками.
+    Для каждого файла по числу строк и измеренной стоимости решается,
+    обрабатывать его в текущем процессе или распределить по пулу.
+    """
+    # Оценка запуска пула до первого замера (spawn на Windows + импорт pandas в каждом процессе)
+    DEFAULT_POOL_STARTUP_SEC = 3.0
+    # Накладные расходы пула на один чанк (передача данных, планирование)
+    CHUNK_OVERHEAD_SEC = 0.02
+    # Как часто ожидание результатов пула прерывается для проверки признака отмены
+    CANCEL_POLL_SEC = 0.1
+
+    def __init__(self, config=None):
+        self.logger = get_logger(__name__)
+        self.config = config or get_processing_config()
+        self._pool = None
+        self._lock = threading.Lock()
+        self._sec_per_row = None  # Скользящая оценка стоимости обработки одной строки
+        self._pool_startup_sec = None  # Измеренное время запуска пула
+
+    def _get_pool(self):
+        """Возвращает пул процессов, создавая его при первом обращении."""
+        with self._lock:
+            if self._pool is None:
+                start = time.perf_counter()
+                self._pool = Pool(processes=self.config['workers'], initializer=_init_worker)
+                # Дожидаемся готовности хотя бы одного процесса, чтобы измерить стоимость запуска
+                self._pool.apply(_warmup_worker)
+                self._pool_startup_sec = time.perf_counter() - start
+                self.logger.info(f"Пул обработки запущен: {self.config['workers']} процессов "
+                                 f"за {self._pool_startup_sec:.2f} с.")
+            return self._pool
+
+    def _update_cost(self, rows, cpu_seconds):
+        """Обновляет скользящую оценку стоимости обработки строки."""
+        if rows <= 0:
+            return
+        sample = cpu_seconds / rows
+        self._sec_per_row = sample if self._sec_per_row is None else 0.7 * self._sec_per_row + 0.3 * sample
+
+    def _num_chunks(self, rows, workers):
+        """Число чанков: несколько на процесс для балансировки, но не мельче min_chunk_rows."""
+        by_size = max(1, rows // self.config['min_chunk_rows'])
+        return max(1, min(workers * self.config['chunks_per_worker'], by_size))
+
+    def should_use_pool(self, rows):
+        """Решает, выгоднее ли обработать rows строк в пуле, чем в текущем процессе."""
+        workers = self.config['workers']
+        if workers < 2 or rows < self.config['min_rows_for_pool']:
+            return False
+        if self._sec_per_row is None:
+            return True  # Стоимость еще не измерена, файл достаточно большой
+        local_estimate = rows * self._sec_per_row
+        startup = 0.0
+        if self._pool is None:
+            startup = self._pool_startup_sec or self.DEFAULT_POOL_STARTUP_SEC
+        pool_estimate = (startup + local_estimate / workers
+                         + self._num_chunks(rows, workers) * self.CHUNK_OVERHEAD_SEC)
+        return pool_estimate < local_estimate
+
+    def process(self, df, progress_callback=None, timings=None, cancel_token=None):
+        """
+        Очищает и валидирует DataFrame целиком. Возвращает обработанный DataFrame с новым индексом.
+        progress_callback(fraction) вызывается по мере готовности чанков (fraction от 0 до 1).
+        timings (StageTimings) - куда добавить замеры: этап 'process' (общее время) и этапы чанков.
+        В пуле время этапов чанков суммируется по всем процессам и может превышать время 'process'.
+        cancel_token (CancellationToken) - проверяется между чанками; при отмене обработки в пуле
+        процессы пула останавливаются (при следующей обработке пул запускается заново). Отмена - TaskCancelled.
+        """
+        timings = timings if timings is not None else StageTimings()
+        rows = len(df)
+        if rows == 0:
+            return process_data_chunk(df, timings).reset_index(drop=True)
+
+        use_pool = self.should_use_pool(rows)
+        workers = self.config['workers'] if use_pool else 1
+        bounds = chunk_bounds(rows, self._num_chunks(rows, workers))
+        self.logger.info(f"Обработка {rows} строк: {'пул из ' + str(workers) + ' процессов' if use_pool else 'в текущем процессе'}, "
+                         f"чанков: {len(bounds)}.")
+
+        if use_pool:
+            pool = self._get_pool()
+            start = time.perf_counter()  # Время запуска пула не входит в стоимость строк
+            result = self._process_in_pool(pool, df, bounds, progress_callback, timings, cancel_token)
         else:
-            df_validated_fields.loc[idx, 'Validation_Errors'] += f"; {error_msg}"
+            start = time.perf_counter()
+            processed_chunks = []
+            for i, (chunk_start, chunk_stop) in enumerate(bounds, start=1):
+                if cancel_token is not None:
+                    cancel_token.check()
+                processed_chunks.append(process_data_chunk(df.iloc[chunk_start:chunk_stop], timings))
+                if progress_callback:
+                    progress_callback(i / len(bounds))
+            result = pd.concat(processed_chunks, ignore_index=True)
+
+        elapsed = time.perf_counter() - start
+        timings.add('process', elapsed, rows, len(result))
+        self._update_cost(rows, elapsed * workers)
+        self.logger.info(f"Обработка {rows} строк заняла {elapsed:.2f} с.")
+        return result
+
+    def _pool_results(self, results, count, cancel_token):
+        """
+        Результаты pool.imap по мере готовности. Ожидание прерывается каждые CANCEL_POLL_SEC для проверки
+        признака отмены: при отмене чанки в процессах не дорабатываются - пул останавливается.
+        """
+        timeout = self.CANCEL_POLL_SEC if cancel_token is not None else None
+        for _ in range(count):
+            while True:
+                if cancel_token is not None and cancel_token.cancelled:
+                    self.logger.info("Обработка отменена, пул процессов останавливается.")
+                    self.shutdown()
+                    cancel_token.check()
+                try:
+                    result = results.next(timeout=timeout)
+                except PoolTimeoutError:
+                    continue
+                yield result
+                break
+
+    def _process_in_pool(self, pool, df, bounds, progress_callback, timings, cancel_token=None):
+        """Обработка в пуле: чанки передаются процессам и возвращаются обычным способом (pickle)."""
+        chunks = [df.iloc[chunk_start:chunk_stop] for chunk_start, chunk_stop in bounds]
+        processed_chunks = []
+        results = self._pool_results(pool.imap(process_timed_chunk, chunks, chunksize=1), len(chunks), cancel_token)
+        for i, (chunk_result, chunk_timings) in enumerate(results, start=1):
+            processed_chunks.append(chunk_result)
+            timings.merge(chunk_timings)
+            if progress_callback:
+                progress_callback(i / len(bounds))
+        return pd.concat(processed_chunks, ignore_index=True)
+
+    def shutdown(self):
+        """Останавливает пул процессов (если он был запущен)."""
+        with self._lock:
+            if self._pool is not None:
+                self._pool.terminate()
+                self._pool.join()
+                self._pool = None
+                self.logger.info("Пул обработки остановлен.")
+
+
+class _RuleContext:
+    """
+    Общие для всех правил представления колонок одного DataFrame (вычисляются один раз за проход).
+    Значения индексируются позицией строки, чтобы маски правил собирались в numpy-массивы.
+    """
 
-    # 4. Поиск подозрительных имен (создает колонку 'Name_Check_Required')
-    suspicious_indices = processor.detect_unusual_names(df_validated_fields)
-    df_validated_fields['Name_Check_Required'] = False
-    if suspicious_indices:
-        # Устанавливаем флаг для подозрительных строк
-        df_validated_fields.loc[suspicious_indices, 'Name_Check_Required'] = True
+    def __init__(self, df, forbid_patterns):
+        self.df = df
+        self.rows = len(df)
+        self._forbid_patterns = forbid_patterns  # {колонка: объединенный паттерн запрещающих regex-правил}
+        self._strings = {}
+        self._candidates = {}
+        self._dates = {}
+
+    def _positions(self, mask):
+        return np.flatnonzero(mask)
+
+    def column(self, col):
+        """Колонка df; при повторяющихся названиях проверяется первая из них."""
+        values = self.df[col]
+        return values.iloc[:, 0] if isinstance(values, pd.DataFrame) else values
+
+    def strings(self, col):
+        """Строковые значения колонки (пропуски и значения других типов исключены)."""
+        if col not in self._strings:
+            values = self.column(col)
+            kind = pd.api.types.infer_dtype(values, skipna=True)
+            if kind == 'string':
+                is_str = values.notna().to_numpy()
+            elif kind == 'empty':
+                is_str = np.zeros(self.rows, dtype=bool)
+            else:
+                is_str = np.fromiter((isinstance(value, str) for value in values), dtype=bool, count=self.rows)
+            self._strings[col] = pd.Series(values.to_numpy()[is_str], index=self._positions(is_str), dtype=object)
+        return self._strings[col]
+
+    def candidates(self, col):
+        """
+        Строки колонки, в которых найден хотя бы один запрещенный паттерн.
+        Все запрещающие regex-правила колонки проверяются одним объединенным паттерном за один проход;
+        отдельные правила затем проверяются только на этих (обычно немногочисленных) строках.
+        """
+        if col not in self._candidates:
+            strings = self.strings(col)
+            self._candidates[col] = strings[strings.str.contains(self._forbid_patterns[col], regex=True)]
+        return self._candidates[col]
+
+    def dates(self, col):
+        """
+        Значения-даты колонки: (позиции строк, numpy datetime64[D]). Пропуски и значения других типов исключены.
+        datetime64[D] покрывает любые годы, в отличие от pandas Timestamp.
+        """
+        if col not in self._dates:
+            values = self.column(col)
+            is_date = np.fromiter((isinstance(value, (date, datetime)) for value in values),
+                                  dtype=bool, count=self.rows)
+            dates = np.array(values.to_numpy()[is_date].tolist(), dtype='datetime64[D]')
+            self._dates[col] = (self._positions(is_date), dates)
+        return self._dates[col]
+
+
+class ValidationRule(ABC):
+    """
+    Правило валидации - предикат над колонками DataFrame. evaluate возвращает маску нарушивших правило строк
+    (правило без evaluate создать нельзя - TypeError при создании).
+    target определяет, куда попадает нарушение: 'error' - сообщение в Validation_Errors,
+    'check' - флаг ручной проверки ФИО (Name_Check_Required). stage - этап, к которому относится
+    время проверки правила в замерах загрузки.
+    """
+    TARGETS = ('error', 'check')
+    # Подстановки, доступные в сообщении правила, с пробными значениями для проверки шаблона
+    MESSAGE_FIELDS = {'column': ''}
+
+    def __init__(self, name, columns, message=None, target='error', stage='validate'):
+        if target not in self.TARGETS:
+            raise ValueError(f"Правило '{name}': неизвестное назначение '{target}'.")
+        self.name = name
+        self.columns = list(columns)
+        self.message = message or f"Нарушено правило '{name}'"
+        self.target = target
+        self.stage = stage
+
+    @abstractmethod
+    def evaluate(self, ctx):
+        """Маска строк ctx, нарушивших правило."""
+
+    def column_masks(self, ctx):
+        """Маски нарушений по колонкам правила: {колонка: маска}. По умолчанию нарушение относится ко всем колонкам."""
+        mask = self.evaluate(ctx)
+        return {column: mask for column in self.columns}
+
+    def description(self):
+        """Описание правила для пользователя (сообщение без подстановки значений строки)."""
+        try:
+            return self.message.format(column=', '.join(self.columns))
+        except (KeyError, IndexError, ValueError):
+            return self.name
+
+    def messages(self, ctx, mask):
+        """Сообщение для нарушивших правило строк: одна строка или массив по строкам mask."""
+        return self.message.format(column=self.columns[0] if self.columns else '')
+
+    def templates(self):
+        """Шаблоны сообщений правила."""
+        return [self.message]
+
+    def check(self):
+        """
+        Проверяет правило до применения: шаблоны сообщений должны использовать только подстановки MESSAGE_FIELDS.
+        Некорректное правило - ValueError.
+        """
+        for template in self.templates():
+            try:
+                template.format(**self.MESSAGE_FIELDS)
+            except (KeyError, IndexError, ValueError) as e:
+                raise ValueError(f"Правило '{self.name}': некорректный шаблон сообщения '{template}' ({e!r}), "
+                                 f"доступны подстановки: {', '.join('{' + field + '}' for field in self.MESSAGE_FIELDS)}.")
+
+
+class RequiredRule(ValidationRule):
+    """Значение обязательно: пропуск, пустая строка или 'nan' - нарушение. Отсутствие колонки - нарушение во всех строках."""
+
+    def __init__(self, name, column, message="Отсутствует '{column}'",
+                 missing_column_message="Отсутствует колонка '{column}'", target='error', stage='validate'):
+        super().__init__(name, [column], message, target, stage)
+        self.missing_column_message = missing_column_message
+
+    def evaluate(self, ctx):
+        column = self.columns[0]
+        if column not in ctx.df.columns:
+            return np.ones(ctx.rows, dtype=bool)
+        values = ctx.column(column)
+        mask = values.isna().to_numpy()
+        present = values[~mask]
+        texts = present.astype(str).str.strip()
+        mask[~mask] = texts.isin(['', 'nan']).to_numpy()
+        return mask
+
+    def messages(self, ctx, mask):
+        template = self.message if self.columns[0] in ctx.df.columns else self.missing_column_message
+        return template.format(column=self.columns[0])
+
+    def templates(self):
+        return [self.message, self.missing_column_message]
+
+
+class RegexRule(ValidationRule):
+    """
+    Регулярное выражение по строковым значениям колонок.
+    mode='forbid' - нарушение, если паттерн найден; mode='require' - нарушение, если значение не совпадает с паттерном целиком.
+    """
+    MODES = ('forbid', 'require')
+
+    def __init__(self, name, columns, pattern, mode='forbid', ignore_case=False, message=None, target='error', stage='validate'):
+        super().__init__(name, columns, message, target, stage)
+        if mode not in self.MODES:
+            raise ValueError(f"Правило '{name}': неизвестный режим '{mode}'.")
+        self.mode = mode
+        self.pattern = re.compile(pattern, re.IGNORECASE if ignore_case else 0)
+
+    def inline_pattern(self):
+        """Паттерн в виде группы для объединения с паттернами других правил."""
+        flags = 'i' if self.pattern.flags & re.IGNORECASE else ''
+        return f"(?{flags}:{self.pattern.pattern})" if flags else f"(?:{self.pattern.pattern})"
+
+    def evaluate(self, ctx):
+        mask = np.zeros(ctx.rows, dtype=bool)
+        for column_mask in self.column_masks(ctx).values():
+            mask |= column_mask
+        return mask
+
+    def column_masks(self, ctx):
+        masks = {}
+        for column in self.columns:
+            if column not in ctx.df.columns:
+                continue
+            if self.mode == 'forbid':
+                values = ctx.candidates(column)
+                hits = values.str.contains(self.pattern, regex=True)
+            else:
+                values = ctx.strings(column)
+                hits = ~values.str.fullmatch(self.pattern)
+            mask = np.zeros(ctx.rows, dtype=bool)
+            mask[values.index[hits.to_numpy(dtype=bool)]] = True
+            masks[column] = mask
+        return masks
+
+
+class RangeRule(ValidationRule):
+    """
+    Значение колонки должно лежать в диапазоне [min_value, max_value].
+    part='year' - сравнивается год значений-дат; иначе значения приводятся к числу (нечисловые пропускаются).
+    В сообщении доступны {column}, {value}, {min}, {max}.
+    """
+    PARTS = (None, 'year')
+    MESSAGE_FIELDS = {'column': '', 'value': 0, 'min': 0, 'max': 0}
+
+    def __init__(self, name, column, min_value=None, max_value=None, part=None, message=None, target='error', stage='validate'):
+        super().__init__(name, [column], message, target, stage)
+        if part not in self.PARTS:
+            raise ValueError(f"Правило '{name}': неизвестная часть значения '{part}'.")
+        if min_value is None and max_value is None:
+            raise ValueError(f"Правило '{name}': не задана ни нижняя, ни верхняя граница.")
+        self.min_value = min_value
+        self.max_value = max_value
+        self.part = part
+
+    def _values(self, ctx):
+        column = self.columns[0]
+        if self.part == 'year':
+            positions, dates = ctx.dates(column)
+            years = dates.astype('datetime64[Y]').astype(np.int64) + 1970
+            return pd.Series(years, index=positions)
+        values = pd.to_numeric(ctx.column(column), errors='coerce').reset_index(drop=True)
+        return values[values.notna()]
+
+    def evaluate(self, ctx):
+        mask = np.zeros(ctx.rows, dtype=bool)
+        if self.columns[0] not in ctx.df.columns:
+            return mask
+        values = self._values(ctx)
+        out_of_range = np.zeros(len(values), dtype=bool)
+        if self.min_value is not None:
+            out_of_range |= (values < self.min_value).to_numpy()
+        if self.max_value is not None:
+            out_of_range |= (values > self.max_value).to_numpy()
+        mask[values.index[out_of_range]] = True
+        return mask
+
+    def messages(self, ctx, mask):
+        if '{value}' not in self.message:
+            return self.message.format(column=self.columns[0], min=self.min_value, max=self.max_value)
+        values = self._values(ctx).reindex(np.flatnonzero(mask))
+        return np.array([self.message.format(column=self.columns[0], value=value, min=self.min_value,
+                                             max=self.max_value) for value in values.tolist()], dtype=object)
+
+
+class LengthRule(ValidationRule):
+    """
+    Длина строкового значения должна лежать в диапазоне [min_length, max_length]. Пропуски не проверяются.
+    В сообщении доступны {column}, {min}, {max}.
+    """
+    MESSAGE_FIELDS = {'column': '', 'min': 0, 'max': 0}
+
+    def __init__(self, name, column, min_length=None, max_length=None, message=None, target='error', stage='validate'):
+        super().__init__(name, [column], message, target, stage)
+        if min_length is None and max_length is None:
+            raise ValueError(f"Правило '{name}': не задана ни минимальная, ни максимальная длина.")
+        self.min_length = min_length
+        self.max_length = max_length
+
+    def evaluate(self, ctx):
+        mask = np.zeros(ctx.rows, dtype=bool)
+        if self.columns[0] not in ctx.df.columns:
+            return mask
+        strings = ctx.strings(self.columns[0])
+        lengths = strings.str.len().to_numpy()
+        out_of_range = np.zeros(len(lengths), dtype=bool)
+        if self.min_length is not None:
+            out_of_range |= lengths < self.min_length
+        if self.max_length is not None:
+            out_of_range |= lengths > self.max_length
+        mask[strings.index[out_of_range]] = True
+        return mask
+
+    def messages(self, ctx, mask):
+        return self.message.format(column=self.columns[0], min=self.min_length, max=self.max_length)
+
+
+class CrossColumnRule(ValidationRule):
+    """
+    Правило над несколькими колонками: predicate(df) или выражение DataFrame.eval (колонки в `обратных кавычках`)
+    возвращает маску нарушений. Если какой-то из колонок нет, правило не применяется.
+    """
+
+    def __init__(self, name, columns, predicate=None, expression=None, message=None, target='error', stage='validate'):
+        super().__init__(name, columns, message, target, stage)
+        if (predicate is None) == (expression is None):
+            raise ValueError(f"Правило '{name}': нужно задать либо predicate, либо expression.")
+        self.predicate = predicate
+        self.expression = expression
+
+    def evaluate(self, ctx):
+        if not all(column in ctx.df.columns for column in self.columns):
+            return np.zeros(ctx.rows, dtype=bool)
+        if self.predicate is not None:
+            result = self.predicate(ctx.df)
+        else:
+            result = ctx.df.eval(self.expression, engine='python')
+        return pd.Series(result, index=ctx.df.index).eq(True).to_numpy()
+
+    def check(self):
+        super().check()
+        if self.expression is None:
+            return
+        # Выражение разбирается на пустом DataFrame с колонками правила: синтаксис и имена колонок
+        try:
+            pd.DataFrame(columns=self.columns).eval(self.expression, engine='python')
+        except Exception as e:
+            raise ValueError(f"Правило '{self.name}': некорректное выражение '{self.expression}' ({e}); "
+                             f"колонки выражения должны быть перечислены в columns.")
+
+
+# Типы правил для описания в JSON-файле (поле "type")
+RULE_TYPES = {
+    'required': RequiredRule,
+    'regex': RegexRule,
+    'range': RangeRule,
+    'length': LengthRule,
+    'cross': CrossColumnRule,
+}
+
+
+def rule_from_dict(spec):
+    """Создает правило из словаря {'type': ..., 'name': ..., <параметры правила>}."""
+    spec = dict(spec)
+    rule_type = spec.pop('type', None)
+    if rule_type not in RULE_TYPES:
+        raise ValueError(f"Неизвестный тип правила: {rule_type}")
+    if 'predicate' in spec:
+        raise ValueError("predicate нельзя задать в файле правил, используйте expression.")
+    rule = RULE_TYPES[rule_type](**spec)
+    rule.check()
+    return rule
+
+
+class RuleResults:
+    """Результат проверки DataFrame набором правил: маски и число нарушений по правилам, итоговые колонки."""
+
+    def __init__(self, masks, errors, name_check):
+        self.masks = masks            # {имя правила: numpy bool-маска нарушений}
+        self.errors = errors          # numpy object-массив: сообщения через '; ' или None
+        self.name_check = name_check  # numpy bool-массив: нужна ручная проверка ФИО
+
+    @property
+    def counts(self):
+        return {name: int(mask.sum()) for name, mask in self.masks.items()}
+
+
+class RuleSet:
+    """
+    Набор правил валидации, проверяемый за один проход по DataFrame.
+    Представления колонок (строковые значения, даты) строятся один раз на все правила,
+    запрещающие regex-правила одной колонки объединяются в один паттерн.
+    Сообщения об ошибках строки перечисляются в порядке объявления правил.
+    """
+
+    def __init__(self, rules):
+        names = [rule.name for rule in rules]
+        duplicates = sorted({name for name in names if names.count(name) > 1})
+        if duplicates:
+            raise ValueError(f"Повторяющиеся имена правил: {', '.join(duplicates)}")
+        self.rules = list(rules)
+        self._forbid_patterns = {}
+        for rule in self.rules:
+            if isinstance(rule, RegexRule) and rule.mode == 'forbid':
+                for column in rule.columns:
+                    self._forbid_patterns.setdefault(column, []).append(rule.inline_pattern())
+        self._forbid_patterns = {column: re.compile('|'.join(patterns))
+                                 for column, patterns in self._forbid_patterns.items()}
+
+    @property
+    def columns(self):
+        """Все колонки, которые используют правила (в порядке первого упоминания)."""
+        return list(dict.fromkeys(column for rule in self.rules for column in rule.columns))
+
+    def evaluate(self, df, timings=None):
+        """
+        Проверяет df всеми правилами; маски и массивы результата соответствуют позициям строк df.
+        timings (StageTimings) - куда добавить время проверки по этапам правил.
+        """
+        ctx = _RuleContext(df, self._forbid_patterns)
+        masks = {}
+        errors = np.full(len(df), None, dtype=object)
+        name_check = np.zeros(len(df), dtype=bool)
+        stage_seconds = {}
+        stage_violations = {}
+        for rule in self.rules:
+            started = time.perf_counter()
+            mask = rule.evaluate(ctx)
+            masks[rule.name] = mask
+            stage_seconds[rule.stage] = stage_seconds.get(rule.stage, 0.0) + time.perf_counter() - started
+            stage_violations[rule.stage] = stage_violations.get(rule.stage, False) | mask
+            if not mask.any():
+                continue
+            if rule.target == 'check':
+                name_check |= mask
+                continue
+            positions = np.flatnonzero(mask)
+            messages = rule.messages(ctx, mask)
+            if isinstance(messages, str):
+                messages = np.full(len(positions), messages, dtype=object)
+            current = errors[positions]
+            has_errors = pd.notna(current)
+            messages[has_errors] = current[has_errors] + '; ' + messages[has_errors]
+            errors[positions] = messages
+        if timings is not None:
+            for stage, seconds in stage_seconds.items():
+                timings.add(stage, seconds, len(df), len(df) - int(np.count_nonzero(stage_violations[stage])))
+        return RuleResults(masks, errors, name_check)
+
+    def check_details(self, df):
+        """
+        Какие правила ручной проверки ФИО (target='check') сработали в строках df и в каких колонках.
+        Возвращает {индекс строки df: {имя правила: [колонки]}} только для сработавших строк.
+        Предназначено для уже отмеченных строк (их обычно немного): правила проверяются заново по колонкам.
+        """
+        ctx = _RuleContext(df, self._forbid_patterns)
+        details = {}
+        for rule in self.rules:
+            if rule.target != 'check':
+                continue
+            for column, mask in rule.column_masks(ctx).items():
+                for position in np.flatnonzero(mask):
+                    details.setdefault(df.index[position], {}).setdefault(rule.name, []).append(column)
+        return details
 
-    # Возвращаем полностью обработанный чанк
-    return df_validated_fields
 
 class DataProcessor:
-    def __init__(self):
+    # Версия правил очистки и валидации. Увеличивать при любом изменении, влияющем на результат обработки:
+    # входит в ключ кэша результатов, поэтому старые записи кэша перестанут использоваться
+    VERSION = 1
+    # Текстовые колонки, к которым применяется очистка строк
+    STRING_COLUMNS = ['Фамилия', 'Имя', 'Отчество', 'Организация', 'Должность', 'Место рождения', 'Адрес регистрации']
+    # Колонки ФИО (к ним дополнительно применяется whitelist символов)
+    FIO_COLUMNS = ['Фамилия', 'Имя', 'Отчество']
+    # Колонка с датой рождения
+    DATE_COLUMN = 'Дата рождения'
+    # Колонки, которые добавляет обработка
+    RESULT_COLUMNS = ['Validation_Errors', 'Name_Check_Required']
+    # Колонки, однозначно определяющие человека (для поиска дубликатов внутри файла)
+    IDENTITY_COLUMNS = ['Фамилия', 'Имя', 'Отчество', 'Дата рождения']
+
+    def __init__(self, rules_config=None):
         self.logger = get_logger(__name__)
         # Паттерн для разрешенных символов в ФИО (кириллица, латиница, пробел, дефис)
         self.fio_whitelist_pattern = re.compile(r"[^a-zA-Zа-яА-ЯёЁ\s-]")
-        # Паттерны для "подозрительных" имен
-        self.suspicious_patterns = [
-            re.compile(r"\s{2,}"),          # Два или более пробела подряд
-            re.compile(r"-{2,}"),           # Два или более дефиса подряд
-            re.compile(r"\s-"),            # Пробел перед дефисом
-            re.compile(r"-\s"),            # Пробел после дефиса
-            re.compile(r"^\s|\s$"),        # Пробел в начале или конце (после strip) - маловероятно
-            re.compile(r"^-|-$"),          # Дефис в начале или конце
-            re.compile(r"[^-a-zA-Zа-яА-ЯёЁ\s]"), # Любой символ, не входящий в базовый набор
+        # Набор правил валидации: встроенные правила и правила из файла VALIDATION_RULES_FILE
+        rules_config = rules_config or get_validation_rules_config()
+        custom_rules, custom_signature = self._load_custom_rules(rules_config['rules_file'])
+        self.rules = RuleSet(self.default_rules() + custom_rules)
+        self._rule_columns = set(self.rules.columns)
+        # Версия результата обработки для кэша: дополнительные правила меняют результат
+        self.result_version = self.VERSION if not custom_signature else f"{self.VERSION}_{custom_signature}"
+
+    @classmethod
+    def default_rules(cls):
+        """Встроенные правила валидации."""
+        fio = cls.FIO_COLUMNS
+        rules = [RequiredRule(f"required:{field}", field)
+                 for field in ['Фамилия', 'Имя', 'Дата рождения', 'Организация']]
+        rules.append(RangeRule("birth_year", cls.DATE_COLUMN, min_value=1900, part='year', stage='dates',
+                               message="Год рождения ({value}) меньше допустимого ({min})."))
+        # "Подозрительные" имена - требуют ручной проверки
+        # Сообщения правил ручной проверки не попадают в Validation_Errors, а показываются в окне проверки ФИО
+        patterns = [
+            ("fio:double_space", r"\s{2,}", "Два или более пробела подряд"),
+            ("fio:double_hyphen", r"-{2,}", "Два или более дефиса подряд"),
+            ("fio:space_before_hyphen", r"\s-", "Пробел перед дефисом"),
+            ("fio:space_after_hyphen", r"-\s", "Пробел после дефиса"),
+            ("fio:edge_space", r"^\s|\s$", "Пробел в начале или конце"),
+            ("fio:edge_hyphen", r"^-|-$", "Дефис в начале или конце"),
+            ("fio:other_chars", r"[^-a-zA-Zа-яА-ЯёЁ\s]", "Символ не из кириллицы, латиницы, пробела и дефиса"),
         ]
+        rules += [RegexRule(name, fio, pattern, message=message, target='check', stage='suspicious_names')
+                  for name, pattern, message in patterns]
+        return rules
+
+    def _load_custom_rules(self, rules_file):
+        """
+        Загружает дополнительные правила из JSON-файла (список описаний для rule_from_dict).
+        Возвращает (правила, подпись набора правил или None). Некорректные правила пропускаются.
+        """
+        if not rules_file:
+            return [], None
+        try:
+            with open(rules_file, encoding='utf-8') as f:
+                specs = json.load(f)
+            if not isinstance(specs, list):
+                raise ValueError("ожидался список правил")
+        except (OSError, ValueError) as e:
+            self.logger.error(f"Не удалось загрузить правила валидации из {rules_file}: {e}")
+            return [], None
+
+        reserved_names = {rule.name for rule in self.default_rules()}
+        rules, loaded_specs = [], []
+        for spec in specs:
+            try:
+                if not isinstance(spec, dict):
+                    raise ValueError("описание правила должно быть объектом")
+                rule = rule_from_dict(spec)
+                if rule.name in reserved_names:
+                    raise ValueError(f"имя '{rule.name}' уже занято")
+            except (TypeError, ValueError, re.error) as e:
+                self.logger.error(f"Правило валидации {spec} пропущено: {e}")
+                continue
+            reserved_names.add(rule.name)
+            rules.append(rule)
+            loaded_specs.append(spec)
+        if not rules:
+            return [], None
+        self.logger.info(f"Загружено дополнительных правил валидации: {len(rules)} ({rules_file}).")
+        canonical = json.dumps(loaded_specs, ensure_ascii=False, sort_keys=True)
+        return rules, hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:12]
+
+    def name_check_details(self, df):
+        """
+        Причины ручной проверки ФИО для строк df: {индекс строки: {имя правила: [колонки]}}.
+        Описания правил - check_rule_descriptions().
+        """
+        return self.rules.check_details(df)
+
+    def check_rule_descriptions(self):
+        """Описания правил ручной проверки ФИО: {имя правила: описание} в порядке объявления правил."""
+        return {rule.name: rule.description() for rule in self.rules.rules if rule.target == 'check'}
+
+    def input_columns(self, df):
+        """Колонки df, от которых зависит результат обработки (остальные колонки переносятся без изменений)."""
+        return [col for col in df.columns
+                if col in self.STRING_COLUMNS or col == self.DATE_COLUMN or col in self._rule_columns]
+
+    def row_hashes(self, df):
+        """
+        64-битные хэши исходных значений строк по колонкам, от которых зависит обработка.
+        Для колонок со смешанными типами учитывается и тип значения ('10000' и 10000 обрабатываются по-разному).
+        Возвращает None, если хэши построить нельзя (нет таких колонок или названия колонок повторяются).
+        """
+        columns = self.input_columns(df)
+        if not columns or not df.columns.is_unique:
+            return None
+        parts = {}
+        for col in columns:
+            parts[col] = df[col]
+            if df[col].dtype == object:
+                parts[f'{col}:type'] = df[col].map(lambda value: type(value).__name__)
+        return pd.util.hash_pandas_object(pd.DataFrame(parts, index=df.index), index=False)
+
+    def identity_hashes(self, df):
+        """
+        64-битные хэши нормализованной личности обработанных строк: ФИО без учета регистра и различия е/ё,
+        дата рождения. Пустые значения и отсутствующие колонки считаются пустой строкой.
+        """
+        parts = {}
+        for col in self.IDENTITY_COLUMNS:
+            if col in df.columns:
+                values = df[col].where(df[col].notna(), '').astype(str)
+            else:
+                values = pd.Series('', index=df.index)
+            parts[col] = values.str.lower().str.replace('ё', 'е', regex=False)
+        return pd.util.hash_pandas_object(pd.DataFrame(parts, index=df.index), index=False)
+
+    def drop_empty_rows(self, df):
+        """Удаляет полностью пустые строки (колонка '№ п/п' не учитывается). Возвращает (df, число удаленных)."""
+        cols_to_check = df.columns.tolist()
+        if cols_to_check and ('№ п/п' in str(cols_to_check[0]) or 'пп' in str(cols_to_check[0]).lower()):
+            cols_to_check = cols_to_check[1:]
+        if not cols_to_check:
+            return df, 0
+        df_not_empty = df.dropna(subset=cols_to_check, how='all')
+        return df_not_empty, len(df) - len(df_not_empty)
 
     def clean_string(self, value, use_whitelist=False):
         """Очищает строку: удаляет доп. пробелы, нормализует дефисы и Unicode."""
@@ -129,24 +849,20 @@ class DataProcessor:
     def clean_dataframe(self, df):
         """Применяет очистку строк и нормализацию дат к DataFrame."""
         self.logger.info("Начало очистки DataFrame.")
-        cleaned_df = df.copy() # Работаем с копией
-
-        # Определение колонок для очистки строк (примерный список)
-        string_columns = ['Фамилия', 'Имя', 'Отчество', 'Организация', 'Должность', 'Место рождения', 'Адрес регистрации']
-        # Определение колонки с датой
-        date_column = 'Дата рождения'
+        # Поверхностная копия: очищенные колонки заменяются новыми массивами, данные df не копируются и не меняются
+        cleaned_df = df.copy(deep=False)
 
         for col in cleaned_df.columns:
             # Применяем очистку строк к текстовым колонкам
-            if col in string_columns:
+            if col in self.STRING_COLUMNS:
                 # Применяем whitelist только к ФИО
-                use_wl = col in ['Фамилия', 'Имя', 'Отчество']
+                use_wl = col in self.FIO_COLUMNS
                 cleaned_df[col] = cleaned_df[col].apply(lambda x: self.clean_string(x, use_whitelist=use_wl))
                 # Заменяем пустые строки на None для консистентности
                 cleaned_df[col] = cleaned_df[col].replace('', None)
 
             # Применяем нормализацию даты
-            elif col == date_column:
+            elif col == self.DATE_COLUMN:
                 cleaned_df[col] = cleaned_df[col].apply(self.normalize_date)
 
             # Можно добавить очистку для других типов колонок (числа и т.д.)
@@ -154,115 +870,32 @@ class DataProcessor:
         self.logger.info("Очистка DataFrame завершена.")
         return cleaned_df
 
-    def detect_unusual_names(self, df, columns=['Фамилия', 'Имя', 'Отчество']):
+    def validate_data(self, df, timings=None):
         """
-        Ищет строки с "подозрительными" паттернами в указанных колонках ФИО.
-        Возвращает список индексов таких строк.
+        Проверяет DataFrame набором правил self.rules за один проход.
+        Добавляет колонки 'Validation_Errors' (сообщения через '; ' или None) и 'Name_Check_Required'.
+        timings (StageTimings) - куда добавить время проверки по этапам правил.
         """
-        suspicious_indices = set()
-        self.logger.info("Поиск строк с необычными именами...")
-
-        # --- ДОБАВЛЕНА ПРОВЕРКА ТИПА ---
-        if not isinstance(df, pd.DataFrame):
-            self.logger.error(f"Ошибка в detect_unusual_names: ожидался DataFrame, получен {type(df)}.")
-            return list(suspicious_indices)  # Возвращаем пустой список
-        # --- КОНЕЦ ДОБАВЛЕННОЙ ПРОВЕРКИ ---
-
-        for col in columns:
-            if col in df.columns:
-                for index, value in df[col].dropna().items(): # Пропускаем NaN
-                    if isinstance(value, str): # Убедимся, что это строка
-                         for pattern in self.suspicious_patterns:
-                            if pattern.search(value):
-                                self.logger.warning(f"Обнаружен подозрительный паттерн '{pattern.pattern}' в '{col}': '{value}' (индекс: {index})")
-                                suspicious_indices.add(index)
-                                break # Переходим к следующему значению после первого совпадения
-        self.logger.info(f"Найдено {len(suspicious_indices)} строк с потенциально необычными именами.")
-        return list(suspicious_indices)
-
-        # data_processing.py (добавление нового метода)
-
-    def validate_dates(self, df, date_column='Дата рождения', min_year=1900):
-        """
-        Проверяет корректность дат в указанной колонке.
-        Возвращает словарь {индекс: сообщение_об_ошибке}.
-        """
-        self.logger.info(f"Проверка дат в колонке '{date_column}' (год >= {min_year}).")
-        date_errors = {}
-
-        # --- ДОБАВЛЕНА ПРОВЕРКА ТИПА ---
-        if not isinstance(df, pd.DataFrame):
-            self.logger.error(f"Ошибка в validate_dates: ожидался DataFrame, получен {type(df)}.")
-            return date_errors # Возвращаем пустой словарь ошибок
-        # --- КОНЕЦ ДОБАВЛЕННОЙ ПРОВЕРКИ ---
-
-        if date_column not in df.columns:
-            self.logger.warning(f"Колонка '{date_column}' для проверки дат не найдена в DataFrame.")
-            return date_errors
-
-        # ... (остальной код проверки дат без изменений) ...
-        for index, value in df[date_column].items():
-             # Проверяем только если дата не NaT/None и является объектом date/datetime
-            if pd.notna(value) and isinstance(value, (date, datetime)):
-                if value.year < min_year:
-                    error_msg = f"Год рождения ({value.year}) меньше допустимого ({min_year})."
-                    date_errors[index] = error_msg
-                    self.logger.warning(f"Обнаружена некорректная дата: {value.strftime('%d.%m.%Y')} в строке {index+1}. {error_msg}")
-
-        if date_errors:
-            self.logger.warning(f"Обнаружено {len(date_errors)} строк с некорректными датами.")
-        else:
-            self.logger.info("Ошибок в датах не обнаружено.")
-        return date_errors
-
-    # data_processing.py (метод validate_data)
-    def validate_data(self, df):
-        self.logger.info("Проверка наличия обязательных полей.")
-        self.logger.debug(f"Тип df НА ВХОДЕ в validate_data: {type(df)}")
+        self.logger.info("Проверка данных правилами валидации.")
         if not isinstance(df, pd.DataFrame):
             self.logger.error(f"validate_data получил НЕ DataFrame: {type(df)}")
             return pd.DataFrame()
 
-        validated_df = df.copy()
-        self.logger.debug(f"Тип validated_df ПОСЛЕ КОПИРОВАНИЯ: {type(validated_df)}")
-
-        required_fields = ['Фамилия', 'Имя', 'Дата рождения', 'Организация']
-        errors = []
-        try:  # Добавим try-except на всякий случай
-            for index, row in validated_df.iterrows():
-                row_errors = []
-                for field in required_fields:
-                    # Проверяем наличие колонки перед доступом к row[field]
-                    if field not in validated_df.columns:
-                        row_errors.append(f"Отсутствует колонка '{field}'")
-                        continue  # Переходим к следующему полю
-
-                    if field not in row or pd.isna(row[field]) or str(row[field]).strip() == '' or str(row[field]).strip() == 'nan':
-                        row_errors.append(f"Отсутствует '{field}'")
-                errors.append("; ".join(row_errors) if row_errors else None)
-
-            # Проверяем длину списка ошибок
-            if len(errors) != len(validated_df):
-                self.logger.error(
-                    f"Длина списка ошибок ({len(errors)}) не совпадает с длиной DataFrame ({len(validated_df)})!")
-                # В случае несовпадения, создаем список None правильной длины
-                errors = [None] * len(validated_df)
-
-            validated_df['Validation_Errors'] = errors
-            self.logger.debug(f"Тип validated_df ПОСЛЕ ДОБАВЛЕНИЯ КОЛОНКИ: {type(validated_df)}")
+        # Поверхностная копия: добавляются только новые колонки, данные df не копируются и не меняются
+        validated_df = df.copy(deep=False)
+        results = self.rules.evaluate(validated_df, timings)
+        validated_df['Validation_Errors'] = results.errors
+        validated_df['Name_Check_Required'] = results.name_check
 
-        except Exception as e:
-            self.logger.exception(f"Неожиданная ошибка внутри цикла validate_data: {e}")
-            # В случае ошибки вернем исходную копию без колонки ошибок
-            return validated_df.copy()  # Возвращаем копию без изменений
-
-        num_invalid = validated_df['Validation_Errors'].notna().sum()
+        for name, count in results.counts.items():
+            if count:
+                self.logger.info(f"Правило '{name}': нарушений - {count}.")
+        num_invalid = int(pd.notna(results.errors).sum())
         if num_invalid > 0:
             self.logger.warning(f"Обнаружено {num_invalid} строк с ошибками валидации.")
         else:
-            self.logger.info("Ошибок валидации обязательных полей не найдено.")
-
-        # Возвращаем ЯВНУЮ копию еще раз
-        final_df = validated_df.copy()
-        self.logger.debug(f"Тип final_df ПЕРЕД RETURN в validate_data: {type(final_df)}")
-        return final_df
\ No newline at end of file
+            self.logger.info("Ошибок валидации не найдено.")
+        num_suspicious = int(results.name_check.sum())
+        if num_suspicious:
+            self.logger.info(f"Найдено {num_suspicious} строк с потенциально необычными именами.")
+        return validated_df
@@ -3,11 +3,46 @@ import pandas as pd
 import psycopg2
 import psycopg2.pool
 import psycopg2.extras # Для RealDictCursor
+import psycopg2.errors
+import threading
 from datetime import datetime, date, timedelta
 import pytz
 import logging # Используем стандартное логирование
 from config import get_logger # Импортируем настроенный логгер
 
+class CancellableQuery:
+    """
+    Выполняющийся запрос, который можно отменить из другого потока (например, устаревший поиск).
+    cancel() отправляет серверу запрос отмены (то же, что pg_cancel_backend для процесса соединения).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._conn = None
+        self.cancelled = False
+
+    def attach(self, conn):
+        """Привязывает соединение, на котором выполняется запрос. Возвращает False, если запрос уже отменен."""
+        with self._lock:
+            if self.cancelled:
+                return False
+            self._conn = conn
+            return True
+
+    def detach(self):
+        with self._lock:
+            self._conn = None
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            if self._conn is not None:
+                try:
+                    self._conn.cancel()
+                except psycopg2.Error:
+                    pass  # Запрос мог уже завершиться
+
+
 class DatabaseManager:
     _pool = None # Пул соединений будет инициализирован один раз
 
@@ -177,7 +212,13 @@ class DatabaseManager:
             "CREATE INDEX IF NOT EXISTS idx_maintable_person_id ON mainTable (person_id);",
             "CREATE INDEX IF NOT EXISTS idx_maintable_end_accr ON mainTable (end_accr);",
             "CREATE INDEX IF NOT EXISTS idx_maintable_blacklist ON mainTable (black_list);",
-            "CREATE INDEX IF NOT EXISTS idx_td_names_dob ON TD (surname, name, birth_date);"
+            "CREATE INDEX IF NOT EXISTS idx_td_names_dob ON TD (surname, name, birth_date);",
+            # Порядок постраничной выдачи результатов поиска (search_people_page)
+            "CREATE INDEX IF NOT EXISTS idx_accrtable_search_order ON AccrTable (surname, name, id);",
+            "CREATE INDEX IF NOT EXISTS idx_td_search_order ON TD (surname, name, id);",
+            # Для дозагрузки снимка личностей (get_identity_snapshot) по времени изменения
+            "CREATE INDEX IF NOT EXISTS idx_accrtable_added_date ON AccrTable (added_date);",
+            "CREATE INDEX IF NOT EXISTS idx_maintable_last_checked ON mainTable (last_checked);"
         ]
         for query in queries:
              # Используем commit=True, так как CREATE TABLE требует этого вне транзакции
@@ -257,8 +298,11 @@ class DatabaseManager:
             self.logger.error(f"Не удалось добавить запись в TD: {data.get('Фамилия')} {data.get('Имя')}")
             return None
 
-    def find_person_in_accrtable(self, surname, name, middle_name, birth_date):
-        """Ищет человека в AccrTable. Возвращает ID или None."""
+    def find_person_in_accrtable(self, surname, name, middle_name, birth_date, query_handle=None):
+        """
+        Ищет человека в AccrTable. Возвращает ID или None.
+        query_handle (CancellableQuery) - запрос выполняется с возможностью отмены из другого потока.
+        """
         if not surname or not name or not birth_date:
              self.logger.warning("Попытка поиска в AccrTable без ФИО или даты рождения.")
              return None # Не можем искать без основных данных
@@ -274,7 +318,7 @@ class DatabaseManager:
         """
         params = (surname, name, birth_date, middle_name_param)
 
-        result = self.execute_query(query, params, fetch='one')
+        result = self._fetch_one(query, params, query_handle)
         found_id = result['id'] if result else None
         if found_id:
              self.logger.debug(f"Найден person_id={found_id} для {surname} {name} {middle_name_param} {birth_date}")
@@ -282,8 +326,11 @@ class DatabaseManager:
              self.logger.debug(f"Не найден person_id для {surname} {name} {middle_name_param} {birth_date}")
         return found_id
 
-    def find_person_in_td(self, surname, name, middle_name, birth_date):
-        """Ищет человека в TD. Возвращает ID или None."""
+    def find_person_in_td(self, surname, name, middle_name, birth_date, query_handle=None):
+        """
+        Ищет человека в TD. Возвращает ID или None.
+        query_handle (CancellableQuery) - запрос выполняется с возможностью отмены из другого потока.
+        """
         if not surname or not name or not birth_date:
              self.logger.warning("Попытка поиска в TD без ФИО или даты рождения.")
              return None # Не можем искать без основных данных
@@ -299,7 +346,7 @@ class DatabaseManager:
         """
         params = (surname, name, birth_date, middle_name_param)
 
-        result = self.execute_query(query, params, fetch='one')
+        result = self._fetch_one(query, params, query_handle)
         found_id = result['id'] if result else None
         if found_id:
              self.logger.debug(f"Найден person_id={found_id} для {surname} {name} {middle_name_param} {birth_date}")
@@ -307,13 +354,17 @@ class DatabaseManager:
              self.logger.debug(f"Не найден person_id для {surname} {name} {middle_name_param} {birth_date}")
         return found_id
 
-    def get_person_status(self, surname, name, middle_name, birth_date):
+    def get_person_status(self, surname, name, middle_name, birth_date, query_handle=None):
         """
         Проверяет статус человека в mainTable (активность, черный список).
         Возвращает словарь {'status': 'BLACKLISTED'|'ACTIVE'|'EXPIRED'|'NOT_FOUND', 'person_id': id | None}.
+        query_handle (CancellableQuery) - запросы проверки можно отменить из другого потока;
+        после отмены возвращается None.
         """
-        person_id_accr = self.find_person_in_accrtable(surname, name, middle_name, birth_date)
-        person_id_td = self.find_person_in_td(surname, name, middle_name, birth_date)
+        person_id_accr = self.find_person_in_accrtable(surname, name, middle_name, birth_date, query_handle)
+        person_id_td = self.find_person_in_td(surname, name, middle_name, birth_date, query_handle)
+        if query_handle is not None and query_handle.cancelled:
+            return None
         if not person_id_accr and not person_id_td:
             return {'status': 'NOT_FOUND', 'person_id': None}
         elif person_id_td and not person_id_accr:
@@ -334,7 +385,9 @@ class DatabaseManager:
         LIMIT 1;
         """
         params = (person_id,)
-        result = self.execute_query(query, params, fetch='one')
+        result = self._fetch_one(query, params, query_handle)
+        if query_handle is not None and query_handle.cancelled:
+            return None
 
         if result:
             if result['black_list']:
@@ -639,10 +692,18 @@ class DatabaseManager:
 
         return None, "Непредвиденная ситуация в toggle_blacklist."
 
-    def search_people(self, search_term):
+    # Условия поиска сотрудников по подстроке ФИО или организации (параметр - шаблон ILIKE для каждого поля)
+    SEARCH_WHERE_ACCR = "(a.surname ILIKE %s OR a.name ILIKE %s OR a.middle_name ILIKE %s OR a.organization ILIKE %s)"
+    SEARCH_WHERE_TD = "(t.surname ILIKE %s OR t.name ILIKE %s OR t.middle_name ILIKE %s OR t.organization ILIKE %s)"
+
+    def _search_selects(self, search_term):
+        """
+        Выборки поиска из AccrTable и TD и параметры одной выборки.
+        row_id - ID записи в своей таблице: вместе с (surname, name, source) однозначно задает порядок строк.
+        """
         like_term = f"%{search_term}%"
         params = (like_term, like_term, like_term, like_term)
-        query_accr = """
+        query_accr = f"""
         SELECT
             a.id, a.surname, a.name, a.middle_name, a.birth_date,
             a.organization, a.position, a.status AS accr_status,
@@ -651,14 +712,15 @@ class DatabaseManager:
             mt.start_accr, -- <--- Начало аккредитации из mainTable
             mt.end_accr,
             a.added_date AS record_creation_date, -- Дата создания записи в AccrTable (если нужно отдельно)
-            'AccrTable' AS source
+            'AccrTable' AS source,
+            a.id AS row_id
         FROM AccrTable a
         LEFT JOIN mainTable mt ON a.id = mt.person_id AND mt.id = (
             SELECT MAX(sub.id) FROM mainTable sub WHERE sub.person_id = a.id
         )
-        WHERE a.surname ILIKE %s OR a.name ILIKE %s OR a.middle_name ILIKE %s OR a.organization ILIKE %s
+        WHERE {self.SEARCH_WHERE_ACCR}
         """
-        query_td = """
+        query_td = f"""
         SELECT
             NULL::INT AS id, t.surname, t.name, t.middle_name, t.birth_date,
             t.organization, t.position, t.status AS td_status,
@@ -667,13 +729,105 @@ class DatabaseManager:
             NULL::TIMESTAMPTZ AS start_accr, -- <--- Для TD нет начала аккредитации
             NULL::TIMESTAMPTZ AS end_accr,
             t.load_timestamp AS record_creation_date, -- Дата загрузки в TD
-            'TD' AS source
+            'TD' AS source,
+            t.id AS row_id
         FROM TD t
-        WHERE t.surname ILIKE %s OR t.name ILIKE %s OR t.middle_name ILIKE %s OR t.organization ILIKE %s
+        WHERE {self.SEARCH_WHERE_TD}
         """
+        return query_accr, query_td, params
+
+    def search_people(self, search_term, query_handle=None, timeout_ms=None):
+        """
+        Ищет сотрудников в AccrTable и TD по подстроке ФИО или организации.
+        query_handle (CancellableQuery) позволяет отменить запрос из другого потока,
+        timeout_ms ограничивает время его выполнения на сервере (statement_timeout).
+        Возвращает None при ошибке, отмене или превышении времени.
+        """
+        query_accr, query_td, params = self._search_selects(search_term)
         full_query = f"({query_accr}) UNION ALL ({query_td}) ORDER BY surname, name;"
         full_params = params + params
-        return self.execute_query(full_query, full_params, fetch='all')
+        if query_handle is None and not timeout_ms:
+            return self.execute_query(full_query, full_params, fetch='all')
+        return self._execute_cancellable(full_query, full_params, query_handle or CancellableQuery(), timeout_ms)
+
+    def search_people_page(self, search_term, after=None, limit=500, query_handle=None, timeout_ms=None):
+        """
+        Страница результатов поиска (постраничная выборка по ключу) в порядке (surname, name, row_id, source).
+        after - ключ последней строки предыдущей страницы (surname, name, row_id, source) или None для первой.
+        Каждая выборка читается по индексу (surname, name, id) и останавливается после limit строк,
+        поэтому первая страница широкого поиска не зависит от общего числа совпадений.
+        Возвращает список строк (как search_people) или None при ошибке, отмене или превышении времени.
+        """
+        query_accr, query_td, params = self._search_selects(search_term)
+        accr_params, td_params = params, params
+        if after is not None:
+            surname, name, row_id, source = after
+            key = (surname, name, int(row_id), source)
+            query_accr += " AND (a.surname, a.name, a.id, 'AccrTable') > (%s, %s, %s, %s)"
+            query_td += " AND (t.surname, t.name, t.id, 'TD') > (%s, %s, %s, %s)"
+            accr_params, td_params = params + key, params + key
+        full_query = (f"({query_accr} ORDER BY a.surname, a.name, a.id LIMIT %s) UNION ALL "
+                      f"({query_td} ORDER BY t.surname, t.name, t.id LIMIT %s) "
+                      "ORDER BY surname, name, row_id, source LIMIT %s;")
+        full_params = accr_params + (limit,) + td_params + (limit,) + (limit,)
+        return self._execute_cancellable(full_query, full_params, query_handle or CancellableQuery(), timeout_ms)
+
+    def estimate_search_count(self, search_term):
+        """Оценка числа результатов поиска по статистике планировщика (EXPLAIN, без выполнения). None при ошибке."""
+        like_term = f"%{search_term}%"
+        query = (f"EXPLAIN (FORMAT JSON) SELECT 1 FROM AccrTable a WHERE {self.SEARCH_WHERE_ACCR} "
+                 f"UNION ALL SELECT 1 FROM TD t WHERE {self.SEARCH_WHERE_TD};")
+        result = self.execute_query(query, (like_term,) * 8, fetch='one')
+        if not result:
+            return None
+        try:
+            return int(result['QUERY PLAN'][0]['Plan']['Plan Rows'])
+        except (KeyError, IndexError, TypeError, ValueError):
+            self.logger.warning("Не удалось прочитать оценку числа строк из плана запроса поиска.")
+            return None
+
+    def count_search_results(self, search_term, query_handle=None, timeout_ms=None):
+        """Точное число результатов поиска. None при ошибке, отмене или превышении времени."""
+        like_term = f"%{search_term}%"
+        query = (f"SELECT (SELECT COUNT(*) FROM AccrTable a WHERE {self.SEARCH_WHERE_ACCR}) "
+                 f"+ (SELECT COUNT(*) FROM TD t WHERE {self.SEARCH_WHERE_TD}) AS total;")
+        rows = self._execute_cancellable(query, (like_term,) * 8, query_handle or CancellableQuery(), timeout_ms)
+        return int(rows[0]['total']) if rows else None
+
+    def _fetch_one(self, query, params, query_handle=None):
+        """Первая строка SELECT-запроса или None; с query_handle запрос выполняется с возможностью отмены."""
+        if query_handle is None:
+            return self.execute_query(query, params, fetch='one')
+        rows = self._execute_cancellable(query, params, query_handle)
+        return rows[0] if rows else None
+
+    def _execute_cancellable(self, query, params, query_handle, timeout_ms=None):
+        """Выполняет SELECT-запрос, который можно отменить через query_handle."""
+        conn = None
+        try:
+            conn = self._get_connection()
+            if not query_handle.attach(conn):
+                return None
+            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+                if timeout_ms:
+                    # SET LOCAL действует до конца транзакции, откатываемой при возврате соединения в пул
+                    cursor.execute("SET LOCAL statement_timeout = %s;", (int(timeout_ms),))
+                cursor.execute(query, params)
+                return cursor.fetchall()
+        except psycopg2.errors.QueryCanceled:
+            if query_handle.cancelled:
+                self.logger.debug(f"Запрос отменен: {query.strip().splitlines()[0][:100]}")
+            else:
+                self.logger.warning(f"Запрос прерван по statement_timeout ({timeout_ms} мс): "
+                                    f"{query.strip().splitlines()[0][:100]}")
+            return None
+        except psycopg2.Error as e:
+            self.logger.error(f"Ошибка БД при выполнении запроса '{query[:100]}...': {e}")
+            return None
+        finally:
+            query_handle.detach()
+            if conn:
+                self._release_connection(conn)
 
     def get_employee_records(self, person_id):
          """Получает историю операций для сотрудника из таблицы Records."""
@@ -691,6 +845,22 @@ class DatabaseManager:
         result = self.execute_query(query, (person_id,), fetch='one')
         return result['notes'] if result else ""
 
+    def get_notes_batch(self, person_ids):
+        """
+        Получает примечания нескольких сотрудников одним запросом: {person_id: примечания}
+        (для ID, которых нет в AccrTable, - пустая строка). При ошибке БД возвращает None.
+        """
+        ids = list(dict.fromkeys(int(person_id) for person_id in person_ids))
+        if not ids:
+            return {}
+        query = "SELECT id, notes FROM AccrTable WHERE id = ANY(%s);"
+        rows = self.execute_query(query, (ids,), fetch='all')
+        if rows is None:
+            return None
+        notes = dict.fromkeys(ids, "")
+        notes.update({row['id']: row['notes'] or "" for row in rows})
+        return notes
+
     def update_notes(self, person_id, notes):
         """Обновляет примечания для сотрудника."""
         query = "UPDATE AccrTable SET notes = %s WHERE id = %s;"
@@ -872,6 +1042,73 @@ class DatabaseManager:
                   self._release_connection(conn)
 
 
+    def get_identity_snapshot(self, changed_since=None, query_handle=None):
+        """
+        Снимок всех известных личностей для проверки статусов без запроса на каждую строку.
+        Возвращает словарь:
+            'server_time'  - время сервера на момент снимка (для следующей дозагрузки),
+            'people'       - DataFrame AccrTable: person_id, surname, name, middle_name, birth_date и
+                             black_list, end_accr последней записи mainTable,
+            'people_count' - общее число записей AccrTable (по нему обнаруживаются удаления),
+            'td'           - DataFrame TD: td_id, surname, name, middle_name, birth_date (всегда целиком).
+        Если задан changed_since, в 'people' попадают только записи, добавленные или измененные после него.
+        query_handle (CancellableQuery) - через него загрузку снимка можно прервать из другого потока.
+        При ошибке или отмене возвращает None.
+        """
+        people_query = """
+        SELECT a.id AS person_id, a.surname, a.name, COALESCE(a.middle_name, '') AS middle_name, a.birth_date,
+               mt.black_list, mt.end_accr
+        FROM AccrTable a
+        LEFT JOIN LATERAL (
+            SELECT black_list, end_accr FROM mainTable WHERE person_id = a.id ORDER BY id DESC LIMIT 1
+        ) mt ON TRUE
+        """
+        if changed_since is not None:
+            people_query += """
+        WHERE a.id IN (
+            SELECT id FROM AccrTable WHERE added_date >= %(since)s
+            UNION
+            SELECT person_id FROM mainTable WHERE last_checked >= %(since)s
+        )
+        """
+        td_query = "SELECT id AS td_id, surname, name, COALESCE(middle_name, '') AS middle_name, birth_date FROM TD"
+
+        def fetch_frame(cursor, query, params=None):
+            cursor.execute(query, params)
+            return pd.DataFrame.from_records(cursor.fetchall(), columns=[col.name for col in cursor.description])
+
+        query_handle = query_handle or CancellableQuery()
+        conn = None
+        try:
+            conn = self._get_connection()
+            if not query_handle.attach(conn):
+                return None
+            # Все запросы снимка - в одной транзакции, только чтение
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT NOW(), (SELECT count(*) FROM AccrTable)")
+                server_time, people_count = cursor.fetchone()
+                people = fetch_frame(cursor, people_query, {'since': changed_since})
+                td = fetch_frame(cursor, td_query)
+            conn.rollback()
+            self.logger.info(f"Снимок личностей получен: AccrTable {len(people)} записей"
+                             f"{' (изменения)' if changed_since is not None else ''}, TD {len(td)} записей.")
+            return {'server_time': server_time, 'people': people, 'people_count': people_count, 'td': td}
+        except psycopg2.Error as e:
+            if conn:
+                try:
+                    conn.rollback()
+                except psycopg2.Error as rb_err:
+                    self.logger.error(f"Ошибка при откате транзакции: {rb_err}")
+            if isinstance(e, psycopg2.errors.QueryCanceled) and query_handle.cancelled:
+                self.logger.info("Загрузка снимка личностей отменена.")
+            else:
+                self.logger.error(f"Ошибка БД при получении снимка личностей: {e}")
+            return None
+        finally:
+            query_handle.detach()
+            if conn:
+                self._release_connection(conn)
+
     def close_pool(self):
         """Закрывает пул соединений."""
         if self._pool:
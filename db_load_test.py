@@ -0,0 +1,534 @@
+# db_load_test.py
+"""
+Нагрузочный тест базы данных на синтетических данных.
+
+Заполняет отдельную локальную базу PostgreSQL (LOADTEST_DB_NAME, по умолчанию accr_loadtest)
+сотрудниками с реалистичным распределением статусов, долей черного списка и глубиной истории
+в mainTable и Records, затем запускает методы DatabaseManager и задачи планировщика в 1..N
+параллельных клиентах (отдельных процессах, как несколько копий приложения) и пишет в JSON
+перцентили задержки и пропускную способность.
+
+Тест меняет данные (toggle_blacklist, задачи планировщика) и очищает таблицы при заполнении,
+поэтому работает только с базой, имя которой отличается от рабочей DB_NAME, и только на локальном
+сервере (если не указан --allow-remote).
+
+Запуск:
+    python db_load_test.py seed --create-db                  # 500k сотрудников, миллионы строк истории
+    python db_load_test.py seed --people 100000 --reset      # пересоздать данные меньшего объема
+    python db_load_test.py run --workers 1 2 4 8 --duration 20 --output db_load_results.json
+"""
+import argparse
+import io
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+import psycopg2
+
+from benchmark import (CITIES, FEMALE_NAMES, MALE_NAMES, ORGANIZATIONS, PATRONYMICS, POSITIONS, STREETS,
+                       SURNAMES)
+from config import get_db_config, get_load_test_db_config
+from database_manager import DatabaseManager
+
+LOCAL_HOSTS = {'localhost', '127.0.0.1', '::1', ''}
+MARKER_TABLE = 'loadtest_seed'
+
+# Операции теста в порядке запуска: сначала чтение, затем изменяющие данные.
+# 'method' выполняется в цикле заданное время, 'job' - заданное число раз в каждом клиенте.
+OPERATIONS = {
+    'search_people': 'method',
+    'get_person_status': 'method',
+    'toggle_blacklist': 'method',
+    'check_accreditation_expiry': 'job',
+    'recheck_files_job': 'job',
+    'weekly_td_job': 'job',
+}
+
+# Поисковые запросы как в окне поиска: фамилии, имена, части названий организаций и короткие фрагменты
+SEARCH_TERMS = ([m for m, _ in SURNAMES[:20]] + [f for _, f in SURNAMES[20:30]] + MALE_NAMES[:8]
+                + FEMALE_NAMES[:8] + ['Ромашка', 'Стройинвест', 'ГПХ', 'Охрана', 'Иван', 'ова', 'ск'])
+
+RECORD_TYPES = ['Добавлен в AccrTable', 'Активирован', 'Истек срок аккредитации', 'Добавлен в ЧС',
+                'Убран из ЧС', 'Добавлен в TD', 'Обновлены примечания']
+
+ACCR_COLUMNS = ['id', 'surname', 'name', 'middle_name', 'birth_date', 'birth_place', 'registration',
+                'organization', 'position', 'notes', 'added_date', 'status']
+TD_COLUMNS = ['surname', 'name', 'middle_name', 'birth_date', 'birth_place', 'registration', 'organization',
+              'position', 'notes', 'status']
+
+
+# --- Подключение и защита рабочей базы ---
+
+def check_target(db_config, allow_remote=False):
+    """Отказывается работать с рабочей базой и (без allow_remote) с удаленным сервером."""
+    if db_config['database'] == get_db_config()['database']:
+        raise SystemExit(f"База нагрузочного теста '{db_config['database']}' совпадает с рабочей DB_NAME. "
+                         f"Укажите отдельную базу в LOADTEST_DB_NAME.")
+    host = str(db_config.get('host') or '')
+    if host not in LOCAL_HOSTS and not host.startswith('/') and not allow_remote:
+        raise SystemExit(f"Сервер БД {host} не локальный. Нагрузочный тест запускается на отдельном локальном "
+                         f"экземпляре; для удаленного сервера укажите --allow-remote.")
+
+
+def create_database(db_config):
+    """Создает базу нагрузочного теста, если ее еще нет."""
+    conn = psycopg2.connect(**dict(db_config, database='postgres'))
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1 FROM pg_database WHERE datname = %s", (db_config['database'],))
+            if cur.fetchone() is None:
+                cur.execute(f'CREATE DATABASE "{db_config["database"]}"')
+                print(f"База {db_config['database']} создана.")
+    finally:
+        conn.close()
+
+
+def _fetch_one(conn, query, params=None):
+    with conn.cursor() as cur:
+        cur.execute(query, params)
+        return cur.fetchone()
+
+
+def seed_params(conn):
+    """Параметры последнего заполнения базы тестом или None, если база заполнялась не им."""
+    if _fetch_one(conn, "SELECT to_regclass(%s)", (MARKER_TABLE,))[0] is None:
+        return None
+    row = _fetch_one(conn, f"SELECT params FROM {MARKER_TABLE} ORDER BY seeded_at DESC LIMIT 1")
+    return row[0] if row else None
+
+
+def table_counts(conn):
+    counts = {}
+    for table in ('AccrTable', 'mainTable', 'Records', 'TD'):
+        counts[table] = _fetch_one(conn, f"SELECT count(*) FROM {table}")[0]
+    return counts
+
+
+# --- Генерация данных ---
+
+def _people_frame(rng, count):
+    """Сотрудники без "грязных" случаев, в колонках таблиц AccrTable/TD."""
+    def pick(values, size=count):
+        return np.array(values, dtype=object)[rng.integers(len(values), size=size)]
+
+    female = rng.random(count) < 0.5
+    surname_pairs = rng.integers(len(SURNAMES), size=count)
+    patronymic_pairs = rng.integers(len(PATRONYMICS), size=count)
+    days = rng.integers(0, (np.datetime64('2005-12-31') - np.datetime64('1955-01-01')).astype(int), size=count)
+    birth_dates = np.datetime64('1955-01-01') + days.astype('timedelta64[D]')
+    notes = np.where(rng.random(count) < 0.1, pick(['Повторная проверка', 'Документы в работе',
+                                                    'Пропуск временный', 'Сменил организацию']), None)
+    return pd.DataFrame({
+        'surname': np.where(female, np.array([f for _, f in SURNAMES], dtype=object)[surname_pairs],
+                            np.array([m for m, _ in SURNAMES], dtype=object)[surname_pairs]),
+        'name': np.where(female, pick(FEMALE_NAMES), pick(MALE_NAMES)),
+        'middle_name': np.where(female, np.array([f for _, f in PATRONYMICS], dtype=object)[patronymic_pairs],
+                                np.array([m for m, _ in PATRONYMICS], dtype=object)[patronymic_pairs]),
+        'birth_date': np.datetime_as_string(birth_dates, unit='D'),
+        'birth_place': pick(CITIES),
+        'registration': pd.Series(pick(CITIES)) + ', ' + pd.Series(pick(STREETS)) + ', д. '
+                        + pd.Series(rng.integers(1, 150, size=count)).astype(str),
+        'organization': pick(ORGANIZATIONS),
+        'position': pick(POSITIONS),
+        'notes': notes,
+    })
+
+
+def _timestamps(now, offsets_days):
+    """Метки времени TIMESTAMPTZ (UTC) на offsets_days дней от now."""
+    seconds = (np.asarray(offsets_days) * 86400).astype('int64').astype('timedelta64[s]')
+    return np.datetime_as_string(now + seconds, unit='s', timezone='UTC')
+
+
+def _seed_chunk(rng, first_id, count, now, params):
+    """
+    Строки AccrTable, mainTable и Records для сотрудников first_id..first_id+count-1.
+    Статус: аккредитован / истек срок / в ожидании по долям active_share и expired_share,
+    отведен - с вероятностью blacklist_rate (последняя запись mainTable с black_list = TRUE).
+    История: у каждого не ожидающего сотрудника 1 + Poisson(history_mean - 1) годичных периодов
+    аккредитации подряд; у ожидающего одна запись без дат.
+    """
+    ids = np.arange(first_id, first_id + count)
+    people = _people_frame(rng, count)
+
+    draw = rng.random(count)
+    status = np.select([draw < params['active_share'], draw < params['active_share'] + params['expired_share']],
+                       ['аккредитован', 'истек срок'], 'в ожидании').astype(object)
+    blacklisted = rng.random(count) < params['blacklist_rate']
+    status[blacklisted] = 'отведен'
+    pending = status == 'в ожидании'
+
+    accr = people.assign(id=ids, added_date=_timestamps(now, -rng.uniform(0, 6 * 365, count)), status=status)
+
+    # Конец последнего периода: у действующих - в будущем, у остальных - в прошлом
+    last_end = np.where(status == 'аккредитован', rng.uniform(1, 365, count), -rng.uniform(1, 3 * 365, count))
+    depth = np.where(pending, 1, np.minimum(1 + rng.poisson(max(params['history_mean'] - 1, 0), count), 20))
+    person_rows = np.repeat(np.arange(count), depth)
+    # Номер периода с конца: 0 - последний (в mainTable он получает наибольший id)
+    back = (np.repeat(np.cumsum(depth), depth) - 1) - np.arange(len(person_rows))
+    end_offset = last_end[person_rows] - 365 * back
+    is_last = back == 0
+    no_dates = pending[person_rows]
+    main = pd.DataFrame({
+        'person_id': ids[person_rows],
+        'start_accr': np.where(no_dates, None, _timestamps(now, end_offset - 365)),
+        'end_accr': np.where(no_dates, None, _timestamps(now, end_offset)),
+        'black_list': blacklisted[person_rows] & is_last,
+        'last_checked': _timestamps(now, np.minimum(end_offset, 0) - rng.uniform(0, 30, len(person_rows))),
+    })
+
+    record_counts = rng.poisson(params['records_mean'], count)
+    total_records = int(record_counts.sum())
+    records = pd.DataFrame({
+        'person_id': np.repeat(ids, record_counts),
+        'operation_date': _timestamps(now, -rng.uniform(0, 5 * 365, total_records)),
+        'operation_type': np.array(RECORD_TYPES, dtype=object)[rng.integers(len(RECORD_TYPES), size=total_records)],
+        'details': 'Сгенерировано нагрузочным тестом',
+    })
+    return accr[ACCR_COLUMNS], main, records
+
+
+def _copy(cur, table, frame):
+    """Загружает DataFrame в таблицу через COPY (пустые значения - NULL)."""
+    buffer = io.StringIO()
+    frame.to_csv(buffer, header=False, index=False)
+    buffer.seek(0)
+    cur.copy_expert(f"COPY {table} ({', '.join(frame.columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+
+def seed_database(db_config, params, reset=False, chunk_rows=50_000):
+    """Создает таблицы (через DatabaseManager) и заполняет базу синтетическими данными."""
+    # DatabaseManager создает таблицы и индексы так же, как приложение
+    db = DatabaseManager(db_config)
+    db.close_pool()
+
+    conn = psycopg2.connect(**db_config)
+    try:
+        counts = table_counts(conn)
+        if any(counts.values()):
+            if seed_params(conn) is None:
+                raise SystemExit(f"В базе {db_config['database']} есть данные, не созданные нагрузочным тестом "
+                                 f"({counts}). База не будет очищена.")
+            if not reset:
+                raise SystemExit("База уже заполнена. Для повторного заполнения укажите --reset.")
+
+        started = time.perf_counter()
+        now = np.datetime64(datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0), 's')
+        with conn.cursor() as cur:
+            cur.execute("TRUNCATE Records, mainTable, TD, AccrTable RESTART IDENTITY")
+            for chunk_index, first in enumerate(range(0, params['people'], chunk_rows)):
+                rng = np.random.default_rng([params['seed'], chunk_index])
+                count = min(chunk_rows, params['people'] - first)
+                accr, main, records = _seed_chunk(rng, first + 1, count, now, params)
+                _copy(cur, 'AccrTable', accr)
+                _copy(cur, 'mainTable', main)
+                _copy(cur, 'Records', records)
+                print(f"  сотрудников {first + count}/{params['people']}", flush=True)
+            cur.execute("SELECT setval(pg_get_serial_sequence('accrtable', 'id'), GREATEST(MAX(id), 1)) "
+                        "FROM AccrTable")
+            cur.execute(f"CREATE TABLE IF NOT EXISTS {MARKER_TABLE} "
+                        f"(seeded_at TIMESTAMPTZ NOT NULL DEFAULT NOW(), params JSONB NOT NULL)")
+            cur.execute(f"INSERT INTO {MARKER_TABLE} (params) VALUES (%s)", (json.dumps(params),))
+        conn.commit()
+        seed_td(conn, params['td_rows'], params['seed'])
+
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute("VACUUM ANALYZE")
+        counts = table_counts(conn)
+        print(f"База заполнена за {time.perf_counter() - started:.1f} с: {counts}")
+        return counts
+    finally:
+        conn.close()
+
+
+def seed_td(conn, rows, seed, existing_share=0.2):
+    """
+    Заполняет TD заново: rows записей, из них existing_share - сотрудники, уже имеющиеся в AccrTable
+    (как повторно загруженные списки), остальные - новые.
+    """
+    existing = int(rows * existing_share)
+    rng = np.random.default_rng([seed, rows, 1])
+    td = _people_frame(rng, rows - existing)
+    td['status'] = 'На проверку'
+    with conn.cursor() as cur:
+        cur.execute("TRUNCATE TD RESTART IDENTITY")
+        _copy(cur, 'TD', td[TD_COLUMNS])
+        cur.execute("""
+            INSERT INTO TD (surname, name, middle_name, birth_date, birth_place, registration,
+                            organization, position, notes, status)
+            SELECT surname, name, middle_name, birth_date, birth_place, registration,
+                   organization, position, notes, 'На проверку'
+            FROM AccrTable ORDER BY random() LIMIT %s
+        """, (existing,))
+    conn.commit()
+
+
+# --- Нагрузка ---
+
+def sample_people(conn, size, seed):
+    """Случайные сотрудники AccrTable для запросов по ФИО и дате рождения."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT setseed(%s)", (((seed % 1000) / 1000.0),))
+        cur.execute("SELECT surname, name, middle_name, birth_date, organization FROM AccrTable "
+                    "ORDER BY random() LIMIT %s", (size,))
+        return cur.fetchall()
+
+
+def _prepare_level(conn, operation, td_rows, seed):
+    """Возвращает данные в исходное состояние перед замером задачи, которая их меняет."""
+    with conn.cursor() as cur:
+        if operation == 'check_accreditation_expiry':
+            # Истекшие аккредитации снова помечаются как действующие, чтобы задаче было что обновлять
+            cur.execute("""
+                UPDATE AccrTable a SET status = 'аккредитован'
+                FROM mainTable mt
+                WHERE mt.person_id = a.id AND a.status = 'истек срок' AND mt.black_list = FALSE
+                  AND mt.end_accr < NOW()
+                  AND mt.id = (SELECT MAX(sub.id) FROM mainTable sub WHERE sub.person_id = a.id)
+            """)
+    conn.commit()
+    if operation == 'weekly_td_job':
+        seed_td(conn, td_rows, seed)
+
+
+def _make_call(operation, db_config, payload, rng):
+    """Создает клиента (DatabaseManager или Scheduler) и функцию одного вызова операции; она возвращает успех."""
+    people = payload['people']
+    if operation in ('search_people', 'get_person_status', 'toggle_blacklist'):
+        db = DatabaseManager(db_config, min_conn=1, max_conn=2)
+
+    if operation == 'search_people':
+        terms = SEARCH_TERMS
+
+        def call():
+            return db.search_people(terms[rng.integers(len(terms))]) is not None
+    elif operation == 'get_person_status':
+        def call():
+            surname, name, middle_name, birth_date, _ = people[rng.integers(len(people))]
+            if rng.random() < payload['miss_rate']:
+                birth_date = birth_date.replace(year=1950)  # такого сотрудника нет (даты с 1955 года)
+            return db.get_person_status(surname, name, middle_name, birth_date) is not None
+    elif operation == 'toggle_blacklist':
+        def call():
+            surname, name, middle_name, birth_date, organization = people[rng.integers(len(people))]
+            action, _ = db.toggle_blacklist({'Фамилия': surname, 'Имя': name, 'Отчество': middle_name,
+                                             'Дата рождения': birth_date, 'Организация': organization})
+            return action is not None
+    else:
+        from scheduler import Scheduler  # apscheduler нужен только для задач планировщика
+        scheduler = Scheduler(db_config)
+        job = {
+            'check_accreditation_expiry': scheduler.check_accreditation_expiry_job,
+            'recheck_files_job': scheduler.generate_recheck_files_job,
+            'weekly_td_job': scheduler.generate_weekly_check_file_job,
+        }[operation]
+
+        def call():
+            job()
+            return True
+    return call
+
+
+def _client(operation, db_config, payload, worker_index, barrier, results):
+    """Процесс-клиент: выполняет операцию в цикле и отправляет задержки вызовов в очередь."""
+    if not payload['verbose']:
+        logging.disable(logging.WARNING)
+    # Файлы задач планировщика пишутся во временную папку теста
+    os.environ['SCHEDULER_OUTPUT_DIR'] = payload['output_dir']
+    rng = np.random.default_rng([payload['seed'], worker_index])
+    latencies, errors = [], 0
+    try:
+        call = _make_call(operation, db_config, payload, rng)
+    except Exception as e:
+        barrier.abort()
+        results.put({'error': f"{type(e).__name__}: {e}"})
+        return
+    try:
+        barrier.wait()
+    except threading.BrokenBarrierError:
+        results.put({'error': "Другой клиент не запустился"})
+        return
+    started = time.perf_counter()
+    deadline = started + payload['duration']
+    while True:
+        call_started = time.perf_counter()
+        try:
+            ok = call()
+        except Exception:
+            ok = False
+        finished = time.perf_counter()
+        latencies.append(finished - call_started)
+        errors += not ok
+        if OPERATIONS[operation] == 'job':
+            if len(latencies) >= payload['job_runs']:
+                break
+        elif finished >= deadline:
+            break
+    if DatabaseManager._pool:
+        DatabaseManager._pool.closeall()
+    results.put({'latencies': latencies, 'errors': errors, 'seconds': time.perf_counter() - started})
+
+
+def run_level(operation, db_config, workers, payload):
+    """Запускает workers клиентов одновременно и сводит их замеры."""
+    context = multiprocessing.get_context('spawn')  # без копирования пула соединений родителя
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [context.Process(target=_client, args=(operation, db_config, payload, i, barrier, results))
+                 for i in range(workers)]
+    for process in processes:
+        process.start()
+    reports = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    failed = [report['error'] for report in reports if 'error' in report]
+    if failed:
+        return {'operation': operation, 'workers': workers, 'error': failed[0]}
+    latencies = np.concatenate([report['latencies'] for report in reports]) * 1000
+    seconds = max(report['seconds'] for report in reports)
+    return {
+        'operation': operation,
+        'workers': workers,
+        'calls': int(len(latencies)),
+        'errors': int(sum(report['errors'] for report in reports)),
+        'seconds': round(seconds, 3),
+        'calls_per_sec': round(len(latencies) / seconds, 2) if seconds > 0 else None,
+        'p50_ms': round(float(np.percentile(latencies, 50)), 2),
+        'p95_ms': round(float(np.percentile(latencies, 95)), 2),
+        'p99_ms': round(float(np.percentile(latencies, 99)), 2),
+        'max_ms': round(float(latencies.max()), 2),
+    }
+
+
+def _print_result(result):
+    if 'error' in result:
+        print(f"{result['operation']:<28} {result['workers']:>3}  ошибка запуска: {result['error']}", flush=True)
+        return
+    print(f"{result['operation']:<28} {result['workers']:>3} {result['calls']:>8} {result['calls_per_sec'] or 0:>10.2f} "
+          f"{result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} {result['p99_ms']:>9.2f} {result['errors']:>7}",
+          flush=True)
+
+
+def run_load_test(db_config, operations, workers_levels, duration, job_runs, miss_rate, sample_size, seed,
+                  verbose=False):
+    conn = psycopg2.connect(**db_config)
+    try:
+        params = seed_params(conn)
+        if params is None:
+            raise SystemExit(f"База {db_config['database']} не заполнена нагрузочным тестом. "
+                             f"Сначала выполните: python db_load_test.py seed")
+        people = sample_people(conn, sample_size, seed)
+        counts = table_counts(conn)
+        print(f"Данные: {counts}")
+        print(f"\n{'Операция':<28} {'Кл.':>3} {'Вызовов':>8} {'Вызовов/с':>10} "
+              f"{'p50, мс':>9} {'p95, мс':>9} {'p99, мс':>9} {'Ошибок':>7}")
+        results = []
+        with tempfile.TemporaryDirectory(prefix='accr_loadtest_') as output_dir:
+            payload = {'people': people, 'duration': duration, 'job_runs': job_runs, 'miss_rate': miss_rate,
+                       'seed': seed, 'output_dir': output_dir, 'verbose': verbose}
+            for operation in operations:
+                for workers in workers_levels:
+                    _prepare_level(conn, operation, params['td_rows'], seed)
+                    result = run_level(operation, db_config, workers, payload)
+                    _print_result(result)
+                    results.append(result)
+        return {'seed_params': params, 'table_counts': counts, 'results': results}
+    finally:
+        conn.close()
+
+
+def environment_info(db_config):
+    """Сведения об окружении, без которых результаты разных запусков нельзя сравнивать."""
+    conn = psycopg2.connect(**db_config)
+    try:
+        server_version = _fetch_one(conn, "SHOW server_version")[0]
+    finally:
+        conn.close()
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'psycopg2': psycopg2.__version__,
+        'postgresql': server_version,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'database': db_config['database'],
+        'host': db_config['host'],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Нагрузочный тест базы данных на синтетических данных.")
+    parser.add_argument('--allow-remote', action='store_true', help="Разрешить нелокальный сервер БД")
+    parser.add_argument('--seed', type=int, default=0, help="Зерно генератора данных и нагрузки")
+    parser.add_argument('--verbose', action='store_true', help="Не отключать журнал приложения")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    seed_parser = commands.add_parser('seed', help="Заполнить базу синтетическими данными")
+    seed_parser.add_argument('--people', type=int, default=500_000, help="Число сотрудников в AccrTable")
+    seed_parser.add_argument('--history-mean', type=float, default=3.0,
+                             help="Среднее число периодов аккредитации (строк mainTable) на сотрудника")
+    seed_parser.add_argument('--records-mean', type=float, default=4.0,
+                             help="Среднее число записей Records на сотрудника")
+    seed_parser.add_argument('--active-share', type=float, default=0.6, help="Доля аккредитованных")
+    seed_parser.add_argument('--expired-share', type=float, default=0.25,
+                             help="Доля с истекшей аккредитацией (остальные - в ожидании)")
+    seed_parser.add_argument('--blacklist-rate', type=float, default=0.02, help="Доля сотрудников в черном списке")
+    seed_parser.add_argument('--td-rows', type=int, default=5_000, help="Число записей во временной таблице TD")
+    seed_parser.add_argument('--reset', action='store_true', help="Очистить ранее заполненную тестом базу")
+    seed_parser.add_argument('--create-db', action='store_true', help="Создать базу, если ее нет")
+
+    run_parser = commands.add_parser('run', help="Запустить нагрузку и замерить задержки")
+    run_parser.add_argument('--operations', nargs='+', choices=list(OPERATIONS), default=list(OPERATIONS),
+                            help="Операции (по умолчанию все, в порядке: чтение, изменение, задачи)")
+    run_parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8],
+                            help="Числа одновременных клиентов")
+    run_parser.add_argument('--duration', type=float, default=10.0,
+                            help="Длительность замера метода на каждом уровне, с")
+    run_parser.add_argument('--job-runs', type=int, default=1, help="Запусков задачи планировщика в каждом клиенте")
+    run_parser.add_argument('--miss-rate', type=float, default=0.2,
+                            help="Доля запросов статуса по отсутствующим в базе сотрудникам")
+    run_parser.add_argument('--sample-size', type=int, default=5_000,
+                            help="Число случайных сотрудников для запросов по ФИО")
+    run_parser.add_argument('--output', default='db_load_results.json', help="Файл для результатов в JSON")
+    args = parser.parse_args(argv)
+
+    if not args.verbose:
+        logging.disable(logging.WARNING)
+
+    db_config = get_load_test_db_config()
+    check_target(db_config, args.allow_remote)
+
+    if args.command == 'seed':
+        if args.active_share + args.expired_share > 1:
+            parser.error("Сумма --active-share и --expired-share больше 1.")
+        if args.create_db:
+            create_database(db_config)
+        params = {'people': args.people, 'history_mean': args.history_mean, 'records_mean': args.records_mean,
+                  'active_share': args.active_share, 'expired_share': args.expired_share,
+                  'blacklist_rate': args.blacklist_rate, 'td_rows': args.td_rows, 'seed': args.seed}
+        seed_database(db_config, params, reset=args.reset)
+        return
+
+    report = run_load_test(db_config, args.operations, sorted(set(max(1, w) for w in args.workers)),
+                           args.duration, max(1, args.job_runs), args.miss_rate, args.sample_size, args.seed,
+                           verbose=args.verbose)
+    report = {'environment': environment_info(db_config), **report}
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2, default=str)
+    print(f"\nРезультаты сохранены в {args.output}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,325 @@
+# explain_report.py
+"""
+Планы выполнения запросов DatabaseManager на заполненной базе нагрузочного теста.
+
+Вызывает методы DatabaseManager с типичными параметрами (сотрудники из базы, поиск по фамилии и по
+короткому фрагменту, задачи планировщика) и перехватывает их запросы: каждый шаблон запроса
+выполняется под EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) в отдельной транзакции, которая затем
+откатывается. В отчете (JSON) сохраняются планы, время выполнения и замечания:
+    seq_scan     - последовательное чтение большой таблицы,
+    misestimate  - оценка числа строк отличается от фактического в заданное число раз,
+    plan_changed - форма плана изменилась по сравнению с предыдущим отчетом (--compare),
+    error        - запрос не выполняется.
+
+Работает только с базой нагрузочного теста (см. db_load_test.py): методы меняют данные.
+
+Запуск:
+    python db_load_test.py seed --people 500000
+    python explain_report.py --output plans_before.json
+    python explain_report.py --output plans_after.json --compare plans_before.json
+"""
+import argparse
+import hashlib
+import json
+import logging
+import re
+import sys
+from datetime import date, datetime
+
+import numpy as np
+import psycopg2
+
+from config import get_load_test_db_config
+from database_manager import DatabaseManager
+from db_load_test import check_target, sample_people, seed_params, table_counts
+
+EXPLAINABLE = ('select', 'insert', 'update', 'delete', 'with')
+
+
+def normalize_query(query):
+    """Текст запроса без лишних пробелов и комментариев - шаблон, по которому сравниваются отчеты."""
+    query = re.sub(r'--[^\n]*', ' ', query)
+    return re.sub(r'\s+', ' ', query).strip().rstrip(';').strip()
+
+
+def analyze_plan(plan, table_rows, large_table_rows=10_000, misestimate_ratio=10.0):
+    """
+    Разбирает план EXPLAIN (FORMAT JSON): форма плана (узлы, таблицы, индексы без стоимостей)
+    и замечания seq_scan и misestimate. Возвращает (shape, flags).
+    """
+    shape, flags = [], []
+
+    def walk(node, depth):
+        node_type = node['Node Type']
+        relation = node.get('Relation Name')
+        line = node_type
+        if relation:
+            line += f" on {relation}"
+        if node.get('Index Name'):
+            line += f" using {node['Index Name']}"
+        shape.append('  ' * depth + line)
+
+        rows = table_rows.get(relation.lower(), 0) if relation else 0
+        if node_type in ('Seq Scan', 'Parallel Seq Scan') and rows >= large_table_rows:
+            flags.append({'type': 'seq_scan', 'node': line, 'table_rows': rows,
+                          'filter': node.get('Filter')})
+        # Plan Rows и Actual Rows - на один цикл узла; неисполненные узлы (loops = 0) пропускаются
+        planned, actual = node.get('Plan Rows', 0), node.get('Actual Rows', 0)
+        if node.get('Actual Loops', 0) and max(planned, actual) >= 100:
+            ratio = max(planned, 1) / max(actual, 1)
+            if ratio >= misestimate_ratio or 1 / ratio >= misestimate_ratio:
+                flags.append({'type': 'misestimate', 'node': line, 'plan_rows': planned, 'actual_rows': actual,
+                              'loops': node['Actual Loops']})
+        for child in node.get('Plans', []):
+            walk(child, depth + 1)
+
+    walk(plan['Plan'], 0)
+    return shape, flags
+
+
+class PlanRecorder:
+    """
+    Перехватывает execute_query и _execute_cancellable экземпляра DatabaseManager и снимает план
+    каждого шаблона запроса (один раз в сценарии) перед его обычным выполнением.
+    """
+
+    def __init__(self, db, conn, table_rows, large_table_rows, misestimate_ratio):
+        self.db = db
+        self.conn = conn
+        self.table_rows = table_rows
+        self.large_table_rows = large_table_rows
+        self.misestimate_ratio = misestimate_ratio
+        self.entries = []
+        self.scenario = None
+        self.execute = True  # False - запрос только анализируется (для запросов, необратимо меняющих данные)
+        self._seen = set()
+        self._execute_query = db.execute_query
+        self._execute_cancellable = db._execute_cancellable
+        db.execute_query = self._record
+        db._execute_cancellable = self._record_cancellable
+
+    def _explain_once(self, query, params):
+        template = normalize_query(query)
+        key = (self.scenario, template)
+        if self.scenario and key not in self._seen and template.lstrip('( ').split(' ', 1)[0].lower() in EXPLAINABLE:
+            self._seen.add(key)
+            self.entries.append(self.explain(template, query, params))
+
+    def _record(self, query, params=None, fetch=None, commit=False):
+        self._explain_once(query, params)
+        if not self.execute:
+            return None
+        return self._execute_query(query, params, fetch=fetch, commit=commit)
+
+    def _record_cancellable(self, query, params, query_handle, timeout_ms=None):
+        self._explain_once(query, params)
+        if not self.execute:
+            return None
+        return self._execute_cancellable(query, params, query_handle, timeout_ms)
+
+    def explain(self, template, query, params):
+        digest = hashlib.sha1(template.encode()).hexdigest()[:12]
+        entry = {'scenario': self.scenario, 'key': f"{self.scenario}|{digest}", 'query': template,
+                 'params': _params_repr(params)}
+        try:
+            with self.conn.cursor() as cur:
+                cur.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + query, params)
+                plan = cur.fetchone()[0][0]
+        except psycopg2.Error as e:
+            entry.update(error=str(e).strip(), flags=[{'type': 'error', 'message': str(e).strip()}])
+            return entry
+        finally:
+            # EXPLAIN ANALYZE выполняет запрос - изменения данных откатываются
+            self.conn.rollback()
+        shape, flags = analyze_plan(plan, self.table_rows, self.large_table_rows, self.misestimate_ratio)
+        top = plan['Plan']
+        entry.update(
+            execution_ms=round(plan.get('Execution Time', 0.0), 3),
+            planning_ms=round(plan.get('Planning Time', 0.0), 3),
+            shared_hit_blocks=top.get('Shared Hit Blocks', 0),
+            shared_read_blocks=top.get('Shared Read Blocks', 0),
+            signature=hashlib.sha1('\n'.join(shape).encode()).hexdigest()[:12],
+            shape=shape,
+            flags=flags,
+            plan=plan,
+        )
+        return entry
+
+
+def _params_repr(params):
+    """Параметры запроса в виде, пригодном для JSON (длинные списки ID сокращаются)."""
+    def convert(value):
+        if isinstance(value, (list, tuple)) and len(value) > 10:
+            return f"<{len(value)} значений>"
+        if isinstance(value, (date, datetime)):
+            return value.isoformat()
+        return value if isinstance(value, (str, int, float, bool, type(None))) else str(value)
+    if isinstance(params, dict):
+        return {key: convert(value) for key, value in params.items()}
+    return [convert(value) for value in params] if params else params
+
+
+def _fetch_person(conn, where):
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT surname, name, middle_name, birth_date FROM {where} LIMIT 1")
+        return cur.fetchone()
+
+
+def build_scenarios(conn, seed):
+    """
+    Сценарии: (название, функция от DatabaseManager, выполнять ли запросы на самом деле).
+    Параметры берутся из базы, поэтому планы соответствуют типичным, а не пустым выборкам.
+    """
+    surname, name, middle_name, birth_date, organization = sample_people(conn, 1, seed)[0]
+    td_person = _fetch_person(conn, "TD")
+    pending = _fetch_person(conn, "AccrTable WHERE status = 'в ожидании'")
+    with conn.cursor() as cur:
+        cur.execute("SELECT id FROM AccrTable WHERE surname = %s AND name = %s AND birth_date = %s LIMIT 1",
+                    (surname, name, birth_date))
+        person_id = cur.fetchone()[0]
+        cur.execute("SELECT id FROM AccrTable WHERE status = 'в ожидании' LIMIT 1000")
+        pending_ids = [row[0] for row in cur.fetchall()]
+
+    # Новый сотрудник (дата рождения вне диапазона синтетических данных) - путь с INSERT
+    rng = np.random.default_rng()
+    new_person = {'Фамилия': 'Планов', 'Имя': 'Тест', 'Отчество': 'Запросович',
+                  'Дата рождения': date.fromordinal(date(1920, 1, 1).toordinal() + int(rng.integers(0, 10_000))),
+                  'Место рождения': 'г. Москва', 'Регистрация': 'г. Москва, ул. Ленина, д. 1',
+                  'Организация': 'ООО "Ромашка"', 'Должность': 'Инженер', 'Примечания': ''}
+    person_data = {'Фамилия': surname, 'Имя': name, 'Отчество': middle_name, 'Дата рождения': birth_date,
+                   'Организация': organization}
+
+    scenarios = [
+        ('find_person_in_accrtable', lambda db: db.find_person_in_accrtable(surname, name, middle_name, birth_date)),
+        ('get_person_status', lambda db: db.get_person_status(surname, name, middle_name, birth_date)),
+        ('get_person_status (нет в базе)',
+         lambda db: db.get_person_status(surname, name, middle_name, birth_date.replace(year=1950))),
+        ('search_people (фамилия)', lambda db: db.search_people(surname)),
+        ('search_people (фрагмент)', lambda db: db.search_people('ова')),
+        ('search_people_page (первая страница)', lambda db: db.search_people_page('ова', limit=50)),
+        ('search_people_page (следующая страница)',
+         lambda db: db.search_people_page('ова', after=(surname, name, person_id, 'AccrTable'), limit=500)),
+        ('count_search_results', lambda db: db.count_search_results('ова')),
+        ('get_employee_records', lambda db: db.get_employee_records(person_id)),
+        ('get_notes', lambda db: db.get_notes(person_id)),
+        ('get_notes_batch', lambda db: db.get_notes_batch(pending_ids + [person_id])),
+        ('update_notes', lambda db: db.update_notes(person_id, db.get_notes(person_id))),
+        ('get_people_for_recheck (ГПХ)', lambda db: db.get_people_for_recheck(only_gph=True)),
+        ('get_people_for_recheck (подрядчики)', lambda db: db.get_people_for_recheck(only_gph=False)),
+        ('get_people_details', lambda db: db.get_people_details(pending_ids)),
+        ('get_all_from_td_full', lambda db: db.get_all_from_td_full()),
+        ('check_accreditation_expiry', lambda db: db.check_accreditation_expiry()),
+        ('add_to_accrtable (новый)', lambda db: db.add_to_accrtable(new_person)),
+        ('add_to_td', lambda db: db.add_to_td(dict(new_person, **{'Фамилия': 'Планова', 'Имя': 'Проверка'}))),
+        ('update_accreditation_status', lambda db: db.update_accreditation_status(person_id, 'аккредитован')),
+        ('toggle_blacklist (в ЧС)', lambda db: db.toggle_blacklist(person_data)),
+        ('toggle_blacklist (из ЧС)', lambda db: db.toggle_blacklist(person_data)),
+    ]
+    if td_person:
+        scenarios.insert(1, ('find_person_in_td', lambda db: db.find_person_in_td(*td_person)))
+    if pending:
+        scenarios.append(('activate_person_by_details', lambda db: db.activate_person_by_details(*pending)))
+    # Очистка TD только анализируется: ее выполнение опустошило бы таблицу для следующих запусков
+    return [(name, call, True) for name, call in scenarios] + [('clean_td', lambda db: db.clean_td(), False)]
+
+
+def compare(entries, previous):
+    """Добавляет замечание plan_changed к запросам, форма плана которых изменилась."""
+    old = {entry['key']: entry for entry in previous['entries'] if entry.get('signature')}
+    for entry in entries:
+        before = old.get(entry['key'])
+        if before and entry.get('signature') and before['signature'] != entry['signature']:
+            entry['flags'].append({'type': 'plan_changed', 'previous_shape': before['shape'],
+                                   'previous_execution_ms': before.get('execution_ms')})
+
+
+def table_rows(conn):
+    """Оценка числа строк таблиц (pg_class.reltuples после ANALYZE)."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT relname, GREATEST(reltuples, 0)::BIGINT FROM pg_class "
+                    "WHERE relkind = 'r' AND relnamespace = 'public'::regnamespace")
+        return dict(cur.fetchall())
+
+
+def run_report(db_config, large_table_rows, misestimate_ratio, seed):
+    conn = psycopg2.connect(**db_config)
+    try:
+        params = seed_params(conn)
+        if params is None:
+            raise SystemExit(f"База {db_config['database']} не заполнена нагрузочным тестом. "
+                             f"Сначала выполните: python db_load_test.py seed")
+        rows = table_rows(conn)
+        scenarios = build_scenarios(conn, seed)
+        conn.rollback()
+
+        db = DatabaseManager(db_config)
+        recorder = PlanRecorder(db, conn, rows, large_table_rows, misestimate_ratio)
+        for name, call, execute in scenarios:
+            recorder.scenario, recorder.execute = name, execute
+            try:
+                call(db)
+            except Exception as e:
+                recorder.entries.append({'scenario': name, 'key': f"{name}|call", 'query': None,
+                                         'error': f"{type(e).__name__}: {e}",
+                                         'flags': [{'type': 'error', 'message': f"{type(e).__name__}: {e}"}]})
+        db.close_pool()
+        return {'seed_params': params, 'table_counts': table_counts(conn), 'entries': recorder.entries}
+    finally:
+        conn.close()
+
+
+def print_report(entries):
+    print(f"{'Сценарий':<36} {'Время, мс':>10}  Запрос / замечания")
+    for entry in entries:
+        time_ms = f"{entry['execution_ms']:>10.2f}" if 'execution_ms' in entry else f"{'-':>10}"
+        print(f"{entry['scenario']:<36} {time_ms}  {(entry['query'] or '')[:90]}")
+        for flag in entry['flags']:
+            if flag['type'] == 'seq_scan':
+                print(f"{'':<48}! seq_scan: {flag['node']} ({flag['table_rows']} строк), фильтр: {flag['filter']}")
+            elif flag['type'] == 'misestimate':
+                print(f"{'':<48}! misestimate: {flag['node']}: оценка {flag['plan_rows']}, "
+                      f"факт {flag['actual_rows']} x {flag['loops']}")
+            elif flag['type'] == 'plan_changed':
+                print(f"{'':<48}! plan_changed: было {flag['previous_execution_ms']} мс, "
+                      f"план: {' / '.join(line.strip() for line in flag['previous_shape'])}")
+            else:
+                print(f"{'':<48}! error: {flag['message'][:120]}")
+    counts = {}
+    for entry in entries:
+        for flag in entry['flags']:
+            counts[flag['type']] = counts.get(flag['type'], 0) + 1
+    print(f"\nЗапросов: {len(entries)}, замечаний: {counts or 'нет'}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Планы выполнения запросов DatabaseManager и их регрессии.")
+    parser.add_argument('--allow-remote', action='store_true', help="Разрешить нелокальный сервер БД")
+    parser.add_argument('--large-table-rows', type=int, default=10_000,
+                        help="Таблицы с таким числом строк и больше считаются большими (замечание seq_scan)")
+    parser.add_argument('--misestimate-ratio', type=float, default=10.0,
+                        help="Во сколько раз оценка строк должна отличаться от факта для замечания misestimate")
+    parser.add_argument('--seed', type=int, default=0, help="Зерно выбора сотрудника для запросов")
+    parser.add_argument('--output', default='explain_report.json', help="Файл отчета в JSON")
+    parser.add_argument('--compare', help="Предыдущий отчет для поиска изменившихся планов")
+    parser.add_argument('--verbose', action='store_true', help="Не отключать журнал приложения")
+    args = parser.parse_args(argv)
+
+    if not args.verbose:
+        logging.disable(logging.WARNING)
+
+    db_config = get_load_test_db_config()
+    check_target(db_config, args.allow_remote)
+    report = run_report(db_config, args.large_table_rows, args.misestimate_ratio, args.seed)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare(report['entries'], json.load(f))
+    print_report(report['entries'])
+
+    report = {'timestamp': datetime.now().isoformat(timespec='seconds'), **report}
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2, default=str)
+    print(f"Отчет сохранен в {args.output}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
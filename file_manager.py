@@ -1,10 +1,14 @@
 # file_manager.py
 import os
+import time
+import codecs
+import itertools
+import numpy as np
 import pandas as pd
 
 from datetime import datetime
 import logging
-from config import get_logger, get_scheduler_output_dir  # Используем настроенный логгер
+from config import get_logger, get_scheduler_output_dir, get_ingest_config  # Используем настроенный логгер
 
 # Только если доступен GUI
 try:
@@ -14,6 +18,28 @@ except ImportError:
     GUI_AVAILABLE = False
     logging.warning('PyQt5 not available')
 
+# Быстрый движок чтения Excel (Rust) - необязательная зависимость
+try:
+    from python_calamine import CalamineWorkbook
+    CALAMINE_AVAILABLE = True
+except ImportError:
+    CALAMINE_AVAILABLE = False
+
+# Старый формат .xls без calamine читается через pd.read_excel движком xlrd - необязательная зависимость
+try:
+    import xlrd  # Используется внутри pd.read_excel
+    XLRD_AVAILABLE = True
+except ImportError:
+    XLRD_AVAILABLE = False
+
+# Parquet/Feather читаются через pyarrow - необязательная зависимость
+try:
+    import pyarrow.parquet as pq
+    import pyarrow.feather as feather
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
 class FileManager:
     def __init__(self, parent_widget=None):
         # parent_widget нужен только для QFileDialog
@@ -56,18 +82,260 @@ class FileManager:
             # Устанавливаем ширину с небольшим запасом
             worksheet.set_column(idx, idx, max_len + 2)
 
+    # Движки чтения входных файлов по расширению, в порядке предпочтения
+    INPUT_READERS = {
+        '.xlsx': ('calamine', 'openpyxl'),
+        '.xlsm': ('calamine', 'openpyxl'),
+        '.xls': ('calamine', 'xlrd'),
+        '.csv': ('csv',),
+        '.parquet': ('parquet',),
+        '.feather': ('feather',),
+    }
+    # Движок -> (метод FileManager, доступен ли движок)
+    READER_BACKENDS = {
+        'calamine': ('_iter_calamine_batches', CALAMINE_AVAILABLE),
+        'openpyxl': ('_iter_openpyxl_batches', True),
+        'xlrd': ('_iter_read_excel_batches', XLRD_AVAILABLE),
+        'csv': ('_iter_csv_batches', True),
+        'parquet': ('_iter_parquet_batches', PYARROW_AVAILABLE),
+        'feather': ('_iter_feather_batches', PYARROW_AVAILABLE),
+    }
+
+    # Необязательные движки -> пакет для установки
+    READER_PACKAGES = {'calamine': 'python-calamine', 'xlrd': 'xlrd', 'parquet': 'pyarrow', 'feather': 'pyarrow'}
+
     def open_file_dialog(self):
-        """Открывает диалог выбора Excel файла."""
+        """Открывает диалог выбора входного файла (Excel, CSV, Parquet/Feather)."""
+        extensions = " ".join(f"*{ext}" for ext in self.INPUT_READERS)
         file_name, _ = QFileDialog.getOpenFileName(
             self.parent_widget,
-            "Выберите файл Excel",
+            "Выберите файл со списком",
             "",
-            "Excel Files (*.xlsx *.xls)"
+            f"Поддерживаемые файлы ({extensions});;Excel Files (*.xlsx *.xlsm *.xls);;"
+            f"CSV Files (*.csv);;Parquet/Feather Files (*.parquet *.feather)"
         )
         if file_name:
             self.logger.info(f"Выбран файл для загрузки: {file_name}")
         return file_name
 
+    def select_reader(self, file_name):
+        """Возвращает (название движка, генератор пакетов) для файла по его расширению."""
+        extension = os.path.splitext(file_name)[1].lower()
+        backends = self.INPUT_READERS.get(extension)
+        if not backends:
+            raise ValueError(f"Неподдерживаемый формат файла: '{extension}'. "
+                             f"Поддерживаются: {', '.join(self.INPUT_READERS)}")
+        for backend in backends:
+            method_name, available = self.READER_BACKENDS[backend]
+            if available:
+                return backend, getattr(self, method_name)
+        packages = dict.fromkeys(self.READER_PACKAGES[backend] for backend in backends if backend in self.READER_PACKAGES)
+        raise ImportError(f"Для чтения файлов '{extension}' не установлен ни один из движков: {', '.join(backends)}. "
+                          f"Установите: pip install {' или '.join(packages)}")
+
+    def iter_input_batches(self, file_name, batch_rows=None, timings=None):
+        """
+        Потоково читает входной файл пакетами по batch_rows строк движком, выбранным по расширению.
+        Генератор возвращает кортежи (batch_df, rows_read, total_rows); если число строк заранее
+        неизвестно (CSV), total_rows - оценка по числу строк файла. Время чтения каждого пакета добавляется
+        в timings (StageTimings) как этап 'read'.
+        """
+        batch_rows = batch_rows or get_ingest_config()['batch_rows']
+        backend, reader = self.select_reader(file_name)
+        self.logger.info(f"Чтение {os.path.basename(file_name)}: движок '{backend}'")
+
+        # Учитываем только время самого чтения, без обработки пакетов вызывающим кодом
+        read_time = 0.0
+        rows_read = 0
+        batches = reader(file_name, batch_rows)
+        while True:
+            started = time.perf_counter()
+            try:
+                batch, rows_read, total_rows = next(batches)
+            except StopIteration:
+                break
+            finally:
+                batch_time = time.perf_counter() - started
+                read_time += batch_time
+            if timings is not None:
+                timings.add('read', batch_time, len(batch))
+            yield batch, rows_read, total_rows
+        self.logger.info(f"Файл {os.path.basename(file_name)} прочитан движком '{backend}': "
+                         f"{rows_read} строк за {read_time:.2f} с")
+
+    @staticmethod
+    def _make_header(values):
+        """Формирует названия колонок так же, как pd.read_excel (Unnamed: N и суффиксы .1 для повторов)."""
+        header = []
+        seen = {}
+        for i, value in enumerate(values):
+            name = f"Unnamed: {i}" if value is None else value
+            if name in seen:
+                seen[name] += 1
+                name = f"{name}.{seen[name]}"
+            else:
+                seen[name] = 0
+            header.append(name)
+        return header
+
+    @staticmethod
+    def _rows_to_frame(rows, header, start_row):
+        """Собирает пакет строк в DataFrame с глобальной нумерацией строк (как индекс pd.read_excel)."""
+        batch = pd.DataFrame(rows, columns=header, index=pd.RangeIndex(start_row, start_row + len(rows)))
+        return FileManager._normalize_missing(batch)
+
+    @staticmethod
+    def _normalize_missing(batch):
+        """
+        Пустые ячейки openpyxl и pyarrow отдают как None (pyarrow - еще и как ''), а pd.read_excel и read_csv - как NaN;
+        приводим к единому виду.
+        """
+        batch = batch.replace('', None)
+        return batch.where(batch.notna(), np.nan).infer_objects()
+
+    def _iter_row_batches(self, rows_iter, batch_rows, total_rows, width=None):
+        """
+        Собирает пакеты из построчного итератора значений; первая строка - заголовок.
+        width - число колонок листа, если оно известно заранее (иначе берется по заголовку). У всех пакетов
+        одни и те же колонки: короткие строки дополняются пустыми ячейками, лишние ячейки длинных строк
+        отбрасываются (о непустых пишется предупреждение).
+        """
+        header_values = next(rows_iter, None)
+        if header_values is None:
+            return
+        width = max(width or 0, len(header_values))
+        header = self._make_header(tuple(header_values) + (None,) * (width - len(header_values)))
+
+        rows_read = 0
+        overflow_rows = 0
+        rows = []
+        for values in rows_iter:
+            if len(values) > width:
+                if any(value is not None and value != '' for value in values[width:]):
+                    overflow_rows += 1
+                values = values[:width]
+            elif len(values) < width:
+                # Короткие строки дополняются пустыми ячейками, как в pd.read_excel
+                values = tuple(values) + (None,) * (width - len(values))
+            rows.append(values)
+            if len(rows) >= batch_rows:
+                batch = self._rows_to_frame(rows, header, rows_read)
+                rows_read += len(rows)
+                rows = []
+                yield batch, rows_read, total_rows
+        if rows:
+            batch = self._rows_to_frame(rows, header, rows_read)
+            rows_read += len(rows)
+            yield batch, rows_read, total_rows
+        if overflow_rows:
+            self.logger.warning(f"В {overflow_rows} строках есть значения правее последней колонки листа ({width}): "
+                                f"они пропущены.")
+
+    def _iter_calamine_batches(self, file_name, batch_rows):
+        """Читает первый лист Excel (.xlsx/.xls) движком calamine."""
+        workbook = CalamineWorkbook.from_path(file_name)
+        try:
+            sheet = workbook.get_sheet_by_index(0)
+            total_rows = max(sheet.height - 1, 0)
+            # Старые версии python-calamine не умеют отдавать строки по одной
+            rows = sheet.iter_rows() if hasattr(sheet, 'iter_rows') else iter(sheet.to_python())
+            # Пустые ячейки calamine отдает как ''; заголовок приводим к None, как у openpyxl,
+            # значения приводятся к NaN при сборке пакета
+            header_row = next(rows, None)
+            if header_row is None:
+                return
+            header_values = tuple(None if value == '' else value for value in header_row)
+            yield from self._iter_row_batches(itertools.chain([header_values], rows), batch_rows, total_rows,
+                                              sheet.width)
+        finally:
+            if hasattr(workbook, 'close'):
+                workbook.close()
+
+    def _iter_openpyxl_batches(self, file_name, batch_rows):
+        """Читает первый лист .xlsx через openpyxl в режиме read-only, не загружая книгу целиком."""
+        from openpyxl import load_workbook
+        workbook = load_workbook(file_name, read_only=True, data_only=True)
+        try:
+            # Первый лист, как у pd.read_excel и calamine (активный лист зависит от того, какой был открыт при сохранении)
+            sheet = workbook.worksheets[0]
+            total_rows = sheet.max_row - 1 if sheet.max_row else None
+            yield from self._iter_row_batches(sheet.iter_rows(values_only=True), batch_rows, total_rows,
+                                              sheet.max_column)
+        finally:
+            workbook.close()
+
+    def _iter_read_excel_batches(self, file_name, batch_rows):
+        """Старый формат .xls без calamine: читаем целиком через pd.read_excel и отдаем теми же пакетами."""
+        df = pd.read_excel(file_name)
+        for start in range(0, len(df), batch_rows):
+            yield df.iloc[start:start + batch_rows], min(start + batch_rows, len(df)), len(df)
+
+    def _detect_csv_format(self, file_name, sample_size=64 * 1024):
+        """Определяет кодировку (utf-8 или cp1251) и разделитель CSV по началу файла."""
+        with open(file_name, 'rb') as f:
+            sample = f.read(sample_size)
+        if sample.startswith(codecs.BOM_UTF8):
+            encoding = 'utf-8-sig'
+        else:
+            try:
+                # final=False: символ, обрезанный границей выборки, не считается ошибкой
+                codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+                encoding = 'utf-8'
+            except UnicodeDecodeError:
+                encoding = 'cp1251'
+        header_line = sample.decode(encoding, errors='replace').splitlines()[0] if sample else ''
+        # Excel в русской локали сохраняет CSV с разделителем ';'
+        separator = max((';', ',', '\t'), key=header_line.count)
+        return encoding, separator
+
+    @staticmethod
+    def _estimate_csv_rows(file_name, block_size=1024 * 1024):
+        """
+        Оценка числа строк данных CSV по числу переводов строк (без заголовка). Значения с переводами
+        строк внутри кавычек дают небольшое завышение - для индикатора прогресса это допустимо.
+        """
+        lines = 0
+        last_byte = b'\n'
+        with open(file_name, 'rb') as f:
+            for block in iter(lambda: f.read(block_size), b''):
+                lines += block.count(b'\n')
+                last_byte = block[-1:]
+        if last_byte != b'\n':
+            lines += 1  # Последняя строка без перевода строки
+        return max(lines - 1, 0)
+
+    def _iter_csv_batches(self, file_name, batch_rows):
+        """Читает CSV пакетами; все значения читаются как текст, пустые ячейки - как NaN."""
+        encoding, separator = self._detect_csv_format(file_name)
+        self.logger.debug(f"CSV {os.path.basename(file_name)}: кодировка {encoding}, разделитель {separator!r}")
+        total_rows = self._estimate_csv_rows(file_name)
+        rows_read = 0
+        with pd.read_csv(file_name, sep=separator, encoding=encoding, encoding_errors='replace',
+                         dtype=str, chunksize=batch_rows) as reader:
+            for batch in reader:
+                rows_read += len(batch)
+                yield batch, rows_read, max(total_rows, rows_read)
+
+    def _iter_arrow_batches(self, record_batches, total_rows):
+        """Преобразует пакеты pyarrow в DataFrame с глобальной нумерацией строк."""
+        rows_read = 0
+        for record_batch in record_batches:
+            batch = self._normalize_missing(record_batch.to_pandas())
+            batch.index = pd.RangeIndex(rows_read, rows_read + len(batch))
+            rows_read += len(batch)
+            yield batch, rows_read, total_rows
+
+    def _iter_parquet_batches(self, file_name, batch_rows):
+        """Читает Parquet по пакетам строк через pyarrow."""
+        parquet_file = pq.ParquetFile(file_name)
+        yield from self._iter_arrow_batches(parquet_file.iter_batches(batch_size=batch_rows),
+                                            parquet_file.metadata.num_rows)
+
+    def _iter_feather_batches(self, file_name, batch_rows):
+        """Читает Feather (Arrow IPC) через отображение файла в память и отдает пакетами."""
+        table = feather.read_table(file_name, memory_map=True)
+        yield from self._iter_arrow_batches(table.to_batches(max_chunksize=batch_rows), table.num_rows)
+
     def save_file_dialog(self, default_filename="report"):
         """Открывает диалог сохранения Excel файла."""
         # Добавляем дату и время к имени файла по умолчанию
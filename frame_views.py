@@ -0,0 +1,56 @@
+# frame_views.py
+from collections.abc import Mapping
+
+import pandas as pd
+
+
+class FrameView:
+    """
+    Часть канонического DataFrame: хранит только метки строк и список колонок.
+    Сам DataFrame собирается по запросу (to_frame), поэтому отчеты и списки
+    не держат в памяти собственные копии данных.
+    """
+
+    def __init__(self, frame, index, columns=None, reset_index=False):
+        self.frame = frame
+        self.index = index
+        self.columns = list(frame.columns) if columns is None else list(columns)
+        self.reset_index = reset_index
+
+    @classmethod
+    def empty_view(cls):
+        return cls(pd.DataFrame(), pd.Index([]))
+
+    def __len__(self):
+        return len(self.index)
+
+    @property
+    def empty(self):
+        return len(self.index) == 0
+
+    def to_frame(self):
+        """Собирает DataFrame из строк представления (копия, которую можно изменять)."""
+        df = self.frame.loc[self.index, self.columns]
+        return df.reset_index(drop=True) if self.reset_index else df
+
+
+class FrameViews(Mapping):
+    """Словарь именованных представлений; при обращении по ключу возвращает собранный DataFrame."""
+
+    def __init__(self, views=None):
+        self._views = dict(views or {})
+
+    def __getitem__(self, key):
+        return self._views[key].to_frame()
+
+    def __iter__(self):
+        return iter(self._views)
+
+    def __len__(self):
+        return len(self._views)
+
+    def view(self, key):
+        return self._views[key]
+
+    def has_rows(self):
+        return any(not view.empty for view in self._views.values())
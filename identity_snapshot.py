@@ -0,0 +1,154 @@
+# identity_snapshot.py
+import threading
+import time
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from config import get_logger, get_status_check_config
+
+KEY_SEPARATOR = '\x1f'
+
+
+def identity_keys(surname, name, middle_name, birth_date):
+    """
+    Ключи личностей для сопоставления строк файла со снимком БД: те же поля и то же сравнение,
+    что в find_person_in_accrtable (отчество None и '' равны, дата рождения - ГГГГ-ММ-ДД).
+    Для строк без фамилии, имени или даты рождения ключ - None: такие строки в БД не ищутся.
+    """
+    surname = surname.astype(object)
+    name = name.astype(object)
+    middle_name = middle_name.astype(object)
+    dates = pd.to_datetime(birth_date.astype(object), errors='coerce')
+    valid = surname.notna() & (surname != '') & name.notna() & (name != '') & dates.notna()
+    keys = (surname.astype(str) + KEY_SEPARATOR + name.astype(str) + KEY_SEPARATOR
+            + middle_name.where(middle_name.notna(), '').astype(str) + KEY_SEPARATOR
+            + dates.dt.strftime('%Y-%m-%d'))
+    return keys.where(valid, None)
+
+
+class IdentitySnapshot:
+    """
+    Снимок известных личностей БД в памяти: AccrTable с последней записью mainTable и TD.
+    Статусы строк загруженного файла определяются по нему хэш-поиском ключей (pd.Index.get_indexer)
+    без запроса к БД на каждую строку; результат тот же, что у DatabaseManager.get_person_status.
+    Первое обновление загружает снимок целиком, следующие - только записи AccrTable, добавленные
+    или измененные после предыдущего снимка (added_date, mainTable.last_checked); TD загружается
+    целиком. Если число записей AccrTable не сходится (записи удалялись) или снимок старше
+    full_refresh_min, он загружается заново.
+    """
+
+    def __init__(self, db_manager, config=None):
+        config = config or get_status_check_config()
+        self.db_manager = db_manager
+        self.full_refresh_sec = config['full_refresh_min'] * 60
+        self.overlap = timedelta(seconds=config['overlap_sec'])
+        self.logger = get_logger(__name__)
+        self._lock = threading.Lock()
+        self._people = None  # DataFrame по person_id: key, black_list, end_accr
+        self._synced_at = None  # Время сервера последнего снимка
+        self._full_loaded_at = None  # time.monotonic() последней полной загрузки
+        self._lookup = None
+        self._td_lookup = None
+
+    @property
+    def loaded(self):
+        return self._people is not None
+
+    def refresh(self, query_handle=None):
+        """
+        Обновляет снимок. Возвращает False, если получить его не удалось (статусы тогда проверяются запросами).
+        query_handle (CancellableQuery) - через него загрузку снимка можно прервать; прежний снимок сохраняется.
+        """
+        with self._lock:
+            full = self._people is None or time.monotonic() - self._full_loaded_at >= self.full_refresh_sec
+            snapshot = self.db_manager.get_identity_snapshot(
+                changed_since=None if full else self._synced_at - self.overlap, query_handle=query_handle)
+            if snapshot is None:
+                return False
+            people = self._prepare_people(snapshot['people'])
+            if not full:
+                changed = people
+                people = pd.concat([self._people.drop(changed.index, errors='ignore'), changed])
+                if len(people) != snapshot['people_count']:
+                    self.logger.info("В AccrTable удалялись записи - снимок личностей загружается заново.")
+                    snapshot = self.db_manager.get_identity_snapshot(query_handle=query_handle)
+                    if snapshot is None:
+                        return False
+                    people = self._prepare_people(snapshot['people'])
+                    full = True
+                elif changed.empty and self._lookup is not None:
+                    self._synced_at = snapshot['server_time']
+                    self._td_lookup = self._build_td_lookup(snapshot['td'])
+                    return True
+
+            self._people = people
+            self._synced_at = snapshot['server_time']
+            if full:
+                self._full_loaded_at = time.monotonic()
+            # Для одинаковых личностей берется запись с наибольшим ID, как в find_person_in_accrtable
+            lookup = people[people['key'].notna()].sort_index().drop_duplicates('key', keep='last')
+            end_accr = lookup['end_accr']
+            self._lookup = {
+                'index': pd.Index(lookup['key']),
+                'person_id': lookup.index.to_numpy().astype(object),
+                'black_list': lookup['black_list'].to_numpy(bool),
+                'has_end': end_accr.notna().to_numpy(),
+                'end_ns': end_accr.to_numpy('datetime64[ns]').view('int64'),
+            }
+            self._td_lookup = self._build_td_lookup(snapshot['td'])
+            return True
+
+    @staticmethod
+    def _prepare_people(df):
+        keys = identity_keys(df['surname'], df['name'], df['middle_name'], df['birth_date'])
+        # Нет записи mainTable - не в черном списке и без срока аккредитации
+        black_list = df['black_list'].astype(object)
+        return pd.DataFrame({
+            'key': keys.to_numpy(),
+            'black_list': black_list.where(black_list.notna(), False).astype(bool).to_numpy(),
+            'end_accr': pd.to_datetime(df['end_accr'], utc=True).dt.tz_convert(None).to_numpy('datetime64[ns]'),
+        }, index=pd.Index(df['person_id'].astype('int64'), name='person_id'))
+
+    @staticmethod
+    def _build_td_lookup(df):
+        keys = identity_keys(df['surname'], df['name'], df['middle_name'], df['birth_date'])
+        td = pd.DataFrame({'key': keys.to_numpy(), 'td_id': df['td_id'].to_numpy()})
+        td = td[td['key'].notna()].sort_values('td_id').drop_duplicates('key', keep='last')
+        return {'index': pd.Index(td['key']), 'td_id': td['td_id'].to_numpy().astype(object)}
+
+    def lookup(self, df):
+        """
+        Статусы строк df (колонки Фамилия, Имя, Отчество, Дата рождения) по снимку.
+        Возвращает DataFrame с колонками status ('BLACKLISTED', 'ACTIVE', 'EXPIRED', 'CHECKING', 'NOT_FOUND')
+        и person_id по индексу df или None, если снимок не загружен.
+        Сотрудник, найденный только в TD, получает статус CHECKING и ID записи TD.
+        """
+        with self._lock:
+            if self._lookup is None:
+                return None
+            keys = identity_keys(df['Фамилия'], df['Имя'], df['Отчество'], df['Дата рождения'])
+            people, td = self._lookup, self._td_lookup
+            position = people['index'].get_indexer(keys)
+            found = position >= 0
+            position = np.where(found, position, 0)
+            if len(people['index']):
+                black_list = people['black_list'][position] & found
+                has_end = people['has_end'][position] & found
+                end_ns = people['end_ns'][position]
+                person_id = np.where(found, people['person_id'][position], None)
+            else:
+                black_list = has_end = np.zeros(len(keys), dtype=bool)
+                end_ns = np.zeros(len(keys), dtype='int64')
+                person_id = np.full(len(keys), None, dtype=object)
+            now_ns = pd.Timestamp.now(tz='UTC').value
+            status = np.select(
+                [~found, black_list, has_end & (end_ns > now_ns), has_end & (end_ns < now_ns)],
+                ['NOT_FOUND', 'BLACKLISTED', 'ACTIVE', 'EXPIRED'], 'CHECKING').astype(object)
+
+            td_position = td['index'].get_indexer(keys)
+            in_td = ~found & (td_position >= 0)
+            status[in_td] = 'CHECKING'
+            person_id[in_td] = td['td_id'][td_position[in_td]]
+        return pd.DataFrame({'status': status, 'person_id': person_id}, index=df.index)
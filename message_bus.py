@@ -0,0 +1,128 @@
+# message_bus.py
+import threading
+import time
+from collections import deque
+
+from PyQt5.QtCore import Qt, QObject, QAbstractListModel, QModelIndex, QTimer, pyqtSignal
+from PyQt5.QtGui import QBrush, QColor
+
+from config import get_message_bus_config
+
+# Цвет строки лога по уровню сообщения
+LEVEL_COLORS = {
+    "DEBUG": "grey",
+    "INFO": "green",
+    "WARNING": "orange",
+    "ERROR": "darkred",
+    "CRITICAL": "red",
+}
+
+
+class MessageBus(QObject):
+    """
+    Передача логов и прогресса фоновых задач в окно порциями.
+    post_log и post_progress можно вызывать из любого потока: они только складывают данные в буфер
+    и при первом сообщении после разбора будят основной поток. Основной поток через flush_ms забирает
+    буфер целиком: строки лога уходят одним сигналом logs_ready, от прогресса остается последнее
+    значение, и оно передается не чаще progress_max_per_sec раз в секунду. Так задачи, сообщающие
+    о каждой строке файла, не переполняют очередь событий Qt.
+    """
+    logs_ready = pyqtSignal(list)      # Порция строк лога [(текст, уровень)]
+    progress_changed = pyqtSignal(int) # Последнее значение прогресса (0-100)
+    _wake = pyqtSignal()
+
+    def __init__(self, config=None, parent=None):
+        super().__init__(parent)
+        config = config or get_message_bus_config()
+        self.progress_interval = 1.0 / config['progress_max_per_sec']
+        self._lock = threading.Lock()
+        self._logs = []
+        self._progress = None
+        self._last_progress_at = 0.0
+        self._scheduled = False
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(config['flush_ms'])
+        self._timer.timeout.connect(self.flush)
+        self._wake.connect(lambda: self._timer.start()) # Из других потоков - через очередь событий
+
+    def post_log(self, text, level):
+        with self._lock:
+            self._logs.append((text, level))
+            wake = not self._scheduled
+            self._scheduled = True
+        if wake:
+            self._wake.emit()
+
+    def post_progress(self, value):
+        with self._lock:
+            self._progress = value
+            wake = not self._scheduled
+            self._scheduled = True
+        if wake:
+            self._wake.emit()
+
+    def flush(self):
+        """Передает накопленные сообщения (вызывается таймером в основном потоке)."""
+        with self._lock:
+            logs, self._logs = self._logs, []
+            progress = self._progress
+            now = time.monotonic()
+            send_progress = progress is not None and now - self._last_progress_at >= self.progress_interval
+            if send_progress:
+                self._progress = None
+                self._last_progress_at = now
+            # Прогресс, отложенный из-за ограничения частоты, передается со следующей порцией
+            self._scheduled = reschedule = self._progress is not None
+        if logs:
+            self.logs_ready.emit(logs)
+        if send_progress:
+            self.progress_changed.emit(progress)
+        if reschedule:
+            self._timer.start()
+
+
+class LogListModel(QAbstractListModel):
+    """
+    Модель лога операций в окне: кольцевой буфер последних max_lines строк, самые старые удаляются.
+    Многострочные сообщения (трассировки ошибок, отчеты) разбиваются на строки списка
+    с отступом, чтобы все строки были одной высоты.
+    """
+
+    def __init__(self, max_lines, parent=None):
+        super().__init__(parent)
+        self._lines = deque(maxlen=max_lines)  # (текст, уровень)
+        self._brushes = {level: QBrush(QColor(color)) for level, color in LEVEL_COLORS.items()}
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._lines)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        text, level = self._lines[index.row()]
+        if role == Qt.DisplayRole:
+            return text
+        if role == Qt.ForegroundRole:
+            return self._brushes.get(level)
+        return None
+
+    def append_entries(self, entries):
+        """Добавляет порцию сообщений [(текст, уровень)] в конец лога."""
+        lines = [(line if i == 0 else "    " + line, level)
+                 for text, level in entries for i, line in enumerate(text.split('\n'))]
+        lines = lines[-self._lines.maxlen:]
+        if not lines:
+            return
+        overflow = len(self._lines) + len(lines) - self._lines.maxlen
+        if overflow > 0:
+            self.beginRemoveRows(QModelIndex(), 0, overflow - 1)
+            for _ in range(overflow):
+                self._lines.popleft()
+            self.endRemoveRows()
+        self.beginInsertRows(QModelIndex(), len(self._lines), len(self._lines) + len(lines) - 1)
+        self._lines.extend(lines)
+        self.endInsertRows()
+
+    def text(self, row):
+        return self._lines[row][0]
@@ -0,0 +1,79 @@
+# notes_cache.py
+import threading
+import time
+from collections import OrderedDict
+
+from config import get_logger, get_notes_cache_config
+
+
+class NotesCache:
+    """
+    Кэш примечаний сотрудников по person_id с вытеснением давно не использованных записей (LRU).
+    Записи старше ttl_sec считаются отсутствующими. Каждое изменение примечаний (invalidate)
+    увеличивает поколение кэша: результаты запросов, начатых в предыдущем поколении, не сохраняются,
+    чтобы примечания, прочитанные до сохранения, не заменили новые.
+    """
+
+    def __init__(self, config=None):
+        config = config or get_notes_cache_config()
+        self.max_entries = config['max_entries']
+        self.ttl_sec = config['ttl_sec']
+        self.logger = get_logger(__name__)
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # person_id -> (примечания, time.monotonic() загрузки)
+        self._generation = 0
+
+    @property
+    def generation(self):
+        """Поколение кэша; запоминается при запуске запроса и передается в store()."""
+        return self._generation
+
+    def _fresh(self, loaded_at, now):
+        return not self.ttl_sec or now - loaded_at < self.ttl_sec
+
+    def get(self, person_id):
+        """Примечания из кэша или None, если их нет или они устарели."""
+        with self._lock:
+            entry = self._entries.get(person_id)
+            if entry is None:
+                return None
+            if not self._fresh(entry[1], time.monotonic()):
+                del self._entries[person_id]
+                return None
+            self._entries.move_to_end(person_id)
+            return entry[0]
+
+    def missing(self, person_ids):
+        """ID из person_ids (без повторов, в том же порядке), примечаний которых нет в кэше."""
+        now = time.monotonic()
+        with self._lock:
+            return [person_id for person_id in dict.fromkeys(person_ids)
+                    if person_id not in self._entries or not self._fresh(self._entries[person_id][1], now)]
+
+    def store(self, notes_by_id, generation):
+        """
+        Сохраняет {person_id: примечания}, загруженные запросом поколения generation.
+        Возвращает False, если после запуска запроса примечания изменялись и результат отброшен.
+        """
+        if not self.max_entries:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            if generation != self._generation:
+                return False
+            for person_id, notes in notes_by_id.items():
+                self._entries[person_id] = (notes, now)
+                self._entries.move_to_end(person_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return True
+
+    def invalidate(self, person_ids=None):
+        """Удаляет примечания сотрудников person_ids (None - все) после их изменения."""
+        with self._lock:
+            self._generation += 1
+            if person_ids is None:
+                self._entries.clear()
+                return
+            for person_id in person_ids:
+                self._entries.pop(person_id, None)
@@ -0,0 +1,145 @@
+# result_cache.py
+import os
+import hashlib
+import pickle
+
+import pandas as pd
+
+from config import get_logger, get_result_cache_config
+
+# Parquet (через pyarrow) - быстрый колоночный формат; без pyarrow записи сохраняются через pickle
+try:
+    import pyarrow
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+
+class ResultCache:
+    """
+    Дисковый кэш результатов очистки и валидации входных файлов.
+    Ключ записи - SHA-256 содержимого файла и версия правил обработки. Кроме того, для каждого
+    логического файла хранятся построчные результаты предыдущей загрузки (см. row_record_key).
+    При превышении предельного размера удаляются записи, к которым дольше всего не обращались.
+    """
+    # Расширения файлов записей в порядке предпочтения
+    EXTENSIONS = ('.parquet', '.pkl')
+    # Служебные колонки: хэш исходной строки и время проверки статуса в БД (секунды от эпохи)
+    ROW_HASH_COLUMN = '_row_hash'
+    RESOLVED_AT_COLUMN = '_resolved_at'
+
+    def __init__(self, processor_version, config=None):
+        config = config or get_result_cache_config()
+        self.cache_dir = config['dir']
+        self.max_bytes = config['max_bytes']
+        self.status_ttl_sec = config.get('status_ttl_sec', 0)
+        self.processor_version = processor_version
+        self.logger = get_logger(__name__)
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def make_key(self, file_name, block_size=1024 * 1024):
+        """Вычисляет ключ записи по содержимому файла (имя и дата изменения файла не учитываются)."""
+        digest = hashlib.sha256()
+        with open(file_name, 'rb') as f:
+            for block in iter(lambda: f.read(block_size), b''):
+                digest.update(block)
+        return f"{digest.hexdigest()}_v{self.processor_version}"
+
+    def row_record_key(self, logical_name, columns):
+        """
+        Ключ построчной записи логического файла: результаты предыдущей загрузки по хэшам строк.
+        logical_name - имя файла или ключ, выбранный пользователем; при другом наборе колонок запись другая.
+        """
+        signature = '\x1f'.join([logical_name] + [str(col) for col in columns])
+        return f"rows_{hashlib.sha256(signature.encode('utf-8')).hexdigest()}_v{self.processor_version}"
+
+    def _find_entry(self, key):
+        for extension in self.EXTENSIONS:
+            path = os.path.join(self.cache_dir, key + extension)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def load(self, key):
+        """Возвращает сохраненный DataFrame по ключу или None, если записи нет."""
+        if not self.enabled:
+            return None
+        path = self._find_entry(key)
+        if path is None:
+            return None
+        try:
+            if path.endswith('.parquet'):
+                df = pd.read_parquet(path)
+            else:
+                with open(path, 'rb') as f:
+                    df = pickle.load(f)
+        except Exception as e:
+            self.logger.warning(f"Не удалось прочитать запись кэша {path}: {e}. Запись удалена.")
+            self._remove(path)
+            return None
+        # Время изменения файла записи служит временем последнего обращения для вытеснения (LRU)
+        os.utime(path, None)
+        self.logger.info(f"Результат обработки найден в кэше: {os.path.basename(path)}")
+        return df
+
+    def store(self, key, df):
+        """Сохраняет DataFrame под ключом и вытесняет старые записи при превышении размера кэша."""
+        if not self.enabled:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            path = None
+            if PARQUET_AVAILABLE:
+                try:
+                    path = self._write(key, '.parquet', lambda tmp: df.to_parquet(tmp, index=True))
+                except Exception as e:
+                    # Колонки со смешанными типами значений не сохраняются в parquet
+                    self.logger.debug(f"Запись кэша не сохранена в parquet ({e}), используется pickle.")
+            if path is None:
+                path = self._write(key, '.pkl',
+                                   lambda tmp: pd.to_pickle(df, tmp, protocol=pickle.HIGHEST_PROTOCOL))
+            # Запись того же ключа в другом формате устарела
+            for extension in self.EXTENSIONS:
+                other_path = os.path.join(self.cache_dir, key + extension)
+                if other_path != path:
+                    self._remove(other_path)
+            self.logger.info(f"Результат обработки сохранен в кэш: {os.path.basename(path)}")
+            self._evict()
+        except OSError as e:
+            self.logger.warning(f"Не удалось сохранить результат обработки в кэш: {e}")
+
+    def _write(self, key, extension, writer):
+        """Пишет запись во временный файл и атомарно переименовывает (без полузаписанных записей)."""
+        path = os.path.join(self.cache_dir, key + extension)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            writer(tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return path
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _evict(self):
+        """Удаляет записи, к которым дольше всего не обращались, пока размер кэша не станет допустимым."""
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and entry.name.endswith(self.EXTENSIONS):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_bytes:
+                break
+            self._remove(path)
+            total_size -= size
+            self.logger.info(f"Запись кэша вытеснена: {os.path.basename(path)}")
@@ -0,0 +1,105 @@
+# stage_timings.py
+import json
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from config import get_logger, get_stage_timings_config
+
+# Названия этапов для отчета в окне лога
+STAGE_LABELS = {
+    'identity_snapshot': 'Снимок личностей БД',
+    'cache': 'Кэш результатов',
+    'read': 'Чтение файла',
+    'drop_empty': 'Удаление пустых строк',
+    'process': 'Обработка пакетов',
+    'clean': 'Очистка',
+    'validate': 'Валидация',
+    'dates': 'Проверка дат',
+    'suspicious_names': 'Подозрительные ФИО',
+    'duplicates': 'Поиск дубликатов',
+    'confirmation': 'Подтверждение пользователем',
+    'db_status': 'Статусы БД',
+    'classification': 'Классификация',
+    'display': 'Таблица и отчеты',
+}
+
+
+class StageTimings:
+    """
+    Замеры этапов обработки одной загрузки: время, строки на входе и выходе, число вызовов.
+    Этап может выполняться многократно (например, для каждого пакета файла) - замеры суммируются.
+    Замеры процессов пула передаются в главный процесс словарем stages и добавляются через merge.
+    """
+
+    def __init__(self):
+        self.stages = {}  # {этап: {'seconds', 'rows_in', 'rows_out', 'calls'}} в порядке первого выполнения
+        self._started = time.perf_counter()
+
+    def add(self, name, seconds, rows_in=0, rows_out=None):
+        """Добавляет замер этапа; rows_out по умолчанию равно rows_in."""
+        stage = self.stages.setdefault(name, {'seconds': 0.0, 'rows_in': 0, 'rows_out': 0, 'calls': 0})
+        stage['seconds'] += seconds
+        stage['rows_in'] += int(rows_in)
+        stage['rows_out'] += int(rows_in if rows_out is None else rows_out)
+        stage['calls'] += 1
+
+    @contextmanager
+    def stage(self, name, rows_in=0):
+        """
+        Замеряет блок кода как этап name. Число строк на выходе задается через возвращаемый словарь:
+        with timings.stage('clean', len(df)) as stage: ...; stage['rows_out'] = len(result)
+        """
+        record = {'rows_out': None}
+        started = time.perf_counter()
+        try:
+            yield record
+        finally:
+            self.add(name, time.perf_counter() - started, rows_in, record['rows_out'])
+
+    def merge(self, stages):
+        """Добавляет замеры из словаря stages другого StageTimings (например, от процесса пула)."""
+        for name, other in stages.items():
+            stage = self.stages.setdefault(name, {'seconds': 0.0, 'rows_in': 0, 'rows_out': 0, 'calls': 0})
+            for key in stage:
+                stage[key] += other[key]
+
+    def to_dict(self):
+        """Отчет о замерах: общее время и по каждому этапу время, строки и строки в секунду."""
+        stages = {}
+        for name, stage in self.stages.items():
+            rows_per_sec = stage['rows_in'] / stage['seconds'] if stage['seconds'] > 0 else None
+            stages[name] = dict(stage, seconds=round(stage['seconds'], 4),
+                                rows_per_sec=round(rows_per_sec) if rows_per_sec is not None else None)
+        return {'total_seconds': round(time.perf_counter() - self._started, 4), 'stages': stages}
+
+    def format_report(self):
+        """Текстовый отчет для окна лога (по строке на этап)."""
+        report = self.to_dict()
+        lines = [f"Время загрузки: {report['total_seconds']:.2f} с"]
+        for name, stage in report['stages'].items():
+            line = f"  {STAGE_LABELS.get(name, name)}: {stage['seconds']:.3f} с"
+            if stage['rows_in'] or stage['rows_out']:
+                line += f", строк {stage['rows_in']}"
+                if stage['rows_out'] != stage['rows_in']:
+                    line += f" -> {stage['rows_out']}"
+            if stage['rows_per_sec'] is not None and stage['rows_in']:
+                line += f", {stage['rows_per_sec']} строк/с"
+            lines.append(line)
+        return "\n".join(lines)
+
+    def write_record(self, **extra):
+        """Дописывает отчет о замерах одной строкой JSON в файл STAGE_TIMINGS_FILE (если он задан)."""
+        path = get_stage_timings_config()['file']
+        if not path:
+            return
+        record = {'timestamp': datetime.now().isoformat(timespec='seconds'), **extra, **self.to_dict()}
+        try:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        except OSError as e:
+            get_logger(__name__).warning(f"Не удалось записать замеры этапов в {path}: {e}")
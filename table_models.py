@@ -0,0 +1,584 @@
+# table_models.py
+import bisect
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+from PyQt5.QtCore import Qt, QAbstractTableModel, QAbstractProxyModel, QModelIndex, pyqtSignal
+from PyQt5.QtGui import QBrush, QColor
+
+# Цвета статусов: ячейка окрашивается цветом первого статуса, название которого входит в ее текст
+STATUS_COLORS = {
+    "Ранее отведен": "salmon",
+    "В черном списке": "salmon",
+    "Активен": "lightgreen",
+    "Аккредитован": "lightgreen",
+    "На проверку": "lightblue",
+    "В ожидании": "lightblue",
+    "Истек срок": "lightcoral",
+    "НЕ ПОДТВЕРЖДЕНО": "yellow",
+    "Ошибка": "orangered",
+}
+
+
+def format_cell(col_name, value):
+    """Текст ячейки таблицы результатов (даты - в формате ДД.ММ.ГГГГ, ID - целым числом)."""
+    if isinstance(value, np.datetime64):
+        value = pd.Timestamp(value)  # Колонки дат хранятся массивами datetime64, а не объектами Timestamp
+    if not isinstance(value, str) and pd.api.types.is_scalar(value) and pd.isna(value):
+        return ""
+    if col_name == 'ID':
+        return str(int(value)) if isinstance(value, (int, float)) else str(value)
+    if col_name in ResultsTableModel.DATE_FORMATS and isinstance(value, (date, datetime)):
+        try:
+            return value.strftime(ResultsTableModel.DATE_FORMATS[col_name])
+        except (ValueError, TypeError):
+            return str(value)  # Если ошибка форматирования
+    return str(value)
+
+
+class ResultsTableModel(QAbstractTableModel):
+    """
+    Модель основной таблицы результатов поверх массивов колонок DataFrame.
+    Строки хранятся кусками (по одному на каждый показанный DataFrame или пакет потоковой обработки),
+    текст ячеек форматируется только при запросе data() - то есть только для видимых строк.
+    Цвета колонок статусов заранее рассчитываются для каждой строки как номера в палитре.
+    Если владелец отметил, что строк больше, чем загружено (set_more_available), при прокрутке
+    таблицы до конца модель запрашивает следующую порцию сигналом fetch_more_requested.
+    """
+    fetch_more_requested = pyqtSignal()
+
+    COLUMNS = ['ID', 'Фамилия', 'Имя', 'Отчество', 'Дата рождения',
+               'Организация', 'Должность', 'Статус БД', 'Статус Проверки',
+               'Ошибки Валидации', 'Прим.', 'Начало аккр.', 'Конец аккр.']
+    STATUS_COLUMNS = ('Статус БД', 'Статус Проверки')
+    DATE_FORMATS = {'Дата рождения': '%d.%m.%Y', 'Конец аккр.': '%d.%m.%Y', 'Начало аккр.': '%d.%m.%Y %H:%M'}
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._chunks = []  # [{'values': {колонка: массив}, 'colors': {колонка статуса: номера цветов}}]
+        self._starts = []  # Номер первой строки каждого куска
+        self._row_count = 0
+        self._palette = [(None, None)]  # Номер цвета -> (фон, цвет текста); 0 - без цвета
+        self._palette_codes = {}  # Текст статуса -> номер цвета
+        self._more_available = False
+
+    # --- Интерфейс QAbstractTableModel ---
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._row_count
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole:
+            return self.COLUMNS[section] if orientation == Qt.Horizontal else str(section + 1)
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        col_name = self.COLUMNS[index.column()]
+        if role == Qt.DisplayRole:
+            return self.display_text(index.row(), col_name)
+        if role in (Qt.BackgroundRole, Qt.ForegroundRole):
+            chunk, row = self._locate(index.row())
+            codes = chunk['colors'].get(col_name)
+            if codes is None or not codes[row]:
+                return None
+            background, foreground = self._palette[codes[row]]
+            return background if role == Qt.BackgroundRole else foreground
+        if role == Qt.TextAlignmentRole and col_name == 'Прим.':
+            return int(Qt.AlignCenter)
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self._more_available
+
+    def fetchMore(self, parent=QModelIndex()):
+        if self.canFetchMore(parent):
+            self._more_available = False  # До прихода следующей порции повторно не запрашиваем
+            self.fetch_more_requested.emit()
+
+    # --- Заполнение ---
+
+    def set_more_available(self, more_available):
+        """Отмечает, есть ли строки сверх загруженных (догружаются по fetch_more_requested)."""
+        self._more_available = more_available
+
+    def clear(self):
+        self.beginResetModel()
+        self._chunks, self._starts, self._row_count = [], [], 0
+        self._more_available = False
+        self.endResetModel()
+
+    def set_frame(self, df):
+        """Заменяет содержимое модели строками df."""
+        self.beginResetModel()
+        self._chunks, self._starts, self._row_count = [], [], 0
+        self._more_available = False
+        if df is not None and not df.empty:
+            self._add_chunk(df)
+        self.endResetModel()
+
+    def append_frame(self, df):
+        """Добавляет строки df в конец таблицы."""
+        if df is None or df.empty:
+            return
+        self.beginInsertRows(QModelIndex(), self._row_count, self._row_count + len(df) - 1)
+        self._add_chunk(df)
+        self.endInsertRows()
+
+    def _add_chunk(self, df):
+        # Массивы колонок берутся в их собственном типе: для 1 млн строк перевод дат в объекты занимал бы секунды
+        values = {col: df[col].to_numpy() for col in self.COLUMNS if col in df.columns}
+        colors = {col: self._color_codes(values[col]) for col in self.STATUS_COLUMNS if col in values}
+        self._chunks.append({'values': values, 'colors': colors})
+        self._starts.append(self._row_count)
+        self._row_count += len(df)
+
+    def _color_codes(self, values):
+        """Номера цветов для каждой строки колонки статуса (через различные значения, без цикла по строкам)."""
+        codes, uniques = pd.factorize(values)
+        if not len(uniques):
+            return np.zeros(len(values), dtype=np.int16)
+        palette = np.array([self._palette_code(str(value)) for value in uniques] + [0], dtype=np.int16)
+        return palette[codes]  # Код -1 (пустое значение) указывает на последний элемент - без цвета
+
+    def _palette_code(self, text):
+        if text not in self._palette_codes:
+            code = 0
+            for status, color_name in STATUS_COLORS.items():
+                if status.lower() in text.lower():
+                    color = QColor(color_name)
+                    # Для светлых фонов текст делается черным для лучшей читаемости
+                    foreground = QBrush(QColor("black")) if color.lightness() > 180 else None
+                    self._palette.append((QBrush(color), foreground))
+                    code = len(self._palette) - 1
+                    break
+            self._palette_codes[text] = code
+        return self._palette_codes[text]
+
+    # --- Доступ к строкам ---
+
+    def _locate(self, row):
+        position = bisect.bisect_right(self._starts, row) - 1
+        return self._chunks[position], row - self._starts[position]
+
+    def display_text(self, row, col_name):
+        """Текст ячейки строки row в колонке col_name (как он показан в таблице)."""
+        chunk, local_row = self._locate(row)
+        values = chunk['values'].get(col_name)
+        return "" if values is None else format_cell(col_name, values[local_row])
+
+    def row_texts(self, row):
+        """Словарь {колонка: текст ячейки} для строки row."""
+        return {col_name: self.display_text(row, col_name) for col_name in self.COLUMNS}
+
+    def person_id(self, row):
+        """ID сотрудника в строке row или None, если ID не числовой (например, строки не из AccrTable)."""
+        text = self.display_text(row, 'ID')
+        return int(text) if text.isdigit() else None
+
+    def person_ids(self):
+        """Числовые ID всех строк таблицы в порядке строк."""
+        ids = []
+        for chunk in self._chunks:
+            for value in chunk['values'].get('ID', ()):
+                text = format_cell('ID', value)
+                if text.isdigit():
+                    ids.append(int(text))
+        return ids
+
+    def column_array(self, col_name):
+        """Значения колонки всех строк одним массивом (в кусках без этой колонки - None)."""
+        parts = []
+        for chunk in self._chunks:
+            values = chunk['values'].get(col_name)
+            if values is None:
+                values = np.full(len(next(iter(chunk['values'].values()))), None, dtype=object)
+            parts.append(values)
+        if not parts:
+            return np.empty(0, dtype=object)
+        if len(parts) > 1 and len({part.dtype for part in parts}) > 1:
+            parts = [part.astype(object) for part in parts]  # Например, даты в одном куске и None в другом
+        return np.concatenate(parts)
+
+    def find_row(self, person_id):
+        """Номер первой строки с заданным ID или None."""
+        for chunk, start in zip(self._chunks, self._starts):
+            if 'ID' not in chunk['values']:
+                continue
+            ids = pd.to_numeric(pd.Series(chunk['values']['ID']), errors='coerce').to_numpy()
+            hits = np.flatnonzero(ids == person_id)
+            if len(hits):
+                return start + int(hits[0])
+        return None
+
+    def column_has_values(self, col_name):
+        """Есть ли в колонке хотя бы одно непустое значение (проверяются только различные значения)."""
+        for chunk in self._chunks:
+            values = chunk['values'].get(col_name)
+            if values is None:
+                continue
+            if values.dtype != object:
+                # Непустое число или дата всегда дают непустой текст
+                if pd.notna(values).any():
+                    return True
+                continue
+            for value in pd.unique(values):
+                if format_cell(col_name, value).strip():
+                    return True
+        return False
+
+    def set_value(self, row, col_name, value):
+        """Изменяет значение ячейки (например, статус после действия пользователя) и обновляет ее цвет."""
+        chunk, local_row = self._locate(row)
+        # Массивы колонок могут ссылаться на данные показанного DataFrame - изменяется копия
+        values = chunk['values'].get(col_name)
+        if values is None:
+            values = np.full(len(next(iter(chunk['values'].values()))), None, dtype=object)
+        else:
+            values = values.copy() if values.dtype == object else pd.Series(values).astype(object).to_numpy()
+        values[local_row] = value
+        chunk['values'][col_name] = values
+        if col_name in self.STATUS_COLUMNS:
+            codes = chunk['colors'].get(col_name)
+            codes = np.zeros(len(values), dtype=np.int16) if codes is None else codes.copy()
+            codes[local_row] = self._palette_code(format_cell(col_name, value))
+            chunk['colors'][col_name] = codes
+        column = self.COLUMNS.index(col_name)
+        self.dataChanged.emit(self.index(row, column), self.index(row, column))
+
+    def set_value_for_ids(self, person_ids, col_name, value):
+        """Изменяет значение колонки во всех строках с ID из person_ids (например, отметку 'Прим.' после массового сохранения)."""
+        if col_name in self.STATUS_COLUMNS:
+            raise ValueError(f"Колонка статуса {col_name} изменяется только через set_value")
+        person_ids = np.asarray(list(person_ids), dtype=float)
+        changed = False
+        for chunk in self._chunks:
+            if 'ID' not in chunk['values']:
+                continue
+            ids = pd.to_numeric(pd.Series(chunk['values']['ID']), errors='coerce').to_numpy()
+            hits = np.isin(ids, person_ids)
+            if not hits.any():
+                continue
+            values = chunk['values'].get(col_name)
+            values = np.full(len(ids), None, dtype=object) if values is None else values.astype(object)  # astype копирует
+            values[hits] = value
+            chunk['values'][col_name] = values
+            changed = True
+        if changed:
+            column = self.COLUMNS.index(col_name)
+            self.dataChanged.emit(self.index(0, column), self.index(self._row_count - 1, column))
+
+
+class ResultsProxyModel(QAbstractProxyModel):
+    """
+    Сортировка и фильтрация загруженных строк ResultsTableModel без обращения к БД.
+    Порядок показа - массив номеров строк исходной модели. Он вычисляется целиком средствами numpy
+    по заранее рассчитанным ключам колонок: значения колонки один раз разбиваются на различные
+    (pd.factorize), для различных значений считаются место при сортировке и текст ячейки,
+    а для строк остаются только номера значений. Ключи колонки пересчитываются только после
+    изменения данных, поэтому смена фильтра или сортировки 100 тыс. строк занимает миллисекунды.
+    Фильтры: текст в колонке (или в любой колонке), допустимые значения колонки (фасеты статусов),
+    непустое значение колонки. Сортировка - по нескольким колонкам (первая - главная), одинаковые
+    строки остаются в исходном порядке. Строки, добавленные в исходную модель (следующие страницы
+    поиска, пакеты обработки файла), встают на свои места; значения, измененные в уже показанных
+    строках, не перемещают и не скрывают их до следующей смены фильтра или сортировки.
+    """
+    # Больше стольких отдельных мест вставки новых строк модель сбрасывается целиком
+    MAX_INSERT_RUNS = 100
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._order = np.empty(0, dtype=np.int64)  # Строка показа -> строка исходной модели
+        self._positions = None  # Строка исходной модели -> строка показа (-1 - скрыта); считается по запросу
+        self._text_filters = {}  # Колонка (None - любая) -> текст в нижнем регистре
+        self._facets = {}  # Колонка -> допустимые тексты ячеек
+        self._non_empty = set()  # Колонки, которые должны быть непустыми
+        self._sort_keys = []  # [(колонка, по возрастанию)], первая - главная
+        self._keys = {}  # Колонка -> ключи колонки (см. _column_keys)
+
+    # --- Интерфейс QAbstractProxyModel ---
+
+    def setSourceModel(self, model):
+        self.beginResetModel()
+        super().setSourceModel(model)
+        model.modelAboutToBeReset.connect(self.beginResetModel)
+        model.modelReset.connect(self._on_source_reset)
+        model.rowsInserted.connect(self._on_source_rows_inserted)
+        model.dataChanged.connect(self._on_source_data_changed)
+        self._keys = {}
+        self._set_order(self._compute_order())
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._order)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() or self.sourceModel() is None else self.sourceModel().columnCount()
+
+    def index(self, row, column, parent=QModelIndex()):
+        if parent.isValid() or not 0 <= row < len(self._order) or not 0 <= column < self.columnCount():
+            return QModelIndex()
+        return self.createIndex(row, column)
+
+    def parent(self, index=QModelIndex()):
+        return QModelIndex()
+
+    def mapToSource(self, proxy_index):
+        if not proxy_index.isValid():
+            return QModelIndex()
+        return self.sourceModel().index(int(self._order[proxy_index.row()]), proxy_index.column())
+
+    def mapFromSource(self, source_index):
+        if not source_index.isValid():
+            return QModelIndex()
+        row = self.proxy_row(source_index.row())
+        return QModelIndex() if row is None else self.index(row, source_index.column())
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        self.set_sort_keys([(ResultsTableModel.COLUMNS[column], order == Qt.AscendingOrder)])
+
+    # --- Фильтры и сортировка ---
+
+    @property
+    def sort_keys(self):
+        return list(self._sort_keys)
+
+    @property
+    def filtered(self):
+        """Скрыта ли часть строк фильтрами."""
+        return bool(self._text_filters or self._facets or self._non_empty)
+
+    def text_filter(self, col_name=None):
+        return self._text_filters.get(col_name, "")
+
+    def set_text_filter(self, col_name, text):
+        """Оставляет строки, в колонке col_name (None - в любой колонке) которых есть text (без учета регистра)."""
+        text = (text or "").strip().lower()
+        if text:
+            self._text_filters[col_name] = text
+        else:
+            self._text_filters.pop(col_name, None)
+        self._apply()
+
+    def set_facet(self, col_name, values):
+        """Оставляет строки с текстом ячейки колонки из values (None - без ограничения)."""
+        if values is None:
+            self._facets.pop(col_name, None)
+        else:
+            self._facets[col_name] = frozenset(values)
+        self._apply()
+
+    def set_non_empty(self, col_name, required):
+        """Оставляет только строки с непустым значением колонки (например, с ошибками валидации)."""
+        if required:
+            self._non_empty.add(col_name)
+        else:
+            self._non_empty.discard(col_name)
+        self._apply()
+
+    def set_sort_keys(self, sort_keys):
+        """Сортирует строки по колонкам [(колонка, по возрастанию)]; пустой список - исходный порядок."""
+        self._sort_keys = list(sort_keys)
+        self._apply()
+
+    def clear_filters(self):
+        """Снимает все фильтры и сортировку."""
+        self._text_filters, self._facets, self._non_empty, self._sort_keys = {}, {}, set(), []
+        self._apply()
+
+    def facet_values(self, col_name):
+        """Различные тексты ячеек колонки во всех загруженных строках с числом строк: [(текст, число)]."""
+        keys = self._column_keys(col_name)
+        counts = np.bincount(keys['codes'] + 1, minlength=len(keys['uniques']) + 1)  # 0 - пустые значения
+        totals = {}
+        for text, count in zip([""] + list(self._texts(col_name)), counts):
+            if count:
+                totals[text] = totals.get(text, 0) + int(count)
+        return sorted(totals.items(), key=lambda item: (-item[1], item[0]))
+
+    # --- Доступ к строкам ---
+
+    def source_row(self, row):
+        """Номер строки исходной модели для строки показа row."""
+        return int(self._order[row])
+
+    def proxy_row(self, source_row):
+        """Номер строки показа для строки исходной модели или None, если строка скрыта фильтром."""
+        if self._positions is None:
+            positions = np.full(self.sourceModel().rowCount(), -1, dtype=np.int64)
+            positions[self._order] = np.arange(len(self._order))
+            self._positions = positions
+        if not 0 <= source_row < len(self._positions) or self._positions[source_row] < 0:
+            return None
+        return int(self._positions[source_row])
+
+    def person_ids(self):
+        """Числовые ID показанных строк в порядке показа."""
+        ids = pd.to_numeric(pd.Series(self.sourceModel().column_array('ID')), errors='coerce').to_numpy()
+        ids = ids[self._order] if len(ids) else ids
+        return [int(person_id) for person_id in ids[~np.isnan(ids)]]
+
+    # --- Ключи колонок ---
+
+    def _column_keys(self, col_name):
+        """
+        Ключи колонки: codes - номер различного значения для каждой строки (-1 - пустое значение),
+        uniques - различные значения; ранги сортировки и тексты считаются по запросу.
+        """
+        if col_name not in self._keys:
+            codes, uniques = pd.factorize(self.sourceModel().column_array(col_name))
+            self._keys[col_name] = {'codes': codes, 'uniques': uniques, 'texts': None, 'lower': None, 'ranks': None}
+        return self._keys[col_name]
+
+    def _texts(self, col_name):
+        """Тексты ячеек (как в таблице) для различных значений колонки."""
+        keys = self._column_keys(col_name)
+        if keys['texts'] is None:
+            uniques = np.asarray(keys['uniques'])
+            if col_name == 'ID' and uniques.dtype.kind in 'iuf':
+                texts = uniques.astype(np.int64).astype(str)  # Пустых значений среди различных нет
+            elif col_name in ResultsTableModel.DATE_FORMATS and uniques.dtype.kind == 'M':
+                # Тексты дат собираются из ГГГГ-ММ-ДДTЧЧ:ММ (strftime для каждого значения в разы медленнее)
+                iso = pd.Series(np.datetime_as_string(uniques, unit='m'))
+                texts = iso.str[8:10] + '.' + iso.str[5:7] + '.' + iso.str[0:4]
+                if '%H' in ResultsTableModel.DATE_FORMATS[col_name]:
+                    texts = texts + ' ' + iso.str[11:16]
+            else:
+                texts = [format_cell(col_name, value) for value in uniques]
+            keys['texts'] = np.array(texts, dtype=object)
+        return keys['texts']
+
+    def _lower_texts(self, col_name):
+        keys = self._column_keys(col_name)
+        if keys['lower'] is None:
+            keys['lower'] = [text.lower() for text in self._texts(col_name)]
+        return keys['lower']
+
+    def _sort_ranks(self, col_name):
+        """Место каждого различного значения при сортировке по возрастанию; пустые значения - последние."""
+        keys = self._column_keys(col_name)
+        if keys['ranks'] is None:
+            uniques = np.asarray(keys['uniques'])
+            try:
+                if uniques.dtype == object and all(isinstance(value, str) for value in uniques):
+                    uniques = np.array([value.lower() for value in uniques], dtype=object)
+                order = np.argsort(uniques, kind='stable')
+            except TypeError:
+                # Значения разных типов (например, числа и строки) сортируются по тексту ячеек
+                order = np.argsort(np.array(self._lower_texts(col_name), dtype=object), kind='stable')
+            ranks = np.empty(len(uniques) + 1, dtype=np.int64)
+            ranks[order] = np.arange(len(uniques))
+            ranks[-1] = len(uniques)  # Код -1 (пустое значение) указывает на последний элемент
+            keys['ranks'] = ranks
+        return keys['ranks']
+
+    def _row_hits(self, col_name, unique_hits, empty_hit=False):
+        """Маска строк по маске различных значений колонки (пустые значения - empty_hit)."""
+        return np.append(unique_hits, empty_hit)[self._column_keys(col_name)['codes']]
+
+    # --- Вычисление порядка показа ---
+
+    def _compute_order(self):
+        model = self.sourceModel()
+        row_count = model.rowCount() if model is not None else 0
+        if not row_count:
+            return np.empty(0, dtype=np.int64)
+        mask = np.ones(row_count, dtype=bool)
+        for col_name, text in self._text_filters.items():
+            columns = ResultsTableModel.COLUMNS if col_name is None else [col_name]
+            hits = np.zeros(row_count, dtype=bool)
+            for column in columns:
+                unique_hits = np.array([text in value for value in self._lower_texts(column)], dtype=bool)
+                hits |= self._row_hits(column, unique_hits)
+            mask &= hits
+        for col_name, values in self._facets.items():
+            unique_hits = np.array([text in values for text in self._texts(col_name)], dtype=bool)
+            mask &= self._row_hits(col_name, unique_hits, "" in values)
+        for col_name in self._non_empty:
+            unique_hits = np.array([bool(text.strip()) for text in self._texts(col_name)], dtype=bool)
+            mask &= self._row_hits(col_name, unique_hits)
+        rows = np.flatnonzero(mask)
+        if self._sort_keys and len(rows):
+            sort_arrays = []
+            for col_name, ascending in reversed(self._sort_keys):  # np.lexsort: главный ключ - последний
+                ranks = self._sort_ranks(col_name)
+                key = ranks[self._column_keys(col_name)['codes']][rows]
+                if not ascending:
+                    # По убыванию; пустые значения остаются последними
+                    key = np.where(key == len(ranks) - 1, len(ranks), len(ranks) - 2 - key)
+                sort_arrays.append(key)
+            rows = rows[np.lexsort(sort_arrays)]
+        return rows
+
+    def _set_order(self, order):
+        self._order = order
+        self._positions = None
+
+    def _apply(self):
+        """Пересчитывает порядок показа после смены фильтров или сортировки."""
+        order = self._compute_order()
+        if len(order) == len(self._order) and np.array_equal(np.sort(order), np.sort(self._order)):
+            # Изменился только порядок: выделение и текущая строка сохраняются
+            self.layoutAboutToBeChanged.emit()
+            old_indexes = self.persistentIndexList()
+            source_rows = [int(self._order[index.row()]) for index in old_indexes]
+            self._set_order(order)
+            self.changePersistentIndexList(
+                old_indexes, [self.index(self.proxy_row(row), index.column()) for row, index in zip(source_rows, old_indexes)])
+            self.layoutChanged.emit()
+            return
+        self.beginResetModel()
+        self._set_order(order)
+        self.endResetModel()
+
+    # --- Изменения исходной модели ---
+
+    def _on_source_reset(self):
+        self._keys = {}
+        self._set_order(self._compute_order())
+        self.endResetModel()
+
+    def _on_source_rows_inserted(self, parent, first, last):
+        self._keys = {}
+        order = self._compute_order()
+        is_new = order >= first
+        if not np.array_equal(order[~is_new], self._order):
+            # Уже показанные строки изменили место (их значения менялись) - показ строится заново
+            self.beginResetModel()
+            self._set_order(order)
+            self.endResetModel()
+            return
+        new_positions = np.flatnonzero(is_new)
+        if not len(new_positions):
+            return
+        # Новые строки вставляются группами подряд идущих мест, по возрастанию места
+        run_starts = np.flatnonzero(np.diff(new_positions, prepend=-2) != 1)
+        if len(run_starts) > self.MAX_INSERT_RUNS:
+            self.beginResetModel()
+            self._set_order(order)
+            self.endResetModel()
+            return
+        run_ends = np.append(run_starts[1:], len(new_positions)) - 1
+        positions = np.arange(len(order))
+        for start, end in zip(new_positions[run_starts], new_positions[run_ends]):
+            self.beginInsertRows(QModelIndex(), int(start), int(end))
+            self._set_order(order[~is_new | (positions <= end)])
+            self.endInsertRows()
+
+    def _on_source_data_changed(self, top_left, bottom_right, roles=()):
+        for column in range(top_left.column(), bottom_right.column() + 1):
+            self._keys.pop(ResultsTableModel.COLUMNS[column], None)
+        if not len(self._order):
+            return
+        if top_left.row() == bottom_right.row():
+            row = self.proxy_row(top_left.row())
+            if row is not None:
+                self.dataChanged.emit(self.index(row, top_left.column()), self.index(row, bottom_right.column()))
+            return
+        self.dataChanged.emit(self.index(0, top_left.column()),
+                              self.index(len(self._order) - 1, bottom_right.column()))
@@ -1,104 +1,176 @@
 # ui.py
-import inspect
 import os
 import sys
+import time
 
 import numpy as np
 import pandas as pd
 from datetime import datetime, date, timedelta
-from multiprocessing import Pool, cpu_count
 import pytz
 import logging
-import traceback
 from concurrent.futures import ThreadPoolExecutor # Для фоновых задач
 
 from PyQt5.QtWidgets import (
-    QWidget, QVBoxLayout, QHBoxLayout, QLineEdit, QPushButton, QTableWidget,
-    QTableWidgetItem, QTextEdit, QLabel, QMessageBox, QApplication, QSplitter,
+    QWidget, QVBoxLayout, QHBoxLayout, QLineEdit, QPushButton,
+    QTextEdit, QLabel, QMessageBox, QApplication, QSplitter,
     QHeaderView, QAbstractItemView, QDialog,
-    QCheckBox, QDialogButtonBox, QTableView, QInputDialog
+    QDialogButtonBox, QTableView, QInputDialog, QComboBox, QListView, QProgressBar, QAction, QCheckBox
 )
-from PyQt5.QtGui import QIcon, QColor, QBrush, QStandardItem, QStandardItemModel
-from PyQt5.QtCore import Qt, QRunnable, QThreadPool, pyqtSignal, QObject, pyqtSlot, QThread
+from PyQt5.QtGui import QIcon, QStandardItem, QStandardItemModel, QBrush, QColor, QKeySequence
+from PyQt5.QtCore import Qt, QThreadPool, pyqtSignal, pyqtSlot, QThread, QTimer
 
-from config import get_logger
-from data_processing import DataProcessor, process_data_chunk
+from background_tasks import Worker, AwaitUser
+from config import (get_logger, get_status_check_config, get_search_config, get_notes_cache_config,
+                    get_message_bus_config)
+from data_processing import DataProcessor, ProcessingExecutor
 from file_manager import FileManager
-from database_manager import DatabaseManager
-
-# --- Worker для фоновых задач ---
-class WorkerSignals(QObject):
-    """Сигналы для Worker'а"""
-    finished = pyqtSignal(object) # Сигнал завершения с результатом
-    error = pyqtSignal(str)       # Сигнал ошибки
-    progress = pyqtSignal(int)    # Сигнал прогресса (0-100)
-    log = pyqtSignal(str, str)    # Сигнал для логирования (message, level)
-    request_confirmation = pyqtSignal(str, int) # Запрос подтверждения у пользователя (message, row_index)
-    request_new_employee_action = pyqtSignal(dict, int)
-
-class Worker(QRunnable):
-    """Исполнитель задач в отдельном потоке"""
-    def __init__(self, fn, *args, **kwargs):
-        super().__init__()
-        self.fn = fn
-        self.args = args
-        self.kwargs = kwargs
-        self.signals = WorkerSignals()
-        # Добавляем сигналы в kwargs, чтобы функция могла их использовать
-        # self.kwargs['signals'] = self.signals
-
-    @pyqtSlot()
-    def run(self):
-        try:
-            self.signals.log.emit(f"Запуск задачи {self.fn.__name__} в фоновом потоке...", "DEBUG")
-
-            # --- ИЗМЕНЕНИЕ ЗДЕСЬ: Проверяем, принимает ли функция 'signals' ---
-            func_signature = inspect.signature(self.fn)
-            pass_signals = False
-            if 'signals' in func_signature.parameters:
-                pass_signals = True
-            else:
-                # Проверяем наличие **kwargs
-                for param in func_signature.parameters.values():
-                    if param.kind == param.VAR_KEYWORD:  # VAR_KEYWORD соответствует **kwargs
-                        pass_signals = True
-                        break
-
-            final_kwargs = self.kwargs.copy()
-            if pass_signals:
-                final_kwargs['signals'] = self.signals
-
-            result = self.fn(*self.args, **final_kwargs)  # Используем final_kwargs
-            self.signals.log.emit(f"Задача {self.fn.__name__} завершена.", "DEBUG")
-            self.signals.finished.emit(result)
-        except Exception as e:
-            error_msg = f"Ошибка в фоновой задаче {self.fn.__name__}: {e}\n{traceback.format_exc()}"
-            self.signals.log.emit(error_msg, "ERROR")
-            self.signals.error.emit(str(e))
-
-# --- Диалог подтверждения необычных имен ---
-class ConfirmationDialog(QDialog):
-    def __init__(self, message, parent=None):
+from database_manager import DatabaseManager, CancellableQuery
+from result_cache import ResultCache
+from frame_views import FrameView, FrameViews
+from identity_snapshot import IdentitySnapshot
+from message_bus import MessageBus, LogListModel
+from notes_cache import NotesCache
+from table_models import ResultsTableModel, ResultsProxyModel
+from stage_timings import StageTimings
+
+# --- Проверка необычных имен пользователем ---
+class NameReviewDialog(QDialog):
+    """
+    Окно проверки всех строк с подозрительными ФИО сразу. Ячейки, в которых сработало правило, подсвечены,
+    сработавшие правила перечислены в строке. Строки подтверждаются отметкой в колонке 'Решение'
+    по одной или группами: выбранные строки, все строки с заданным правилом или все строки.
+    Неподтвержденные строки (и все строки при отмене окна) не обрабатываются дальше.
+    """
+    FIO_COLUMNS = ['Фамилия', 'Имя', 'Отчество']
+    COL_ROW, COL_RULES, COL_DECISION = 0, 4, 5
+    HIGHLIGHT_COLOR = "yellow"
+    RULES_ROLE = Qt.UserRole      # Имена сработавших правил строки
+    INDEX_ROLE = Qt.UserRole + 1  # Индекс строки в DataFrame загрузки
+
+    def __init__(self, rows, rule_descriptions, parent=None):
         super().__init__(parent)
-        self.setWindowTitle("Подтверждение данных")
+        self.setWindowTitle("Проверка необычных ФИО")
+        self.setMinimumSize(800, 500)
         layout = QVBoxLayout(self)
-        layout.addWidget(QLabel(message))
-
-        self.confirm_checkbox = QCheckBox("Подтверждаю, данные корректны")
-        layout.addWidget(self.confirm_checkbox)
+        layout.addWidget(QLabel(f"Обнаружено строк с потенциально некорректными ФИО: {len(rows)}. "
+                                f"Проверьте данные и отметьте строки, которые корректны.\n"
+                                f"Неподтвержденные строки будут пропущены."))
+
+        self.reviewTable = QTableView()
+        self.reviewTable.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.reviewTable.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.reviewTable.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.reviewTable.verticalHeader().setVisible(False)
+        self.reviewTable.setSortingEnabled(True)
+        layout.addWidget(self.reviewTable)
+
+        # Массовые решения: по выбранным строкам и по правилу
+        selection_layout = QHBoxLayout()
+        self.acceptSelectedButton = QPushButton("Подтвердить выбранные")
+        self.rejectSelectedButton = QPushButton("Отклонить выбранные")
+        selection_layout.addWidget(self.acceptSelectedButton)
+        selection_layout.addWidget(self.rejectSelectedButton)
+        selection_layout.addStretch()
+        self.ruleCombo = QComboBox()
+        self.acceptRuleButton = QPushButton("Подтвердить по правилу")
+        self.rejectRuleButton = QPushButton("Отклонить по правилу")
+        selection_layout.addWidget(self.ruleCombo)
+        selection_layout.addWidget(self.acceptRuleButton)
+        selection_layout.addWidget(self.rejectRuleButton)
+        layout.addLayout(selection_layout)
+
+        self.summaryLabel = QLabel()
+        layout.addWidget(self.summaryLabel)
 
         buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel, Qt.Horizontal, self)
+        buttons.button(QDialogButtonBox.Ok).setText("Продолжить")
         buttons.accepted.connect(self.accept)
         buttons.rejected.connect(self.reject)
         layout.addWidget(buttons)
 
-        # Кнопка OK неактивна, пока не отмечен чекбокс
-        ok_button = buttons.button(QDialogButtonBox.Ok)
-        ok_button.setEnabled(False)
-        self.confirm_checkbox.stateChanged.connect(lambda state: ok_button.setEnabled(state == Qt.Checked))
-
-    def is_confirmed(self):
-        return self.result() == QDialog.Accepted and self.confirm_checkbox.isChecked()
+        self.populate(rows, rule_descriptions)
+        self.acceptSelectedButton.clicked.connect(lambda: self.set_decision(self.selected_rows(), True))
+        self.rejectSelectedButton.clicked.connect(lambda: self.set_decision(self.selected_rows(), False))
+        self.acceptRuleButton.clicked.connect(lambda: self.set_decision(self.rule_rows(), True))
+        self.rejectRuleButton.clicked.connect(lambda: self.set_decision(self.rule_rows(), False))
+        self.model.itemChanged.connect(self.update_summary)
+
+    def populate(self, rows, rule_descriptions):
+        self.model = QStandardItemModel(len(rows), 6, self)
+        self.model.setHorizontalHeaderLabels(['Строка'] + self.FIO_COLUMNS + ['Правила', 'Решение'])
+        highlight = QBrush(QColor(self.HIGHLIGHT_COLOR))
+        rule_counts = dict.fromkeys(rule_descriptions, 0)
+        for i, row in enumerate(rows):
+            row_item = QStandardItem()
+            row_item.setData(int(row['index']) + 1, Qt.DisplayRole) # Номер строки сортируется как число
+            row_item.setData(sorted(row['rules']), self.RULES_ROLE)
+            row_item.setData(row['index'], self.INDEX_ROLE)
+            self.model.setItem(i, self.COL_ROW, row_item)
+            flagged = {}
+            for rule_name, columns in row['rules'].items():
+                rule_counts[rule_name] = rule_counts.get(rule_name, 0) + 1
+                for column in columns:
+                    flagged.setdefault(column, []).append(rule_descriptions.get(rule_name, rule_name))
+            for col, col_name in enumerate(self.FIO_COLUMNS, start=1):
+                value = row.get(col_name)
+                item = QStandardItem("" if value is None or pd.isna(value) else str(value))
+                if col_name in flagged:
+                    item.setBackground(highlight)
+                    # В подсказке значение в кавычках - видны пробелы по краям
+                    item.setToolTip(f"'{item.text()}'\n" + "\n".join(flagged[col_name]))
+                self.model.setItem(i, col, item)
+            descriptions = [rule_descriptions.get(name, name) for name in row['rules']]
+            self.model.setItem(i, self.COL_RULES, QStandardItem("; ".join(descriptions)))
+            decision_item = QStandardItem("Подтверждено")
+            decision_item.setCheckable(True)
+            decision_item.setCheckState(Qt.Unchecked)
+            self.model.setItem(i, self.COL_DECISION, decision_item)
+        self.reviewTable.setModel(self.model)
+        self.reviewTable.resizeColumnsToContents()
+        self.reviewTable.horizontalHeader().setSectionResizeMode(self.COL_RULES, QHeaderView.Stretch)
+
+        self.ruleCombo.addItem(f"Все правила ({len(rows)})", None)
+        for rule_name, count in rule_counts.items():
+            if count:
+                self.ruleCombo.addItem(f"{rule_descriptions.get(rule_name, rule_name)} ({count})", rule_name)
+        self.update_summary()
+
+    def selected_rows(self):
+        return [index.row() for index in self.reviewTable.selectionModel().selectedRows()]
+
+    def rule_rows(self):
+        """Строки модели, в которых сработало выбранное в списке правило (все строки, если выбраны все правила)."""
+        rule_name = self.ruleCombo.currentData()
+        return [row for row in range(self.model.rowCount())
+                if rule_name is None or rule_name in self.model.item(row, self.COL_ROW).data(self.RULES_ROLE)]
+
+    def set_decision(self, rows, accepted):
+        if not rows:
+            return
+        state = Qt.Checked if accepted else Qt.Unchecked
+        # Сигналы модели на время массового изменения отключены: таблица и счетчик обновляются один раз
+        self.model.blockSignals(True)
+        try:
+            for row in rows:
+                self.model.item(row, self.COL_DECISION).setCheckState(state)
+        finally:
+            self.model.blockSignals(False)
+        self.model.dataChanged.emit(self.model.index(0, self.COL_DECISION),
+                                    self.model.index(self.model.rowCount() - 1, self.COL_DECISION))
+        self.update_summary()
+
+    def accepted_indices(self):
+        """Индексы подтвержденных строк (пустое множество, если окно отменено)."""
+        if self.result() != QDialog.Accepted:
+            return set()
+        return {self.model.item(row, self.COL_ROW).data(self.INDEX_ROLE)
+                for row in range(self.model.rowCount())
+                if self.model.item(row, self.COL_DECISION).checkState() == Qt.Checked}
+
+    def update_summary(self, *args):
+        accepted = sum(self.model.item(row, self.COL_DECISION).checkState() == Qt.Checked
+                       for row in range(self.model.rowCount()))
+        self.summaryLabel.setText(f"Подтверждено: {accepted} из {self.model.rowCount()}")
 
 class HistoryDialog(QDialog):
     def __init__(self, history_records, parent=None):
@@ -152,11 +224,7 @@ class HistoryDialog(QDialog):
 class AccreditationApp(QWidget):
     # Сигнал для обновления UI из другого потока
     update_table_signal = pyqtSignal(pd.DataFrame)
-    update_log_signal = pyqtSignal(str, str)
-    update_notes_signal = pyqtSignal(str)
     task_finished_signal = pyqtSignal(str) # Сигнал завершения долгой задачи
-    ask_confirmation_signal = pyqtSignal(str, int) # Сигнал для запроса подтверждения
-    ask_new_employee_action_signal = pyqtSignal(dict, int)
 
     COL_STATUS_DB = 7
     COL_STATUS_PROV = 8
@@ -165,21 +233,48 @@ class AccreditationApp(QWidget):
     COL_START_AKKR = 11
     COL_END_AKKR = 12
 
-    # Словарь для хранения подтверждений пользователя по индексам строк
-    user_confirmations = {}
-    new_employee_actions = {}  # Для новых сотрудников в файле активации
+    # Статус проверки по статусу в БД (все остальные статусы БД -> "На проверку")
+    STATUS_CHECK_LABELS = {'BLACKLISTED': "Ранее отведен", 'ACTIVE': "Активен"}
+    # Колонки канонического DataFrame с небольшим числом различных значений (хранятся как category)
+    CATEGORY_COLUMNS = ['Имя', 'Отчество', 'Место рождения', 'Организация', 'Должность',
+                        'Статус БД', 'Статус Проверки', 'Validation_Errors']
+
     def __init__(self, db_manager: DatabaseManager, logger: logging.Logger):
         super().__init__()
         self.db_manager = db_manager
         self.logger = logger
         self.file_manager = FileManager(parent_widget=self)
         self.processor = DataProcessor()
+        # Долгоживущий исполнитель обработки файлов: пул процессов создается лениво и переиспользуется
+        self.processing_executor = ProcessingExecutor()
+        # Кэш результатов очистки и валидации: повторная загрузка того же файла не обрабатывает его заново
+        self.result_cache = ResultCache(self.processor.result_version)
+        # Снимок личностей БД в памяти: статусы строк файла проверяются без запроса на каждую строку
+        self.status_check_config = get_status_check_config()
+        self.identity_snapshot = IdentitySnapshot(self.db_manager, self.status_check_config)
+        # Поиск по мере ввода: номер последнего запроса (результаты более ранних отбрасываются),
+        # выполняющиеся запросы к БД (отменяются при новом поиске) и состояние текущего поиска:
+        # term, rows - загруженные строки результата, complete - загружены ли все страницы, loading
+        self.search_config = get_search_config()
+        self._search_request_id = 0
+        self._search_queries = []
+        self._search_state = None
+        # Примечания сотрудников: кэш по person_id (видимые строки загружаются заранее одним запросом)
+        # и номер последнего запроса примечаний выбранной строки (ответы на более ранние отбрасываются)
+        self.notes_cache_config = get_notes_cache_config()
+        self.notes_cache = NotesCache(self.notes_cache_config)
+        self._notes_request_id = 0
+        self._notes_prefetch_running = False
+        self._notes_prefetch_pending = False
         self.timezone = pytz.timezone("Europe/Moscow")
-        self.df_loaded = None # Исходный DataFrame после загрузки
-        self.df_processed = None # DataFrame после очистки и валидации
-        self.df_to_add_td = pd.DataFrame() # Данные для добавления в TD
-        self.current_reports = {} # Словарь для сгенерированных отчетов
+        self.df_processed = None # Канонический DataFrame результата загрузки (все строки файла)
+        self.df_to_add_td = FrameView.empty_view() # Строки для добавления в TD (представление df_processed)
+        self.current_reports = FrameViews() # Отчеты (представления df_processed)
         self.thread_pool = QThreadPool() # Пул потоков для задач
+        # Логи и прогресс задач передаются в окно порциями, а не отдельным событием на каждое сообщение
+        self.message_bus_config = get_message_bus_config()
+        self.message_bus = MessageBus(self.message_bus_config, self)
+        self._task_cancel_tokens = [] # Признаки отмены выполняющихся отменяемых задач (кнопка "Отменить")
         self.logger.info(f"Максимальное количество потоков: {self.thread_pool.maxThreadCount()}")
         self.initUI()
         self.connect_signals()
@@ -187,36 +282,35 @@ class AccreditationApp(QWidget):
     def connect_signals(self):
         """Подключение сигналов к слотам."""
         self.update_table_signal.connect(self.displayTable)
-        self.update_log_signal.connect(self.logMessage)
-        self.update_notes_signal.connect(self.displayNotes)
+        self.message_bus.logs_ready.connect(self.appendLogEntries)
+        self.message_bus.progress_changed.connect(self.update_progress)
         self.task_finished_signal.connect(self.on_task_finished)
-        self.ask_confirmation_signal.connect(self.handle_confirmation_request)
-        self.ask_new_employee_action_signal.connect(self.handle_new_employee_action_request)
 
     def logMessage(self, message, level="INFO"):
-        """Логирует сообщение в QTextEdit и стандартный логгер."""
-        # Проверка, вызывается ли из основного потока
-        if QApplication.instance().thread() != QThread.currentThread():
-            # Если из другого потока, используем сигнал
-            self.update_log_signal.emit(message, level)
-            return
-
+        """
+        Логирует сообщение в стандартный логгер и в лог окна.
+        Можно вызывать из любого потока: в окне строка появится со следующей порцией MessageBus.
+        """
         # Логирование через стандартный логгер
         log_level = getattr(logging, level.upper(), logging.INFO)
         self.logger.log(log_level, message)
 
-        # Отображение в QTextEdit
         timestamp = datetime.now(self.timezone).strftime("%Y-%m-%d %H:%M:%S")
-        color_map = {
-            "DEBUG": "grey",
-            "INFO": "green",
-            "WARNING": "orange",
-            "ERROR": "darkred",
-            "CRITICAL": "red"
-        }
-        color = color_map.get(level.upper(), "black")
-        formatted_message = f'<font color="{color}">[{timestamp}] [{level.upper()}] {message}</font>'
-        self.logText.append(formatted_message)
+        self.message_bus.post_log(f"[{timestamp}] [{level.upper()}] {message}", level.upper())
+
+    def appendLogEntries(self, entries):
+        """Добавляет порцию строк в лог окна (прокручивает его, если лог был прокручен до конца)."""
+        scroll_bar = self.logView.verticalScrollBar()
+        at_bottom = scroll_bar.value() >= scroll_bar.maximum()
+        self.logModel.append_entries(entries)
+        if at_bottom:
+            self.logView.scrollToBottom()
+
+    def copy_log_selection(self):
+        """Копирует выделенные строки лога в буфер обмена."""
+        rows = sorted(index.row() for index in self.logView.selectionModel().selectedRows())
+        if rows:
+            QApplication.clipboard().setText("\n".join(self.logModel.text(row) for row in rows))
 
     def initUI(self):
         """Инициализация интерфейса."""
@@ -245,6 +339,11 @@ class AccreditationApp(QWidget):
         self.searchEdit = QLineEdit()
         self.searchEdit.setPlaceholderText("Введите ФИО или организацию...")
         self.searchEdit.returnPressed.connect(self.run_search_people)
+        self.searchEdit.textEdited.connect(self.on_search_text_edited) # Поиск по мере ввода
+        self.searchTimer = QTimer(self) # Откладывает поиск до паузы во вводе
+        self.searchTimer.setSingleShot(True)
+        self.searchTimer.setInterval(self.search_config['debounce_ms'])
+        self.searchTimer.timeout.connect(lambda: self._start_search(allow_local=True))
         self.btnSearch = QPushButton("Найти")
         self.btnSearch.clicked.connect(self.run_search_people)
         self.btnBlacklist = QPushButton("В ЧС / Из ЧС")
@@ -275,7 +374,16 @@ class AccreditationApp(QWidget):
         self.btnAddTD.setEnabled(False)
         control_layout.addWidget(self.btnLoad)
         control_layout.addWidget(self.btnSaveReports)
+        self.btnCancelTask = QPushButton("Отменить")
+        self.btnCancelTask.setToolTip("Остановить загрузку файла или массовую операцию")
+        self.btnCancelTask.clicked.connect(self.cancel_running_tasks)
+        self.btnCancelTask.setEnabled(False)
         control_layout.addWidget(self.btnAddTD)
+        control_layout.addWidget(self.btnCancelTask)
+        self.progressBar = QProgressBar() # Прогресс последней сообщившей о нем задачи
+        self.progressBar.setRange(0, 100)
+        self.progressBar.setMaximumWidth(160)
+        control_layout.addWidget(self.progressBar)
         left_layout.addLayout(control_layout)
 
         # Разделитель или отступ
@@ -283,31 +391,98 @@ class AccreditationApp(QWidget):
 
         # Логгер
         right_layout.addWidget(QLabel("Лог операций:"))
-        self.logText = QTextEdit()
-        self.logText.setReadOnly(True)
-        left_layout.addWidget(self.logText)
+        # Лог - список последних LOG_VIEW_MAX_LINES строк, которые добавляются порциями (MessageBus)
+        self.logModel = LogListModel(self.message_bus_config['max_lines'], self)
+        self.logView = QListView()
+        self.logView.setModel(self.logModel)
+        self.logView.setUniformItemSizes(True) # Высота строк не рассчитывается для каждой строки
+        self.logView.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.logView.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        copy_action = QAction("Копировать", self.logView)
+        copy_action.setShortcut(QKeySequence.Copy)
+        copy_action.setShortcutContext(Qt.WidgetShortcut)
+        copy_action.triggered.connect(self.copy_log_selection)
+        self.logView.addAction(copy_action)
+        self.logView.setContextMenuPolicy(Qt.ActionsContextMenu)
+        left_layout.addWidget(self.logView)
 
         splitter.addWidget(right_panel)
 
         # Таблица данных
-        self.dataTable = QTableWidget()
-        self.dataTable.setColumnCount(13) # Увеличено для статуса и ID
-        self.dataTable.setHorizontalHeaderLabels([
-            'ID', 'Фамилия', 'Имя', 'Отчество', 'Дата рождения', 
-            'Организация', 'Должность', 'Статус БД', 'Статус Проверки',
-            'Ошибки Валидации', 'Прим.',
-            'Начало аккр.', 'Конец аккр.'
-        ])
+        # Модель хранит колонки DataFrame и форматирует только видимые ячейки;
+        # таблица показывает ее через прокси, который фильтрует и сортирует загруженные строки без БД.
+        # Номера строк в методах tableModel - номера строк модели (см. get_selected_row_index)
+        self.tableModel = ResultsTableModel(self)
+        self.resultsProxy = ResultsProxyModel(self)
+        self.resultsProxy.setSourceModel(self.tableModel)
+        self.dataTable = QTableView()
+        self.dataTable.setModel(self.resultsProxy)
         self.dataTable.setEditTriggers(QAbstractItemView.NoEditTriggers) # Запрет редактирования
         self.dataTable.setSelectionBehavior(QAbstractItemView.SelectRows) # Выделение строк
         self.dataTable.setSelectionMode(QAbstractItemView.SingleSelection) # Только одна строка
+        self.dataTable.verticalHeader().setSectionResizeMode(QHeaderView.Fixed) # Высота строк не пересчитывается по содержимому
         self.dataTable.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch) # Растягивание колонок
-        self.dataTable.itemSelectionChanged.connect(self.on_table_selection_changed) # Загрузка примечаний при выборе
+        self.dataTable.selectionModel().selectionChanged.connect(self.on_table_selection_changed) # Загрузка примечаний при выборе
+        self.tableModel.fetch_more_requested.connect(self.run_fetch_search_page) # Следующая страница поиска при прокрутке
+        self.notesPrefetchTimer = QTimer(self) # Загрузка примечаний видимых строк после остановки прокрутки
+        self.notesPrefetchTimer.setSingleShot(True)
+        self.notesPrefetchTimer.setInterval(150)
+        self.notesPrefetchTimer.timeout.connect(self.prefetch_visible_notes)
+        self.dataTable.verticalScrollBar().valueChanged.connect(lambda _value: self.notesPrefetchTimer.start())
+        self.resultsProxy.modelReset.connect(lambda: self.notesPrefetchTimer.start())
+        self.resultsProxy.rowsInserted.connect(lambda *_args: self.notesPrefetchTimer.start())
+        self.resultsProxy.layoutChanged.connect(lambda *_args: self.notesPrefetchTimer.start())
+        header = self.dataTable.horizontalHeader()
+        header.setSectionsClickable(True)
+        header.setSortIndicatorShown(False)
+        header.setToolTip("Щелчок - сортировка загруженных строк по колонке, Shift+щелчок - добавить колонку к сортировке")
+        header.sectionClicked.connect(self.on_results_header_clicked)
         self.dataTable.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeToContents) # ID
         self.dataTable.horizontalHeader().setSectionResizeMode(10, QHeaderView.ResizeToContents)  # Прим.
         self.dataTable.horizontalHeader().setSectionResizeMode(11, QHeaderView.ResizeToContents)  # Начало аккр.
         self.dataTable.horizontalHeader().setSectionResizeMode(12, QHeaderView.ResizeToContents)  # Конец аккр.
+        self.searchCountLabel = QLabel("") # Число результатов поиска (строки догружаются при прокрутке)
+        right_layout.addWidget(self.searchCountLabel)
+
+        # Фильтры загруженных строк: текст в колонке, статусы, только строки с ошибками
+        filter_layout = QHBoxLayout()
+        filter_layout.addWidget(QLabel("Фильтр:"))
+        self.filterColumnCombo = QComboBox()
+        self.filterColumnCombo.addItem("Все колонки", None)
+        for col_name in ResultsTableModel.COLUMNS:
+            self.filterColumnCombo.addItem(col_name, col_name)
+        self.filterColumnCombo.currentIndexChanged.connect(self.on_filter_column_changed)
+        self.filterEdit = QLineEdit()
+        self.filterEdit.setPlaceholderText("Текст в колонке...")
+        self.filterEdit.textEdited.connect(self.on_filter_text_edited)
+        filter_layout.addWidget(self.filterColumnCombo)
+        filter_layout.addWidget(self.filterEdit)
+        self.facetCombos = {}
+        for col_name in ResultsTableModel.STATUS_COLUMNS:
+            combo = QComboBox()
+            combo.addItem(f"{col_name}: все", None)
+            combo.currentIndexChanged.connect(lambda _index, col_name=col_name: self.on_facet_changed(col_name))
+            self.facetCombos[col_name] = combo
+            filter_layout.addWidget(combo)
+        self.chkOnlyErrors = QCheckBox("Только с ошибками")
+        self.chkOnlyErrors.toggled.connect(self.on_only_errors_toggled)
+        filter_layout.addWidget(self.chkOnlyErrors)
+        self.btnResetView = QPushButton("Сбросить")
+        self.btnResetView.setToolTip("Снять фильтры и сортировку")
+        self.btnResetView.clicked.connect(self.reset_results_view)
+        filter_layout.addWidget(self.btnResetView)
+        self.viewCountLabel = QLabel("") # Сколько строк осталось после фильтров
+        filter_layout.addWidget(self.viewCountLabel)
+        right_layout.addLayout(filter_layout)
         right_layout.addWidget(self.dataTable)
+        # Значения статусов и число показанных строк обновляются после изменений таблицы (не на каждое изменение)
+        self.viewStatsTimer = QTimer(self)
+        self.viewStatsTimer.setSingleShot(True)
+        self.viewStatsTimer.setInterval(200)
+        self.viewStatsTimer.timeout.connect(self.update_results_view_stats)
+        self.resultsProxy.modelReset.connect(lambda: self.viewStatsTimer.start())
+        self.resultsProxy.rowsInserted.connect(lambda *_args: self.viewStatsTimer.start())
+        self.tableModel.dataChanged.connect(lambda *_args: self.viewStatsTimer.start())
 
         # Примечания (ЕДИНОЕ ПОЛЕ)
         notes_layout = QVBoxLayout()
@@ -355,13 +530,12 @@ class AccreditationApp(QWidget):
             self.dataTable.setColumnHidden(self.COL_END_AKKR, True)
             return
 
-        # Проверяем, есть ли непустые значения (кроме пустых строк и None/NaN)
-        # Преобразуем в строки и удаляем пробелы для проверки на "пустоту"
-        has_status_prov = not df_for_check['Статус Проверки'].astype(str).str.strip().replace('', pd.NA).isna().all()
-        has_err_valid = not df_for_check['Ошибки Валидации'].astype(str).str.strip().replace('', pd.NA).isna().all()
-        has_prim = not df_for_check['Прим.'].astype(str).str.strip().replace('', pd.NA).isna().all()
-        has_start_akkr = not df_for_check['Начало аккр.'].astype(str).str.strip().replace('', pd.NA).isna().all()
-        has_end_akkr = not df_for_check['Конец аккр.'].astype(str).str.strip().replace('', pd.NA).isna().all()
+        # Проверяем, есть ли непустые значения (кроме пустых строк и None/NaN) - по показанным в таблице данным
+        has_status_prov = self.tableModel.column_has_values('Статус Проверки')
+        has_err_valid = self.tableModel.column_has_values('Ошибки Валидации')
+        has_prim = self.tableModel.column_has_values('Прим.')
+        has_start_akkr = self.tableModel.column_has_values('Начало аккр.')
+        has_end_akkr = self.tableModel.column_has_values('Конец аккр.')
 
         self.dataTable.setColumnHidden(self.COL_STATUS_PROV, not has_status_prov)
         self.dataTable.setColumnHidden(self.COL_ERR_VALID, not has_err_valid)
@@ -379,15 +553,17 @@ class AccreditationApp(QWidget):
     def handle_load_and_process_result(self, result):
         """Обработка результата загрузки и проверки файла."""
         if isinstance(result, dict) and 'processed_df' in result:
-            self.df_processed = result['processed_df']
-            self.current_reports = result.get('reports', {})
-            self.df_to_add_td = result.get('to_td', pd.DataFrame())
+            # Хранится только канонический DataFrame; отчеты и список для TD - его представления,
+            # таблица для показа собирается в задаче и после заполнения виджета не хранится
+            self.df_processed = result['canonical_df']
+            self.current_reports = result.get('reports', FrameViews())
+            self.df_to_add_td = result.get('to_td', FrameView.empty_view())
 
-            self.logMessage(f"Файл обработан. Найдено {len(self.df_processed)} записей.", "INFO")
-            self.update_table_signal.emit(self.df_processed) # Обновляем таблицу в основном потоке
+            self.logMessage(f"Файл обработан. Найдено {len(result['processed_df'])} записей.", "INFO")
+            self.update_table_signal.emit(result['processed_df']) # Обновляем таблицу в основном потоке
 
             # Активируем кнопки сохранения отчетов и добавления в TD, если есть данные
-            self.btnSaveReports.setEnabled(any(not df.empty for df in self.current_reports.values()))
+            self.btnSaveReports.setEnabled(self.current_reports.has_rows())
             self.btnAddTD.setEnabled(not self.df_to_add_td.empty)
             self.task_finished_signal.emit("Загрузка и обработка файла")
         elif isinstance(result, str) and "Отменено" in result:
@@ -395,25 +571,76 @@ class AccreditationApp(QWidget):
         else:
              self.logMessage("Обработка файла завершилась с неопределенным результатом или ошибкой.", "ERROR")
 
-    def handle_search_result(self, result_df):
-        """Обработка результата поиска."""
+    def handle_search_result(self, result):
+        """Обработка первой страницы результата поиска."""
+        if result['request_id'] != self._search_request_id:
+            # Пока выполнялся этот поиск, был запущен более новый
+            self.logMessage(f"Результат устаревшего поиска '{result['term']}' отброшен.", "DEBUG")
+            return
+        result_df = result['df']
+        self._search_state = {'term': result['term'], 'rows': result['rows'], 'complete': result['complete'],
+                              'loading': False}
         if result_df is not None:
-            self.logMessage(f"Поиск завершен. Найдено {len(result_df)} записей.", "INFO")
+            if result['complete']:
+                self.logMessage(f"Поиск завершен. Найдено {len(result_df)} записей.", "INFO")
+                self.searchCountLabel.setText(f"Найдено: {len(result_df)}")
+            else:
+                self.logMessage(f"Поиск: показаны первые {len(result_df)} записей, "
+                                "остальные загружаются при прокрутке.", "INFO")
+                self.searchCountLabel.setText("Найдено: подсчет...")
+                self.run_task_in_background(self._task_count_search_results, self.handle_search_count_result,
+                                            self._search_request_id, result['term'], self._new_search_query())
             # Добавляем пустые колонки для совместимости с displayTable
             result_df['Статус Проверки'] = ''
             result_df['Ошибки Валидации'] = ''
             self.update_table_signal.emit(result_df)
+            self.tableModel.set_more_available(not result['complete'])
         else:
+            self._search_state = None
+            self.searchCountLabel.setText("")
             self.logMessage("Ошибка во время поиска или ничего не найдено.", "WARNING")
-            self.dataTable.setRowCount(0) # Очищаем таблицу
+            self.tableModel.clear() # Очищаем таблицу
         self.task_finished_signal.emit("Поиск сотрудников")
 
+    def handle_search_page_result(self, result):
+        """Добавляет в таблицу следующую страницу результата поиска."""
+        if result['request_id'] != self._search_request_id or self._search_state is None:
+            return
+        state = self._search_state
+        state['loading'] = False
+        if result['df'] is None:
+            # Ошибка или превышение времени запроса - дальше не догружаем, чтобы не повторять ее при прокрутке
+            self.logMessage(f"Не удалось загрузить следующие результаты поиска '{result['term']}'.", "WARNING")
+            return
+        state['rows'] = pd.concat([state['rows'], result['rows']], ignore_index=True)
+        state['complete'] = result['complete']
+        if result['complete']:
+            self.searchCountLabel.setText(f"Найдено: {len(state['rows'])}")
+            self.logMessage(f"Загружены все результаты поиска: {len(state['rows'])} записей.", "DEBUG")
+        # Если после добавления таблица все еще прокручена до конца, представление сразу запросит следующую страницу
+        self.tableModel.set_more_available(not result['complete'])
+        if not result['df'].empty:
+            self.tableModel.append_frame(result['df'])
+            self.update_column_visibility(result['df'])
+
+    def handle_search_count_result(self, result):
+        """Показывает число результатов поиска (точное или оценку планировщика)."""
+        if result['request_id'] != self._search_request_id or self._search_state is None:
+            return
+        if self._search_state['complete']:
+            return # Все строки уже загружены - показано точное число
+        if result['count'] is None:
+            self.searchCountLabel.setText("")
+            return
+        prefix = "≈" if result['estimated'] else ""
+        self.searchCountLabel.setText(f"Найдено: {prefix}{result['count']}")
+
     def handle_add_td_result(self, success_count):
         """Обработка результата добавления в TD."""
         if success_count is not None:
             self.logMessage(f"Успешно добавлено {success_count} записей в временную таблицу.", "INFO")
             # Очищаем список для добавления и деактивируем кнопку
-            self.df_to_add_td = pd.DataFrame()
+            self.df_to_add_td = FrameView.empty_view()
             self.btnAddTD.setEnabled(False)
             # НЕ ОЧИЩАЕМ поле notesEdit, пользователь сам решит
             # self.notesEdit.clear()
@@ -430,12 +657,9 @@ class AccreditationApp(QWidget):
              self.logMessage(message, "INFO")
              # Обновляем статус в таблице UI
              if row_index is not None and new_status is not None:
-                 status_item = QTableWidgetItem(new_status)
-                 status_item.setForeground(QBrush(QColor("orange" if new_status == "В черном списке" else "lightblue")))
-                 self.dataTable.setItem(row_index, 7, status_item) # Колонка 'Статус БД'
+                 self.tableModel.set_value(row_index, 'Статус БД', new_status)
                  # Обновляем статус проверки тоже
-                 check_status_item = QTableWidgetItem(new_status)
-                 self.dataTable.setItem(row_index, 8, check_status_item) # Колонка 'Статус Проверки'
+                 self.tableModel.set_value(row_index, 'Статус Проверки', new_status)
         elif isinstance(result, str): # Сообщение об ошибке или отмене
             self.logMessage(result, "WARNING")
         self.task_finished_signal.emit("Управление черным списком")
@@ -458,50 +682,108 @@ class AccreditationApp(QWidget):
     def update_note_indicator_in_table(self, person_id, has_notes):
         """Обновляет индикатор 'Прим.' для строки с заданным ID."""
         note_indicator = '✓' if has_notes else ''
-        for row in range(self.dataTable.rowCount()):
-            id_item = self.dataTable.item(row, 0)  # ID column
-            note_item = self.dataTable.item(row, 10)  # 'Прим.' column
-            if id_item and id_item.text().isdigit() and int(id_item.text()) == person_id:
-                if note_item:
-                    note_item.setText(note_indicator)
-                else:
-                    # Если ячейки нет, создаем
-                    new_item = QTableWidgetItem(note_indicator)
-                    new_item.setTextAlignment(Qt.AlignCenter)
-                    self.dataTable.setItem(row, 10, new_item)
-                break  # Нашли строку, выходим
-
-    def refresh_current_view(self):
-        """Обновляет текущее представление таблицы (например, повтор поиска)."""
-        # Простейший вариант - повторить последний поиск
-        search_text = self.searchEdit.text()
-        if search_text:
-            self.logMessage("Обновление результатов поиска...", "DEBUG")
-            self.run_search_people()
+        row = self.tableModel.find_row(person_id)
+        if row is not None:
+            self.tableModel.set_value(row, 'Прим.', note_indicator)
+
+    def on_results_header_clicked(self, column):
+        """Сортирует загруженные строки по колонке; с Shift - добавляет колонку к сортировке (или меняет ее направление)."""
+        col_name = ResultsTableModel.COLUMNS[column]
+        sort_keys = self.resultsProxy.sort_keys
+        current = dict(sort_keys)
+        ascending = not current[col_name] if col_name in current else True
+        if QApplication.keyboardModifiers() & Qt.ShiftModifier:
+            if col_name in current:
+                sort_keys = [(name, ascending if name == col_name else asc) for name, asc in sort_keys]
+            else:
+                sort_keys.append((col_name, ascending))
         else:
-            # Если поиска не было, можно очистить таблицу или загрузить всё (не рекомендуется)
-            self.dataTable.setRowCount(0)
+            sort_keys = [(col_name, ascending)]
+        self.resultsProxy.set_sort_keys(sort_keys)
+        header = self.dataTable.horizontalHeader()
+        header.setSortIndicatorShown(True)
+        header.setSortIndicator(column, Qt.AscendingOrder if ascending else Qt.DescendingOrder)
+        self.logMessage("Сортировка: " + ", ".join(f"{name} {'↑' if asc else '↓'}" for name, asc in sort_keys), "DEBUG")
+
+    def on_filter_column_changed(self, _index):
+        """Показывает текст фильтра выбранной колонки (у каждой колонки свой фильтр)."""
+        self.filterEdit.setText(self.resultsProxy.text_filter(self.filterColumnCombo.currentData()))
+
+    def on_filter_text_edited(self, text):
+        self.resultsProxy.set_text_filter(self.filterColumnCombo.currentData(), text)
+        self.update_results_view_stats()
+
+    def on_facet_changed(self, col_name):
+        value = self.facetCombos[col_name].currentData()
+        self.resultsProxy.set_facet(col_name, None if value is None else [value])
+        self.update_results_view_stats()
+
+    def on_only_errors_toggled(self, checked):
+        self.resultsProxy.set_non_empty('Ошибки Валидации', checked)
+        self.update_results_view_stats()
+
+    def reset_results_view(self):
+        """Снимает фильтры и сортировку загруженных строк."""
+        widgets = [self.filterEdit, self.chkOnlyErrors] + list(self.facetCombos.values())
+        for widget in widgets:
+            widget.blockSignals(True)
+        self.filterEdit.clear()
+        self.chkOnlyErrors.setChecked(False)
+        for combo in self.facetCombos.values():
+            combo.setCurrentIndex(0)
+        for widget in widgets:
+            widget.blockSignals(False)
+        self.resultsProxy.clear_filters()
+        self.dataTable.horizontalHeader().setSortIndicatorShown(False)
+        self.update_results_view_stats()
+
+    def update_results_view_stats(self):
+        """Обновляет списки статусов (с числом строк) и число показанных строк."""
+        for col_name, combo in self.facetCombos.items():
+            selected = combo.currentData()
+            values = self.resultsProxy.facet_values(col_name) if self.tableModel.rowCount() else []
+            if selected is not None and selected not in dict(values):
+                values.append((selected, 0)) # Выбранный статус остается в списке, пока фильтр не снят
+            combo.blockSignals(True)
+            combo.clear()
+            combo.addItem(f"{col_name}: все", None)
+            for text, count in values:
+                combo.addItem(f"{text or '(пусто)'} ({count})", text)
+            combo.setCurrentIndex(max(0, combo.findData(selected)) if selected is not None else 0)
+            combo.blockSignals(False)
+        shown, total = self.resultsProxy.rowCount(), self.tableModel.rowCount()
+        self.viewCountLabel.setText(f"Показано: {shown} из {total}" if self.resultsProxy.filtered else "")
+
+    @pyqtSlot(object)
+    def handle_user_request(self, request):
+        """Показывает пользователю окно по запросу приостановленной фоновой задачи (AwaitUser)."""
+        handlers = {'name_review': self.handle_name_review_request,
+                    'new_employee': self.handle_new_employee_action_request}
+        handler = handlers.get(request.kind)
+        if handler is None:
+            self.logMessage(f"Неизвестный запрос к пользователю из фоновой задачи: {request.kind}", "ERROR")
+            request.resolve(None)
+            return
+        handler(request)
 
-    @pyqtSlot(dict, int)
-    def handle_new_employee_action_request(self, data_dict, index):
+    def handle_new_employee_action_request(self, request):
         """Запрашивает у пользователя действие для нового сотрудника."""
+        data_dict, index = request.payload['data'], request.payload['index']
         fio = f"{data_dict.get('Фамилия', '')} {data_dict.get('Имя', '')} {data_dict.get('Отчество', '')}".strip()
         items = ("Добавить как 'Активный'", "Добавить в TD 'На проверку'", "Пропустить")
-        item, ok = QInputDialog.getItem(self, "Новый сотрудник",
-                                        f"Сотрудник {fio} не найден в базе.\nВыберите действие:",
-                                        items, 0, False)
-        action = None
-        if ok and item:
-            if item == items[0]:  # Добавить как 'Активный'
-                action = 'activate'
-            elif item == items[1]:  # Добавить в TD 'На проверку'
-                action = 'add_to_td'
-            else:  # Пропустить
-                action = 'skip'
-        else:
-            action = 'skip'  # Считаем пропуском, если диалог отменен
-
-        self.new_employee_actions[index] = action  # Сохраняем выбор пользователя
+        action = 'skip'  # Считаем пропуском, если диалог отменен
+        try:
+            item, ok = QInputDialog.getItem(self, "Новый сотрудник",
+                                            f"Сотрудник {fio} не найден в базе.\nВыберите действие:",
+                                            items, 0, False)
+            if ok and item:
+                if item == items[0]:  # Добавить как 'Активный'
+                    action = 'activate'
+                elif item == items[1]:  # Добавить в TD 'На проверку'
+                    action = 'add_to_td'
+        finally:
+            # Задача продолжается в любом случае (при ошибке окна сотрудник пропускается)
+            request.resolve(action)
         self.logMessage(f"Действие для нового сотрудника {fio} (индекс {index}): {action}", "INFO")
 
         # --- Слот для сохранения примечания ВЫБРАННОМУ ---
@@ -511,10 +793,7 @@ class AccreditationApp(QWidget):
         notes_text = self.notesEdit.toPlainText().strip()  # Получаем актуальный текст
 
         if selected_row_index is not None:
-            person_id = None
-            person_id_item = self.dataTable.item(selected_row_index, 0)
-            if person_id_item and person_id_item.text().isdigit():
-                person_id = int(person_id_item.text())
+            person_id = self.tableModel.person_id(selected_row_index)
 
             if person_id is None:
                 QMessageBox.warning(self, "Ошибка",
@@ -541,11 +820,7 @@ class AccreditationApp(QWidget):
             QMessageBox.information(self, "Информация", "Поле примечаний пусто. Нечего сохранять для всех.")
             return
 
-        visible_ids = []
-        for row in range(self.dataTable.rowCount()):
-            id_item = self.dataTable.item(row, 0)
-            if id_item and id_item.text().isdigit():
-                visible_ids.append(int(id_item.text()))
+        visible_ids = self.resultsProxy.person_ids() # Только строки, оставшиеся после фильтров
 
         if not visible_ids:
             QMessageBox.warning(self, "Нет данных",
@@ -564,201 +839,560 @@ class AccreditationApp(QWidget):
 
     # --- Методы, выполняемые в фоновых потоках ---
 
-    def _task_load_and_process_file(self, signals):
-        """Worker: Загружает, параллельно обрабатывает и проверяет файл."""
-        signals.log.emit("Запрос выбора файла...", "INFO")
-        file_name = self.file_manager.open_file_dialog()
-        if not file_name:
-            return "Загрузка файла отменена пользователем."
-
+    def _resolve_db_statuses(self, df, mask, timings, use_snapshot=False, cancel_token=None):
+        """
+        Проверяет статусы в БД для строк df, отмеченных mask, и заполняет колонки 'Статус БД' и 'ID'.
+        use_snapshot - статусы определяются по снимку личностей в памяти, иначе запросом на каждую строку.
+        cancel_token (CancellationToken) - при запросах по строкам проверяется перед каждым запросом,
+        а отмена прерывает выполняющийся запрос на сервере.
+        """
+        with timings.stage('db_status', int(mask.sum())):
+            statuses = self.identity_snapshot.lookup(df[mask]) if use_snapshot and mask.any() else None
+            if statuses is not None:
+                df.loc[mask, 'Статус БД'] = statuses['status']
+                df.loc[mask, 'ID'] = statuses['person_id']
+                return
+            if cancel_token is None:
+                self._query_db_statuses(df, mask)
+                return
+            query_handle = CancellableQuery()
+            with cancel_token.linked(query_handle.cancel):
+                self._query_db_statuses(df, mask, query_handle, cancel_token)
+
+    def _query_db_statuses(self, df, mask, query_handle=None, cancel_token=None):
+        """Запрашивает статус в БД для каждой строки df, отмеченной mask (все запросы - через query_handle)."""
+        for index, row in df[mask].iterrows():
+            if cancel_token is not None:
+                cancel_token.check()
+            # Данные передаются в get_person_status в том же виде, в каком они были обработаны.
+            status_info = self.db_manager.get_person_status(
+                row.get('Фамилия'), row.get('Имя'), row.get('Отчество'), row.get('Дата рождения'),
+                query_handle=query_handle
+            )
+            if status_info is None: # Запрос прерван отменой задачи
+                cancel_token.check()
+            df.at[index, 'Статус БД'] = status_info['status']
+            df.at[index, 'ID'] = status_info['person_id']
+
+    def _build_display_frame(self, df_parts):
+        """Собирает DataFrame для таблицы из частей (прошедшие проверку, отклоненные) в порядке отображения."""
+        df = pd.concat(df_parts, ignore_index=True) if len(df_parts) > 1 else df_parts[0]
+        all_cols = [
+            'ID', 'Фамилия', 'Имя', 'Отчество', 'Дата рождения', 'Место рождения',
+            'Организация', 'Должность', 'Статус БД', 'Статус Проверки',
+            'Ошибки Валидации', 'Прим.',
+            'Начало аккр.', 'Конец аккр.'
+        ]
+        # Колонки для показа собираются по одной: копируются только колонки, которые нужно преобразовать
+        columns = {}
+        for col in all_cols:
+            source = 'Validation_Errors' if col == 'Ошибки Валидации' and col not in df.columns else col
+            if source not in df.columns:
+                columns[col] = np.full(len(df), '', dtype=object)
+                continue
+            values = df[source]
+            # Категориальные колонки канонического DataFrame для показа приводим к обычным значениям
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                values = values.astype(object)
+            if values.hasnans:
+                values = values.fillna('')
+            columns[col] = values.to_numpy()
+        return pd.DataFrame(columns, index=pd.RangeIndex(len(df)))
+
+    @staticmethod
+    def _is_gph(df):
+        """Маска строк, у которых в организации указан ГПХ."""
+        return df['Организация'].astype(str).str.contains('ГПХ', case=False)
+
+    def _process_batch(self, batch, rows_state, timings, cancel_token=None):
+        """
+        Очищает и валидирует пакет, повторно используя построчные результаты предыдущей загрузки того же файла:
+        заново обрабатываются только новые и измененные строки, для остальных берутся сохраненные результаты
+        и еще актуальные статусы БД. Возвращает (обработанный пакет с индексом batch, число повторно использованных строк).
+        """
+        hashes = self.processor.row_hashes(batch) if self.result_cache.enabled else None
+        if hashes is None:
+            rows_state['complete'] = False
+        elif rows_state['key'] is None:
+            rows_state['key'] = self.result_cache.row_record_key(rows_state['logical_name'],
+                                                                 self.processor.input_columns(batch))
+            rows_state['previous'] = self.result_cache.load(rows_state['key'])
+        previous = rows_state['previous']
+
+        if hashes is not None and previous is not None:
+            known = hashes.isin(previous.index)
+        else:
+            known = pd.Series(False, index=batch.index)
+        parts = []
+        if not known.all():
+            df_new = self.processing_executor.process(batch[~known], timings=timings, cancel_token=cancel_token)
+            df_new.index = batch.index[~known]
+            parts.append(df_new)
+        if known.any():
+            # Колонки, которые не участвуют в обработке, берутся из файла как есть
+            # take возвращает новый DataFrame (не представление batch), колонки в нем заменяются без копии
+            df_reused = batch.take(np.flatnonzero(known))
+            cached = previous.loc[hashes[known]]
+            for col in self.processor.input_columns(batch) + DataProcessor.RESULT_COLUMNS:
+                df_reused[col] = cached[col].to_numpy()
+            parts.append(df_reused)
+        df_batch = pd.concat(parts).sort_index() if len(parts) > 1 else parts[0]
+
+        df_batch['Статус БД'] = None
+        df_batch['ID'] = None
+        resolved_at = pd.Series(np.nan, index=df_batch.index)
+        if known.any():
+            self._apply_cached_statuses(df_batch, hashes, previous, resolved_at)
+        if hashes is not None:
+            rows_state['hashes'].append(hashes)
+        rows_state['resolved_at'].append(resolved_at)
+        return df_batch, int(known.sum())
+
+    def _apply_cached_statuses(self, df, hashes, previous, resolved_at):
+        """Переносит статусы БД из предыдущей загрузки для строк, проверенных не раньше status_ttl_sec назад."""
+        ttl = self.result_cache.status_ttl_sec
+        if not ttl or previous is None:
+            return
+        fresh = previous[previous[ResultCache.RESOLVED_AT_COLUMN] >= time.time() - ttl]
+        mask = hashes.isin(fresh.index)
+        if mask.any():
+            cached = fresh.loc[hashes[mask]]
+            df.loc[mask, 'Статус БД'] = cached['Статус БД'].to_numpy()
+            # В parquet целочисленные ID с пропусками сохраняются как float - возвращаем int/None
+            df.loc[mask, 'ID'] = pd.Series([None if pd.isna(value) else int(value) for value in cached['ID']],
+                                           index=df.index[mask], dtype=object)
+            resolved_at[mask] = cached[ResultCache.RESOLVED_AT_COLUMN].to_numpy()
+
+    def _store_row_results(self, rows_state, df_processed, df_resolved):
+        """
+        Сохраняет построчные результаты загрузки (обработанные значения и статусы БД по хэшам исходных строк)
+        для следующей загрузки того же файла.
+        """
+        if rows_state['key'] is None or not rows_state['complete']:
+            return
+        hashes = pd.concat(rows_state['hashes'], ignore_index=True)
+        resolved_at = pd.concat(rows_state['resolved_at'], ignore_index=True)
+        if len(hashes) != len(df_processed):
+            return
+        # df_processed создается только для этого кэша, дополняем его на месте
+        record = df_processed
+        record['Статус БД'] = None
+        record['ID'] = None
+        record.loc[df_resolved.index, 'Статус БД'] = df_resolved['Статус БД']
+        record.loc[df_resolved.index, 'ID'] = df_resolved['ID']
+        # Статусы, проверенные в эту загрузку, получают текущее время; перенесенные сохраняют прежнее
+        resolved_at = resolved_at.where(resolved_at.notna() | record['Статус БД'].isna(), time.time())
+        record[ResultCache.RESOLVED_AT_COLUMN] = resolved_at.to_numpy()
+        record.index = hashes.to_numpy()
+        record = record[~record.index.duplicated(keep='first')]
+        self.result_cache.store(rows_state['key'], record)
+
+    def _duplicate_mask(self, df, identity, seen_identities=None):
+        """
+        Маска повторных вхождений одного и того же человека среди строк без ошибок валидации
+        (первое вхождение дубликатом не считается). seen_identities - личности из предыдущих пакетов, пополняется.
+        """
+        valid = df['Validation_Errors'].isna()
+        is_duplicate = identity[valid].duplicated().reindex(df.index, fill_value=False)
+        if seen_identities is not None:
+            is_duplicate |= valid & identity.isin(seen_identities)
+            seen_identities.update(identity[valid].tolist())
+        return is_duplicate
+
+    def _collapse_duplicates(self, df):
+        """
+        Схлопывает повторные вхождения одного человека в файле до первого вхождения.
+        У оставшейся строки в колонке 'Объединенные строки' перечисляются номера схлопнутых строк,
+        у схлопнутых в колонке 'Дубликат строки' - номер оставшейся. Возвращает (df без дубликатов, дубликаты).
+        """
+        identity = self.processor.identity_hashes(df)
+        is_duplicate = self._duplicate_mask(df, identity)
+        if not is_duplicate.any():
+            return df, df.iloc[0:0]
+
+        valid = df['Validation_Errors'].isna()
+        row_numbers = pd.Series(df.index + 1, index=df.index)
+        # Номер строки первого вхождения для каждой личности
+        first_row = row_numbers[valid].groupby(identity[valid]).transform('first').reindex(df.index)
+
+        # take возвращает новые DataFrame (не представления df), в них можно добавлять колонки без копии
+        df_duplicates = df.take(np.flatnonzero(is_duplicate))
+        # Статусы БД для дубликатов не проверяются (могли быть перенесены из предыдущей загрузки)
+        df_duplicates['Статус БД'] = None
+        df_duplicates['ID'] = None
+        df_duplicates['Дубликат строки'] = first_row[is_duplicate].astype('Int64')
+        merged = row_numbers[is_duplicate].astype(str).groupby(first_row[is_duplicate]).agg(', '.join)
+
+        df_unique = df.take(np.flatnonzero(~is_duplicate))
+        df_unique['Объединенные строки'] = (df_unique.index + 1).map(merged)
+        return df_unique, df_duplicates
+
+    def _stream_and_process_file(self, file_name, signals, rows_state, timings, cancel_token=None):
+        """
+        Потоково читает файл пакетами, удаляет пустые строки, очищает и валидирует каждый пакет по мере чтения.
+        Возвращает обработанный DataFrame (пустой, если данных нет) или None при ошибке чтения/обработки.
+        Замеры этапов добавляются в timings (StageTimings). cancel_token проверяется перед каждым пакетом
+        и передается в обработку и проверку статусов пакета; отмена прерывает чтение (TaskCancelled).
+        """
+        # Каждый пакет сразу проходит обработку и проверку статусов в БД,
+        # поэтому первые результаты появляются в таблице до окончания чтения файла.
+        signals.log.emit(f"Потоковая загрузка данных из {os.path.basename(file_name)}...", "INFO")
+        processed_batches = []
+        removed_count = 0
+        reused_count = 0
+        seen_identities = set()
         try:
-            # --- Шаг 1: Загрузка и предварительная очистка пустых строк ---
-            signals.log.emit(f"Загрузка данных из {os.path.basename(file_name)}...", "INFO")
-            self.df_loaded = pd.read_excel(file_name, engine='openpyxl')
-
-            initial_rows = len(self.df_loaded)
-            cols_to_check = self.df_loaded.columns.tolist()
-            if cols_to_check and ('№ п/п' in cols_to_check[0] or 'пп' in cols_to_check[0].lower()):
-                cols_to_check = cols_to_check[1:]
-            if cols_to_check:
-                self.df_loaded.dropna(subset=cols_to_check, how='all', inplace=True)  # <--- Эта строка удаляет пустые
-                removed_count = initial_rows - len(self.df_loaded)
-                if removed_count > 0:
-                    signals.log.emit(f"Удалено {removed_count} пустых строк.", "INFO")
-            # --- КОНЕЦ УДАЛЕНИЯ ПУСТЫХ СТРОК ---
-
-            if self.df_loaded.empty:
-                signals.log.emit("Файл пуст после удаления пустых строк.", "WARNING")
-                return {'status': 'error', 'message': "Файл не содержит данных."}
-
+            for batch, rows_read, total_rows in self.file_manager.iter_input_batches(file_name, timings=timings):
+                if cancel_token is not None:
+                    cancel_token.check()
+                with timings.stage('drop_empty', len(batch)) as stage:
+                    batch, removed = self.processor.drop_empty_rows(batch)
+                    stage['rows_out'] = len(batch)
+                removed_count += removed
+                if not batch.empty:
+                    df_batch, reused = self._process_batch(batch, rows_state, timings, cancel_token)
+                    reused_count += reused
+                    # Строки без ошибок и без подозрительных ФИО проверяем в БД сразу,
+                    # подозрительные - после подтверждения пользователем; повторы человека в файле не проверяем
+                    is_duplicate = self._duplicate_mask(df_batch, self.processor.identity_hashes(df_batch),
+                                                        seen_identities)
+                    ready_mask = (df_batch['Validation_Errors'].isna() & ~df_batch['Name_Check_Required']
+                                  & ~is_duplicate)
+                    self._resolve_db_statuses(df_batch, ready_mask & df_batch['Статус БД'].isna(), timings,
+                                              rows_state['use_snapshot'], cancel_token)
+                    processed_batches.append(df_batch)
+
+                    # Статус проверки проставляется в собранной для показа таблице, пакет не копируется
+                    df_preview = self._build_display_frame([df_batch[ready_mask]])
+                    df_preview['Статус Проверки'] = df_preview['Статус БД'].map(self.STATUS_CHECK_LABELS).fillna("На проверку")
+                    signals.partial_result.emit(df_preview, len(processed_batches) == 1)
+
+                if total_rows:
+                    signals.progress.emit(min(60, int(60 * rows_read / total_rows)))
+                signals.log.emit(f"Прочитано и обработано строк: {rows_read}" + (f" из {total_rows}" if total_rows else ""), "DEBUG")
         except FileNotFoundError:
             signals.log.emit(f"Файл не найден: {file_name}", "ERROR")
             return None
-        except ImportError:
-             signals.log.emit("Движок 'openpyxl' не установлен. Установите: pip install openpyxl", "ERROR")
+        except ImportError as e:
+             signals.log.emit(f"Не установлен движок чтения файла: {e}", "ERROR")
              return None
         except Exception as e:
-            signals.log.emit(f"Ошибка чтения Excel файла: {e}", "ERROR")
+            self.logger.exception("Ошибка во время чтения или обработки файла.")
+            signals.log.emit(f"Ошибка чтения или обработки файла: {e}", "ERROR")
             return None
 
-        signals.progress.emit(10)
+        if removed_count > 0:
+            signals.log.emit(f"Удалено {removed_count} пустых строк.", "INFO")
+        if reused_count > 0:
+            signals.log.emit(f"Файл загружался ранее: {reused_count} неизмененных строк взято из предыдущей загрузки, "
+                             f"заново обработаны только новые и измененные строки.", "INFO")
+        if not processed_batches:
+            return pd.DataFrame()
+        return pd.concat(processed_batches, ignore_index=True)
+
+    def _task_load_and_process_file(self, signals, cancel_token):
+        """
+        Worker: Потоково загружает файл пакетами, обрабатывает и проверяет каждый пакет по мере чтения.
+        Отмена (cancel_token) проверяется между пакетами, чанками обработки и запросами статусов.
+        """
+        signals.log.emit("Запрос выбора файла...", "INFO")
+        file_name = self.file_manager.open_file_dialog()
+        if not file_name:
+            return "Загрузка файла отменена пользователем."
 
+        # Замеры этапов загрузки: время, строки на входе и выходе (отчет выводится в лог и пишется в JSON)
+        timings = StageTimings()
+
+        # --- Шаги 1-2: Чтение, удаление пустых строк, очистка и валидация ---
+        # Файл с тем же содержимым (при той же версии правил обработки) повторно не разбирается:
+        # результат очистки и валидации берется из кэша, заново выполняется только проверка статусов в БД.
+        cache_started = time.perf_counter()
         try:
-            # --- Шаг 2: Многопроцессорная обработка (очистка и валидация) ---
-            signals.log.emit("Начало многопроцессорной обработки данных...", "INFO")
-            num_processes = max(1, cpu_count() - 1)
-            df_chunks = np.array_split(self.df_loaded, num_processes)
+            cache_key = self.result_cache.make_key(file_name) if self.result_cache.enabled else None
+        except OSError as e:
+            signals.log.emit(f"Не удалось прочитать файл {file_name}: {e}", "ERROR")
+            return None
+        # Построчные результаты предыдущей загрузки того же логического файла (по имени файла):
+        # при изменении нескольких строк заново обрабатываются и проверяются в БД только они
+        rows_state = {'logical_name': os.path.basename(file_name), 'key': None, 'previous': None,
+                      'hashes': [], 'resolved_at': [], 'complete': True, 'use_snapshot': False}
+        df_validated = self.result_cache.load(cache_key) if cache_key else None
+        timings.add('cache', time.perf_counter() - cache_started, 0 if df_validated is None else len(df_validated))
+        # Снимок личностей БД: первый раз загружается целиком, затем дозагружаются только изменения.
+        # Статусы строк файла определяются по нему в памяти, без запроса к БД на каждую строку.
+        if self.status_check_config['mode'] == 'snapshot':
+            snapshot_query = CancellableQuery()
+            with timings.stage('identity_snapshot'), cancel_token.linked(snapshot_query.cancel):
+                rows_state['use_snapshot'] = self.identity_snapshot.refresh(snapshot_query)
+            cancel_token.check()
+            if not rows_state['use_snapshot']:
+                signals.log.emit("Не удалось получить снимок личностей из БД: статусы будут проверены "
+                                 "запросом по каждой строке.", "WARNING")
+        if df_validated is not None:
+            signals.log.emit(f"Файл уже обрабатывался: результат очистки и валидации ({len(df_validated)} строк) "
+                             f"взят из кэша.", "INFO")
+            df_validated['Статус БД'] = None
+            df_validated['ID'] = None
+            resolved_at = pd.Series(np.nan, index=df_validated.index)
+            hashes = df_validated.pop(ResultCache.ROW_HASH_COLUMN) if ResultCache.ROW_HASH_COLUMN in df_validated else None
+            if hashes is not None:
+                rows_state['key'] = self.result_cache.row_record_key(rows_state['logical_name'],
+                                                                     self.processor.input_columns(df_validated))
+                rows_state['previous'] = self.result_cache.load(rows_state['key'])
+                self._apply_cached_statuses(df_validated, hashes, rows_state['previous'], resolved_at)
+                rows_state['hashes'].append(hashes)
+            else:
+                rows_state['complete'] = False
+            rows_state['resolved_at'].append(resolved_at)
+        else:
+            df_validated = self._stream_and_process_file(file_name, signals, rows_state, timings, cancel_token)
+            if df_validated is None:
+                return None
+            if not df_validated.empty and cache_key:
+                with timings.stage('cache', len(df_validated)):
+                    # В кэш не попадают статусы БД: актуальные статусы берутся из построчных результатов
+                    df_to_cache = df_validated.drop(columns=['Статус БД', 'ID'])
+                    if rows_state['complete'] and rows_state['hashes']:
+                        df_to_cache[ResultCache.ROW_HASH_COLUMN] = pd.concat(rows_state['hashes'], ignore_index=True).to_numpy()
+                    self.result_cache.store(cache_key, df_to_cache)
+
+        if df_validated.empty:
+            signals.log.emit("Файл пуст после удаления пустых строк.", "WARNING")
+            return {'status': 'error', 'message': "Файл не содержит данных."}
+        signals.log.emit("Обработка данных завершена.", "INFO")
+        signals.progress.emit(60)
 
-            with Pool(processes=num_processes) as pool:
-                processed_chunks = pool.map(process_data_chunk, df_chunks)
+        # Результаты обработки до подтверждений пользователя (для построчного кэша)
+        # Выбор списка колонок копирует данные: дальнейшие изменения df_validated сюда не попадают
+        df_processed = df_validated[self.processor.input_columns(df_validated) + DataProcessor.RESULT_COLUMNS]
 
-            df_validated = pd.concat(processed_chunks, ignore_index=True)
-            signals.log.emit("Многопроцессорная обработка завершена.", "INFO")
-            signals.progress.emit(60)
-        except Exception as e:
-            self.logger.exception("Ошибка во время многопроцессорной обработки.")
-            return f"Ошибка обработки: {e}"
+        # Повторные вхождения одного человека схлопываются до первого и не проверяются в БД
+        with timings.stage('duplicates', len(df_validated)) as stage:
+            df_validated, df_duplicates = self._collapse_duplicates(df_validated)
+            stage['rows_out'] = len(df_validated)
+        if not df_duplicates.empty:
+            signals.log.emit(f"Найдено {len(df_duplicates)} повторных строк одних и тех же сотрудников: "
+                             f"они объединены с первым вхождением и вынесены в отчет 'Дубликаты'.", "WARNING")
 
         suspicious_indices = df_validated[df_validated['Name_Check_Required'] == True].index.tolist()
-        confirmed_indices = set(df_validated.index)
-        self.user_confirmations.clear()
 
         if suspicious_indices:
+            confirmation_started = time.perf_counter()
             signals.log.emit(f"Обнаружено {len(suspicious_indices)} строк с подозрительными данными. Требуется подтверждение.", "WARNING")
-            for idx in suspicious_indices:
-                 row_data = df_validated.loc[idx, ['Фамилия', 'Имя', 'Отчество']].to_string(header=False)
-                 message = f"Обнаружены потенциально некорректные данные в строке {idx+1}:\n{row_data}\n\nПроверьте данные и подтвердите их корректность."
-                 # Используем сигнал для запроса подтверждения в основном потоке
-                 signals.request_confirmation.emit(message, idx)
-                 # Здесь поток будет ждать ответа (это не идеально, но проще чем сложная машина состояний)
-                 # Правильнее было бы разбить задачу, но для простоты пока так.
-                 # Ждем, пока основной поток обработает сигнал и запишет результат в self.user_confirmations
-                 while idx not in self.user_confirmations:
-                      QThread.msleep(100) # Небольшая пауза
-
-                 if not self.user_confirmations.get(idx, False):
-                     signals.log.emit(f"Строка {idx+1} не подтверждена пользователем и будет пропущена.", "WARNING")
-                     confirmed_indices.discard(idx) # Удаляем неподтвержденные
-                     # Добавляем ошибку валидации
-                     df_validated.loc[idx, 'Validation_Errors'] = (df_validated.loc[idx, 'Validation_Errors'] or "") + "ФИО не подтвержден"
+            # Все отмеченные строки проверяются пользователем в одном окне; задача ждет одного ответа
+            df_suspicious = df_validated.loc[suspicious_indices, ['Фамилия', 'Имя', 'Отчество']]
+            details = self.processor.name_check_details(df_suspicious)
+            rows = [{'index': int(idx), 'Фамилия': surname, 'Имя': name, 'Отчество': middle_name,
+                     'rules': details.get(idx, {})}
+                    for idx, surname, name, middle_name in zip(df_suspicious.index, df_suspicious['Фамилия'],
+                                                               df_suspicious['Имя'], df_suspicious['Отчество'])]
+            # Задача приостанавливается до ответа пользователя, не занимая поток пула
+            accepted = yield AwaitUser('name_review', {'rows': rows,
+                                                       'rule_descriptions': self.processor.check_rule_descriptions()})
+            accepted = accepted or set()
+            cancel_token.check()
+            rejected_indices = [idx for idx in suspicious_indices if idx not in accepted]
+            if rejected_indices:
+                signals.log.emit(f"Не подтверждено пользователем и будет пропущено строк: {len(rejected_indices)} "
+                                 f"({', '.join(str(idx + 1) for idx in rejected_indices[:20])}"
+                                 f"{', ...' if len(rejected_indices) > 20 else ''}).", "WARNING")
+                # Добавляем ошибку валидации
+                current_errors = df_validated.loc[rejected_indices, 'Validation_Errors']
+                df_validated.loc[rejected_indices, 'Validation_Errors'] = (
+                    current_errors.where(current_errors.notna(), "").astype(str) + "ФИО не подтвержден")
+            # Время ожидания ответа пользователя учитывается отдельно от обработки
+            timings.add('confirmation', time.perf_counter() - confirmation_started, len(suspicious_indices),
+                        len(suspicious_indices) - len(rejected_indices))
 
         validation_errors_mask = df_validated['Validation_Errors'].notna()
-        df_to_process = df_validated[~validation_errors_mask].copy()
-        df_invalid = df_validated[validation_errors_mask].copy()
+        # take возвращает новый DataFrame: статусы и метки проверки записываются в него без копии
+        df_to_process = df_validated.take(np.flatnonzero(~validation_errors_mask))
+        df_invalid = df_validated[validation_errors_mask]
+        del df_validated # Дальше используются только разделенные части, исходный DataFrame освобождается
 
         signals.log.emit(f"Проверку прошли {len(df_to_process)} строк. Отклонено/не подтверждено: {len(df_invalid)}.",
                          "INFO")
 
         signals.progress.emit(60)
 
-        # --- Шаг 5: Проверка статуса в БД (только для прошедших валидацию) ---
-        if not df_to_process.empty:
-            signals.log.emit("Проверка статусов сотрудников в БД...", "INFO")
-            statuses_db, person_ids = [], []
-            for _, row in df_to_process.iterrows():
-                # Данные передаются в get_person_status в том же виде, в каком они были обработаны.
-                # Это должно решить проблему с неправильным определением статуса.
-                status_info = self.db_manager.get_person_status(
-                    row.get('Фамилия'), row.get('Имя'), row.get('Отчество'), row.get('Дата рождения')
-                )
-                statuses_db.append(status_info['status'])
-                person_ids.append(status_info['person_id'])
-            df_to_process['Статус БД'] = statuses_db
-            df_to_process['ID'] = person_ids
+        # --- Шаг 5: Проверка статуса в БД для подтвержденных строк, которые еще не проверялись ---
+        pending_mask = df_to_process['Статус БД'].isna()
+        if pending_mask.any():
+            signals.log.emit(f"Проверка статусов {int(pending_mask.sum())} подтвержденных сотрудников в БД...", "INFO")
+            self._resolve_db_statuses(df_to_process, pending_mask, timings, rows_state['use_snapshot'], cancel_token)
+        cancel_token.check()
+        self._store_row_results(rows_state, df_processed, df_to_process)
 
         signals.progress.emit(90)
 
         # --- Шаг 6: Финальное распределение по статусам и отчетам ---
-        df_to_process['Статус Проверки'] = ''
-        df_for_td_list = []
-
-        # Инициализируем словарь reports со ВСЕМИ возможными ключами
-        reports = {
-            'ГПХ_На_проверку': pd.DataFrame(),
-            'Подрядчики_На_проверку': pd.DataFrame(),
-            'ГПХ_Ранее_проверенные': pd.DataFrame(),
-            'Подрядчики_Ранее_проверенные': pd.DataFrame(),
-            'ГПХ_Ранее_отведенные': pd.DataFrame(),
-            'Подрядчики_Ранее_отведенные': pd.DataFrame(),
-            'Ошибки_ГПХ': df_invalid[df_invalid['Организация'].str.contains('ГПХ', case=False, na=False)],
-            'Ошибки_Подрядчики': df_invalid[~df_invalid['Организация'].str.contains('ГПХ', case=False, na=False)]
-        }
-
-        for index, row in df_to_process.iterrows():
-            org = str(row.get('Организация', '')).upper()
-            status_db = row['Статус БД']
-            is_gph = 'ГПХ' in org
-
-            if status_db == 'BLACKLISTED':
-                status_check = "Ранее отведен"
-                report_key = 'ГПХ_Ранее_отведенные' if is_gph else 'Подрядчики_Ранее_отведенные'
-            elif status_db == 'ACTIVE':
-                status_check = "Активен"
-                report_key = 'ГПХ_Ранее_проверенные' if is_gph else 'Подрядчики_Ранее_проверенные'
-            else:  # NOT_FOUND, EXPIRED, и т.д.
-                status_check = "На проверку"
-                report_key = 'ГПХ_На_проверку' if is_gph else 'Подрядчики_На_проверку'
-                df_for_td_list.append(row.to_dict())
-
-            df_to_process.loc[index, 'Статус Проверки'] = status_check
-            reports[report_key] = pd.concat([reports[report_key], row.to_frame().T], ignore_index=True)
-
-        df_for_td = pd.DataFrame(df_for_td_list)
-
-        # --- Шаг 7: Подготовка к возврату результата ---
-        df_display = pd.concat([df_to_process, df_invalid], ignore_index=True).fillna('')
-        if 'Validation_Errors' in df_display.columns:
-            df_display.rename(columns={'Validation_Errors': 'Ошибки Валидации'}, inplace=True)
-        # Убедимся, что все нужные колонки есть
-        all_cols = [
-            'ID', 'Фамилия', 'Имя', 'Отчество', 'Дата рождения', 'Место рождения',
-            'Организация', 'Должность', 'Статус БД', 'Статус Проверки',
-            'Ошибки Валидации', 'Прим.',
-            'Начало аккр.', 'Конец аккр.'
-        ]
-        for col in all_cols:
-             if col not in df_display.columns:
-                 df_display[col] = ''
-        df_display = df_display[all_cols]
+        # Классификация выполняется масками по всем строкам сразу
+        classification_started = time.perf_counter()
+        status_db = df_to_process['Статус БД']
+        df_to_process['Статус Проверки'] = status_db.map(self.STATUS_CHECK_LABELS).fillna("На проверку")
+        is_gph = self._is_gph(df_to_process)
+        is_blacklisted = status_db == 'BLACKLISTED'
+        is_active = status_db == 'ACTIVE'
+        to_check = ~(is_blacklisted | is_active) # NOT_FOUND, EXPIRED, и т.д.
+        is_gph_invalid = self._is_gph(df_invalid)
+        is_gph_duplicate = self._is_gph(df_duplicates)
+        total_rows = len(df_to_process) + len(df_invalid) + len(df_duplicates)
+        timings.add('classification', time.perf_counter() - classification_started, total_rows)
+
+        # --- Шаг 7: Канонический DataFrame и представления ---
+        # Все строки файла хранятся в одном DataFrame (повторяющиеся значения - как category),
+        # отчеты и список для TD - только метки его строк
+        display_started = time.perf_counter()
+        df_canonical = pd.concat([df_to_process, df_invalid, df_duplicates])
+        for col in self.CATEGORY_COLUMNS:
+            if col in df_canonical.columns:
+                df_canonical[col] = df_canonical[col].astype('category')
+
+        def view(part, mask, reset_index=True):
+            return FrameView(df_canonical, part.index[mask.to_numpy()], part.columns, reset_index=reset_index)
+
+        reports = FrameViews({
+            'ГПХ_На_проверку': view(df_to_process, to_check & is_gph),
+            'Подрядчики_На_проверку': view(df_to_process, to_check & ~is_gph),
+            'ГПХ_Ранее_проверенные': view(df_to_process, is_active & is_gph),
+            'Подрядчики_Ранее_проверенные': view(df_to_process, is_active & ~is_gph),
+            'ГПХ_Ранее_отведенные': view(df_to_process, is_blacklisted & is_gph),
+            'Подрядчики_Ранее_отведенные': view(df_to_process, is_blacklisted & ~is_gph),
+            'Ошибки_ГПХ': view(df_invalid, is_gph_invalid, reset_index=False),
+            'Ошибки_Подрядчики': view(df_invalid, ~is_gph_invalid, reset_index=False),
+            'ГПХ_Дубликаты': view(df_duplicates, is_gph_duplicate, reset_index=False),
+            'Подрядчики_Дубликаты': view(df_duplicates, ~is_gph_duplicate, reset_index=False)
+        })
+
+        # Кандидаты на добавление в TD - все строки "На проверку"
+        df_for_td = view(df_to_process, to_check, reset_index=False)
+
+        # Таблица для показа: прошедшие проверку и отклоненные строки
+        df_display = self._build_display_frame([df_canonical.iloc[:len(df_to_process) + len(df_invalid)]])
+        timings.add('display', time.perf_counter() - display_started, total_rows, len(df_display))
         result_dict = {
+            'canonical_df': df_canonical,
             'processed_df': df_display,
             'to_td': df_for_td,
             'reports': reports,
             'stats': {
                 'passed': len(df_for_td),
                 'rejected': len(df_invalid),
+                'duplicates': len(df_duplicates),
                 'suspicious': len(suspicious_indices)
-            }
+            },
+            'timings': timings.to_dict()
         }
 
         signals.progress.emit(100)
         signals.log.emit("Обработка файла завершена.", "INFO")
+        signals.log.emit(timings.format_report(), "INFO")
+        timings.write_record(file=os.path.basename(file_name), rows=total_rows, stats=result_dict['stats'])
         return result_dict
 
     # ui.py (полная функция _task_search_people)
 
-    def _task_search_people(self, signals):
-        """Worker: Выполняет поиск в БД."""
-        search_term = self.searchEdit.text().strip()
+    SEARCH_ROW_COLUMNS = ('surname', 'name', 'middle_name', 'organization')  # Колонки, по которым ищет search_people
+
+    def _can_filter_search_locally(self, search_term, previous):
+        """
+        Можно ли получить результат поиска фильтрацией результата предыдущего запроса:
+        короткий запрос, содержащий предыдущий, дает подмножество его строк (поиск по подстроке).
+        Запросы с символами шаблонов LIKE всегда выполняются в БД.
+        """
+        if previous is None or len(search_term) > self.search_config['local_max_len']:
+            return False
+        if any(char in search_term for char in '%_\\'):
+            return False
+        return previous['term'].lower() in search_term.lower()
+
+    def _filter_search_rows(self, rows, search_term):
+        """Строки предыдущего результата, у которых ФИО или организация содержат search_term (как ILIKE)."""
+        mask = np.zeros(len(rows), dtype=bool)
+        for col in self.SEARCH_ROW_COLUMNS:
+            if col in rows.columns:
+                mask |= rows[col].astype(object).str.contains(search_term, case=False, regex=False, na=False).to_numpy()
+        return rows[mask].reset_index(drop=True)
+
+    def _task_search_people(self, request_id, search_term, previous, query_handle, page_size, after=None,
+                            signals=None):
+        """
+        Worker: Выполняет поиск в БД постранично (или по результату предыдущего поиска, см. _can_filter_search_locally).
+        after - ключ последней загруженной строки для следующей страницы (None - первая страница).
+        Возвращает словарь: request_id и term запроса, rows - строки страницы в виде DataFrame
+        (для следующих страниц и фильтрации следующими запросами), complete - загружены ли все результаты,
+        df - таблица для показа или None при ошибке/отмене.
+        """
+        result = {'request_id': request_id, 'term': search_term, 'rows': None, 'df': None, 'complete': True}
         if not search_term:
             signals.log.emit("Поисковый запрос пуст.", "WARNING")
             # Возвращаем пустой DataFrame, чтобы очистить таблицу
-            return pd.DataFrame(
+            result['df'] = pd.DataFrame(
                 columns=[
             'ID', 'Фамилия', 'Имя', 'Отчество', 'Дата рождения', 'Место рождения',
             'Организация', 'Должность', 'Статус БД', 'Статус Проверки',
             'Ошибки Валидации', 'Прим.',
             'Начало аккр.', 'Конец аккр.'
         ])
+            return result
 
-        signals.log.emit(f"Выполнение поиска по запросу: '{search_term}'...", "INFO")
+        if after is None and self._can_filter_search_locally(search_term, previous):
+            rows = self._filter_search_rows(previous['rows'], search_term)
+            signals.log.emit(f"Поиск '{search_term}' по результатам запроса '{previous['term']}': "
+                             f"{len(rows)} из {len(previous['rows'])} записей.", "DEBUG")
+        else:
+            page = self._query_search_rows(search_term, after, page_size, query_handle, signals)
+            if page is None:
+                return result
+            rows, result['complete'] = page
+        result['rows'] = rows
+        result['df'] = self._search_rows_to_frame(rows, search_term, signals)
+        return result
+
+    def _query_search_rows(self, search_term, after, page_size, query_handle, signals):
+        """
+        Загружает из БД страницу поиска из page_size строк после ключа after.
+        Возвращает (DataFrame строк, загружены ли все результаты) или None при ошибке/отмене.
+        """
+        if after is None:
+            signals.log.emit(f"Выполнение поиска по запросу: '{search_term}'...", "INFO")
         try:
-            results = self.db_manager.search_people(search_term)  # Вызываем обновленный метод
+            # Лишняя строка показывает, есть ли результаты после этой страницы
+            results = self.db_manager.search_people_page(search_term, after=after, limit=page_size + 1,
+                                                         query_handle=query_handle,
+                                                         timeout_ms=self.search_config['statement_timeout_ms'])
 
             if results is None:
-                signals.log.emit(f"Ошибка при поиске (БД вернула None) по запросу: '{search_term}'.", "ERROR")
+                if query_handle is not None and query_handle.cancelled:
+                    signals.log.emit(f"Поиск по запросу '{search_term}' отменен более новым поиском.", "DEBUG")
+                else:
+                    signals.log.emit(f"Ошибка при поиске (БД вернула None) по запросу: '{search_term}'.", "ERROR")
                 return None
-            if not results:
+            return pd.DataFrame(results[:page_size]), len(results) <= page_size
+        except Exception as e:
+            signals.log.emit(f"Ошибка при запуске поиска: '{e}'.", "ERROR")
+            self.logger.exception("Полная трассировка ошибки поиска:")
+            return None
+
+    def _task_count_search_results(self, request_id, search_term, query_handle, signals):
+        """
+        Worker: Считает результаты поиска. Сначала берется оценка планировщика (без выполнения запроса);
+        если она не больше SEARCH_EXACT_COUNT_MAX, число уточняется запросом COUNT.
+        """
+        result = {'request_id': request_id, 'count': None, 'estimated': True}
+        result['count'] = self.db_manager.estimate_search_count(search_term)
+        if result['count'] is not None and result['count'] > self.search_config['exact_count_max']:
+            return result
+        exact = self.db_manager.count_search_results(search_term, query_handle=query_handle,
+                                                     timeout_ms=self.search_config['statement_timeout_ms'])
+        if exact is not None:
+            result['count'], result['estimated'] = exact, False
+        return result
+
+    def _search_rows_to_frame(self, rows, search_term, signals):
+        """Собирает таблицу для показа из строк результата поиска. Возвращает None при ошибке."""
+        try:
+            if rows.empty:
                 signals.log.emit(f"По запросу '{search_term}' ничего не найдено.", "INFO")
                 # Возвращаем пустой DataFrame с НОВЫМ набором колонок
                 return pd.DataFrame(
@@ -769,130 +1403,76 @@ class AccreditationApp(QWidget):
                             'Начало аккр.', 'Конец аккр.'
                         ])
 
-            df_results = pd.DataFrame(results)
-            if df_results.empty:
-                signals.log.emit(f"По запросу '{search_term}' ничего не найдено (после DataFrame).", "INFO")
-                return pd.DataFrame(
-                    columns=[
-                            'ID', 'Фамилия', 'Имя', 'Отчество', 'Дата рождения', 'Место рождения',
-                            'Организация', 'Должность', 'Статус БД', 'Статус Проверки',
-                            'Ошибки Валидации', 'Прим.',
-                            'Начало аккр.', 'Конец аккр.'
-                        ])
-
-            # --- Определение Статус БД ---
-            now_tz = datetime.now(self.timezone)
-
-            def map_status(row):
-                source = row.get('source')
-                if source == 'AccrTable':
-                    is_blacklisted = row.get('black_list', False)
-                    end_accr_val = row.get('end_accr')
-                    status_val = row.get('accr_status')  # Используем accr_status
-
-                    if status_val == 'в ожидании': return "В ожидании (Accr)"
-
-                    if is_blacklisted: return "В черном списке"
-                    end_accr_aware = pd.to_datetime(end_accr_val).tz_convert(self.timezone) if pd.notna(
-                        end_accr_val) else None
-                    if end_accr_aware and end_accr_aware > now_tz: return "Аккредитован"
-                    if pd.notna(status_val) and status_val:
-
-                        if status_val == 'отведен': return "Отведен (статус)"
-                        if status_val == 'истек срок': return "Истек срок"
-                        return str(status_val)
-                    if end_accr_aware and end_accr_aware <= now_tz: return "Истек срок (расчет)"
-                    return 'Неизвестно (Accr)'
-                elif source == 'TD':
-                    # Для записей из TD просто возвращаем их статус
-                    td_status = row.get('td_status', 'статус неизв.')
-                    return f"В TD ({td_status})"  # Показываем, что запись временная
-                else:
-                    return 'Источник неизв.'
-
-            df_results['Статус БД'] = df_results.apply(map_status, axis=1)
-
-            # --- Выбор и переименование колонок ---
-            display_cols_map = {
-                'id': 'ID',  # Для AccrTable 'id', для TD будет None или temp_id
-                'surname': 'Фамилия',
-                'name': 'Имя',
-                'middle_name': 'Отчество',
-                'birth_date': 'Дата рождения',
-                'organization': 'Организация',
-                'position': 'Должность',
-                'Статус БД': 'Статус БД',
-                'has_notes': 'Прим.',     # <-- Карта для новой колонки
-                'start_accr': 'Начало аккр.',  # <-- Новая карта
-                'end_accr': 'Конец аккр.'
-            }
-            # Используем id из AccrTable, если источник TD, ID будет None
-            df_results['id'] = df_results.apply(lambda row: row['id'] if row['source'] == 'AccrTable' else None, axis=1)
-
-            cols_to_select = [db_col for db_col in display_cols_map.keys() if db_col in df_results.columns]
-            if not cols_to_select:
-                signals.log.emit("В результатах поиска нет ни одной из ожидаемых колонок.", "ERROR")
-                return pd.DataFrame(columns=display_cols_map.values())
-
-            df_display = df_results[cols_to_select].copy()
-            df_display.rename(columns=display_cols_map, inplace=True)
-
-            # --- Форматирование дат ---
-            date_format = '%d.%m.%Y'
-            datetime_format = '%d.%m.%Y %H:%M'
+            # Таблица для показа собирается из колонок rows без их изменения (rows нужны следующим страницам)
+            def column(name, default=None):
+                return rows[name] if name in rows.columns else pd.Series(default, index=rows.index, dtype=object)
+
+            # --- Определение Статус БД (по всем строкам сразу, порядок условий - порядок проверок) ---
+            source = column('source')
+            status = column('accr_status')
+            is_accr = (source == 'AccrTable').to_numpy()
+            # Истинность как в Python (None - ложь), как при проверке значений по одному
+            is_blacklisted = column('black_list', False).to_numpy(dtype=object).astype(bool)
+            has_status = (status.notna() & (status != '')).to_numpy()
+            end_accr = pd.to_datetime(column('end_accr'), utc=True, errors='coerce')
+            has_end = end_accr.notna().to_numpy()
+            now_utc = pd.Timestamp.now(tz='UTC')
+            is_active = has_end & (end_accr > now_utc).to_numpy()
+            status_values = status.to_numpy(dtype=object)
+            td_status = column('td_status', 'статус неизв.').astype(str).to_numpy(dtype=object)
+            db_status = np.select(
+                [is_accr & (status_values == 'в ожидании'),
+                 is_accr & is_blacklisted,
+                 is_accr & is_active,
+                 is_accr & has_status & (status_values == 'отведен'),
+                 is_accr & has_status & (status_values == 'истек срок'),
+                 is_accr & has_status,
+                 is_accr & has_end,
+                 is_accr,
+                 (source == 'TD').to_numpy()],
+                ["В ожидании (Accr)", "В черном списке", "Аккредитован", "Отведен (статус)", "Истек срок",
+                 status.astype(str).to_numpy(dtype=object), "Истек срок (расчет)", 'Неизвестно (Accr)',
+                 "В TD (" + td_status + ")"],  # Для записей из TD - их статус: запись временная
+                'Источник неизв.')
+
+            # --- Форматирование дат (по колонке целиком) ---
             local_tz = self.timezone # Используем таймзону из __init__
 
-            def format_birth_date(dt):
-                if pd.notna(dt):
-                    try:
-                        return pd.to_datetime(dt).strftime(date_format)
-                    except:
-                        return str(dt)
-                return ''
-
-            def format_timestamp_date(dt_val, signals_obj, col_name_log): # Общая функция форматирования
-                if pd.notna(dt_val):
-                    try:
-                        dt_aware = pd.to_datetime(dt_val)
-                        if dt_aware.tzinfo is None or dt_aware.tzinfo.utcoffset(dt_aware) is None:
-                            dt_aware = dt_aware.tz_localize('UTC', ambiguous='NaT', nonexistent='NaT')
-                            if pd.isna(dt_aware): return str(dt_val)
-                        # Для 'Начало аккр.' и 'Конец аккр.' нужен только формат даты
-                        return dt_aware.tz_convert(local_tz).strftime(date_format)
-                    except Exception as e:
-                        signals_obj.log.emit(f"Ошибка форматирования '{col_name_log}': {e} для {dt_val}", "ERROR")
-                        return str(dt_val)
-                return ''
-
-            if 'Дата рождения' in df_display.columns:
-                 df_display['Дата рождения'] = df_display['Дата рождения'].apply(format_birth_date)
-            if 'Начало аккр.' in df_display.columns:
-                 df_display['Начало аккр.'] = df_display['Начало аккр.'].apply(lambda x: format_timestamp_date(x, signals, 'Начало аккр.'))
-                 # print(df_display['Начало аккр.'])
-            if 'Конец аккр.' in df_display.columns:
-                 df_display['Конец аккр.'] = df_display['Конец аккр.'].apply(lambda x: format_timestamp_date(x, signals, 'Конец аккр.'))
-
-
-            # Добавляем недостающие колонки (Статус Проверки, Ошибки Валидации - они не приходят из поиска)
-            if 'Статус Проверки' not in df_display.columns: df_display['Статус Проверки'] = ''
-            if 'Ошибки Валидации' not in df_display.columns: df_display['Ошибки Валидации'] = ''
-            if 'Прим.' not in df_display.columns: df_display['Прим.'] = False  # По умолчанию False, если не пришло
-
-            # Преобразуем bool в строку для колонки "Прим."
-            df_display['Прим.'] = df_display['Прим.'].apply(lambda x: '✓' if x else '')
-
-            # Упорядочиваем колонки
-            final_order = ['ID', 'Фамилия', 'Имя', 'Отчество', 'Дата рождения',
-                           'Организация', 'Должность', 'Статус БД', 'Статус Проверки',
-                           'Ошибки Валидации', 'Прим.', 'Начало аккр.', 'Конец аккр.']
-            # Убедимся, что все колонки из final_order есть в df_display
-            for col in final_order:
-                if col not in df_display.columns:
-                    df_display[col] = ''  # Добавляем пустую, если вдруг отсутствует
-
-            df_display = df_display[final_order]  # Применяем порядок
-
-            signals.log.emit(f"Поиск завершен. Найдено {len(df_display)} записей.", "INFO")
+            def format_dates(values, parsed, col_name_log):
+                """Текст дат ДД.ММ.ГГГГ; значения, которые не удалось разобрать, показываются как есть."""
+                # Одно форматирование на колонку вместо strftime для каждой строки
+                text = pd.Series(parsed.dt.strftime('%d.%m.%Y').to_numpy(dtype=object), index=values.index)
+                failed = values.notna() & parsed.isna()
+                if failed.any():
+                    signals.log.emit(f"Ошибка форматирования '{col_name_log}' для {int(failed.sum())} значений, "
+                                     f"например {values[failed].iloc[0]}", "ERROR")
+                    text[failed] = values[failed].astype(str)
+                return text.where(values.notna(), '')
+
+            birth_date = column('birth_date')
+            start_accr = column('start_accr')
+            # Время начала и конца аккредитации - в местной таймзоне, показывается только дата
+            df_display = pd.DataFrame({
+                # Используем id из AccrTable, если источник TD, ID будет None
+                'ID': column('id').where(is_accr, None),
+                'Фамилия': column('surname', ''),
+                'Имя': column('name', ''),
+                'Отчество': column('middle_name', ''),
+                'Дата рождения': format_dates(birth_date, pd.to_datetime(birth_date, errors='coerce'),
+                                              'Дата рождения'),
+                'Организация': column('organization', ''),
+                'Должность': column('position', ''),
+                'Статус БД': db_status,
+                'Статус Проверки': '',
+                'Ошибки Валидации': '',
+                'Прим.': np.where(column('has_notes', False).to_numpy(dtype=object).astype(bool), '✓', ''),
+                'Начало аккр.': format_dates(
+                    start_accr, pd.to_datetime(start_accr, utc=True, errors='coerce').dt.tz_convert(local_tz),
+                    'Начало аккр.'),
+                'Конец аккр.': format_dates(column('end_accr'), end_accr.dt.tz_convert(local_tz), 'Конец аккр.'),
+            }, index=rows.index)
+
+            signals.log.emit(f"Подготовлено {len(df_display)} строк результата поиска.", "DEBUG")
             return df_display
 
         except Exception as e:
@@ -902,8 +1482,8 @@ class AccreditationApp(QWidget):
             return None  # Возвращаем None при ошибке
 
 
-    def _task_add_to_temporary_db(self, notes_to_add, signals):
-        """Worker: Добавляет отфильтрованные данные в временную таблицу TD."""
+    def _task_add_to_temporary_db(self, notes_to_add, signals, cancel_token):
+        """Worker: Добавляет отфильтрованные данные в временную таблицу TD (при отмене - до текущей записи)."""
         # ... (код метода как в прошлой версии, использует notes_to_add) ...
         # Проверим, что ключ "Примечания" используется правильно
         if self.df_to_add_td.empty:
@@ -913,7 +1493,10 @@ class AccreditationApp(QWidget):
         signals.log.emit(f"Добавление {len(self.df_to_add_td)} записей в TD (с примечанием: '{notes_to_add[:50]}...')...", "INFO")
         added_count = 0
         total_count = len(self.df_to_add_td)
-        for index, row_data in self.df_to_add_td.iterrows():
+        for index, row_data in self.df_to_add_td.to_frame().iterrows():
+             if cancel_token.cancelled:
+                 signals.log.emit(f"Добавление в TD отменено: добавлено {added_count} из {total_count} записей.", "WARNING")
+                 return added_count
              data_dict = row_data.to_dict()
              data_dict['Примечания'] = notes_to_add # Добавляем примечание
 
@@ -943,14 +1526,7 @@ class AccreditationApp(QWidget):
             return "Не выбрана строка для управления черным списком."
 
         # Собираем все доступные данные из строки таблицы
-        person_data = {}
-        headers = [self.dataTable.horizontalHeaderItem(i).text() for i in range(self.dataTable.columnCount())]
-        for col_idx, header in enumerate(headers):
-            item = self.dataTable.item(selected_row_index, col_idx)
-            if item:
-                person_data[header] = item.text() # Сохраняем как текст
-            else:
-                person_data[header] = None
+        person_data = self.tableModel.row_texts(selected_row_index) # Сохраняем как текст
 
         # Преобразуем дату рождения в объект date, если она есть
         if 'Дата рождения' in person_data and person_data['Дата рождения']:
@@ -994,9 +1570,7 @@ class AccreditationApp(QWidget):
         selected_row_index = self.get_selected_row_index() # Используем метод для получения индекса
         person_id = None
         if selected_row_index is not None:
-             person_id_item = self.dataTable.item(selected_row_index, 0)
-             if person_id_item and person_id_item.text().isdigit():
-                  person_id = int(person_id_item.text())
+             person_id = self.tableModel.person_id(selected_row_index)
 
         if person_id is None:
             # Логируем ошибку и возвращаем None или сообщение
@@ -1009,6 +1583,7 @@ class AccreditationApp(QWidget):
 
         signals.log.emit(f"Сохранение примечаний для ID: {person_id}...", "INFO")
         success = self.db_manager.update_notes(person_id, notes)
+        self._remember_saved_notes([person_id], notes if success else None)
 
         if success:
              return {'success': success, 'person_id': person_id}
@@ -1016,164 +1591,255 @@ class AccreditationApp(QWidget):
              return f"Ошибка при сохранении примечаний для ID {person_id}."
 
     # --- НОВАЯ ФОНОВАЯ ЗАДАЧА для файла активации ---
-    def _task_process_activation_file(self, signals):
-        """Worker: Обрабатывает файл активации."""
+    def _task_process_activation_file(self, signals, cancel_token):
+        """
+        Worker: Обрабатывает файл активации.
+        При отмене (cancel_token) обработка останавливается перед следующей строкой: уже внесенные
+        в БД изменения сохраняются, в результате - счетчики обработанных строк.
+        """
         signals.log.emit("Запрос выбора файла активации...", "INFO")
         file_name = self.file_manager.open_file_dialog()
         if not file_name:
             return {'status': 'cancelled', 'message': "Выбор файла активации отменен."}
 
-        signals.log.emit(f"Загрузка данных из файла активации: {os.path.basename(file_name)}...", "INFO")
-        try:
-            df_activation = pd.read_excel(file_name, engine='openpyxl')
-            signals.log.emit(f"Загружено {len(df_activation)} строк из файла активации.", "INFO")
-        except Exception as e:
-            error_msg = f"Ошибка чтения Excel файла активации: {e}"
-            signals.log.emit(error_msg, "ERROR")
-            return {'status': 'error', 'message': error_msg}
-
-        # 1. Очистка данных из файла активации
-        signals.log.emit("Очистка данных из файла активации...", "INFO")
-        df_cleaned = self.processor.clean_dataframe(df_activation)
-        # Здесь можно добавить валидацию дат и обязательных полей для файла активации, если нужно
+        signals.log.emit(f"Потоковая загрузка данных из файла активации: {os.path.basename(file_name)}...", "INFO")
 
         activated_count = 0
         added_td_count = 0
         skipped_count = 0
         error_count = 0
         processed_count = 0
-        total_rows = len(df_cleaned)
-
-        # Сбрасываем предыдущие решения по новым сотрудникам
-        self.new_employee_actions.clear()
 
+        # Файл читается пакетами: строки обрабатываются, не дожидаясь чтения всего файла
+        batches = self.file_manager.iter_input_batches(file_name)
         signals.log.emit("Начало обработки файла активации...", "INFO")
-        for index, row in df_cleaned.iterrows():
-            processed_count += 1
-            signals.progress.emit(int(100 * processed_count / total_rows))
-
-            # Извлекаем данные для поиска и возможного добавления
-            data_dict = row.to_dict()  # Сохраняем всю строку на всякий случай
-            surname = row.get('Фамилия')
-            name = row.get('Имя')
-            middle_name = row.get('Отчество')
-            birth_date = row.get('Дата рождения')
-            custom_date = row.get('Дата проверки')
-
-            # Проверяем минимально необходимые данные
-            if not surname or not name or not birth_date:
-                signals.log.emit(f"Строка {index + 1}: Пропущена из-за отсутствия ФИО или Даты рождения.",
+        while not cancel_token.cancelled:
+            try:
+                df_batch, rows_read, total_rows = next(batches)
+            except StopIteration:
+                break
+            except Exception as e:
+                error_msg = (f"Ошибка чтения файла активации: {e} "
+                             f"(обработано строк до ошибки: {processed_count})")
+                signals.log.emit(error_msg, "ERROR")
+                return {'status': 'error', 'message': error_msg}
+
+            # 1. Очистка данных пакета
+            # Здесь можно добавить валидацию дат и обязательных полей для файла активации, если нужно
+            df_cleaned = self.processor.clean_dataframe(df_batch)
+            progress_total = max(total_rows or rows_read, 1)
+
+            for index, row in df_cleaned.iterrows():
+                if cancel_token.cancelled:
+                    break
+                processed_count += 1
+                signals.progress.emit(min(100, int(100 * processed_count / progress_total)))
+
+                # Извлекаем данные для поиска и возможного добавления
+                data_dict = row.to_dict()  # Сохраняем всю строку на всякий случай
+                surname = row.get('Фамилия')
+                name = row.get('Имя')
+                middle_name = row.get('Отчество')
+                birth_date = row.get('Дата рождения')
+                custom_date = row.get('Дата проверки')
+
+                # Проверяем минимально необходимые данные
+                if not surname or not name or not birth_date:
+                    signals.log.emit(f"Строка {index + 1}: Пропущена из-за отсутствия ФИО или Даты рождения.",
+                                     "WARNING")
+                    skipped_count += 1
+                    continue
+
+                # Пытаемся активировать существующего сотрудника 'в ожидании'
+                success, message, person_id = self.db_manager.activate_person_by_details(
+                    surname, name, middle_name, birth_date, custom_date
+                )
+                signals.log.emit(f"Строка {index + 1}: {success} {message} ID: {person_id}",
                                  "WARNING")
-                skipped_count += 1
-                continue
 
-            # Пытаемся активировать существующего сотрудника 'в ожидании'
-            success, message, person_id = self.db_manager.activate_person_by_details(
-                surname, name, middle_name, birth_date, custom_date
-            )
-            signals.log.emit(f"Строка {index + 1}: {success} {message} ID: {person_id}",
-                             "WARNING")
-
-
-            if success and "успешно активирован" in message:
-
-                activated_count += 1
-                signals.log.emit(f"Строка {index + 1} ({surname} {name}): {message}", "INFO")
-            elif success and "Активация не требуется" in message:
-                # Статус уже не 'в ожидании', просто пропускаем
-                signals.log.emit(f"Строка {index + 1} ({surname} {name}): {message}", "DEBUG")
-                # skipped_count += 1 # Не считаем это пропуском в смысле ошибки
-            elif not success and person_id is None:  # Сотрудник не найден
-                signals.log.emit(f"Строка {index + 1}: {message} Запрос действия у пользователя...", "WARNING")
-                # Запрашиваем действие у пользователя через сигнал
-                # Передаем data_dict, чтобы можно было добавить сотрудника
-                request_data = {
-                    'Фамилия': surname, 'Имя': name, 'Отчество': middle_name,
-                    'Дата рождения': birth_date,
-                    'Место рождения': row.get('Место рождения'),  # Передаем доп. поля
-                    'Регистрация': row.get('Адрес регистрации'),
-                    'Организация': row.get('Организация', 'Не указана'),  # Нужна организация
-                    'Должность': row.get('Должность', 'Не указана'),
-                    'Примечания': row.get('Примечания', '')  # И примечания, если есть в файле
-                }
-                signals.request_new_employee_action.emit(request_data, index)
-                # Ждем ответа пользователя
-                while index not in self.new_employee_actions:
-                    QThread.msleep(100)
-                action = self.new_employee_actions.get(index, 'skip')
-
-                if action == 'activate':
-                    # Добавляем как активный
-                    signals.log.emit(f"Строка {index + 1}: Пользователь выбрал 'Добавить как Активный'.", "INFO")
-                    new_person_id = self.db_manager.add_to_accrtable(request_data, status='аккредитован')
-                    if new_person_id:
-                        # Сразу обновляем mainTable для нового активного
-
-                        now_tz = datetime.now(self.timezone)
-                        if custom_date is not None and not pd.isna(custom_date):
-                            start_date = custom_date + timedelta(days=1)
+
+                if success and "успешно активирован" in message:
+
+                    activated_count += 1
+                    signals.log.emit(f"Строка {index + 1} ({surname} {name}): {message}", "INFO")
+                elif success and "Активация не требуется" in message:
+                    # Статус уже не 'в ожидании', просто пропускаем
+                    signals.log.emit(f"Строка {index + 1} ({surname} {name}): {message}", "DEBUG")
+                    # skipped_count += 1 # Не считаем это пропуском в смысле ошибки
+                elif not success and person_id is None:  # Сотрудник не найден
+                    signals.log.emit(f"Строка {index + 1}: {message} Запрос действия у пользователя...", "WARNING")
+                    # Запрашиваем действие у пользователя через сигнал
+                    # Передаем data_dict, чтобы можно было добавить сотрудника
+                    request_data = {
+                        'Фамилия': surname, 'Имя': name, 'Отчество': middle_name,
+                        'Дата рождения': birth_date,
+                        'Место рождения': row.get('Место рождения'),  # Передаем доп. поля
+                        'Регистрация': row.get('Адрес регистрации'),
+                        'Организация': row.get('Организация', 'Не указана'),  # Нужна организация
+                        'Должность': row.get('Должность', 'Не указана'),
+                        'Примечания': row.get('Примечания', '')  # И примечания, если есть в файле
+                    }
+                    # Задача приостанавливается до ответа пользователя, не занимая поток пула
+                    action = yield AwaitUser('new_employee', {'data': request_data, 'index': index})
+                    action = action or 'skip'
+
+                    if action == 'activate':
+                        # Добавляем как активный
+                        signals.log.emit(f"Строка {index + 1}: Пользователь выбрал 'Добавить как Активный'.", "INFO")
+                        new_person_id = self.db_manager.add_to_accrtable(request_data, status='аккредитован')
+                        if new_person_id:
+                            # Сразу обновляем mainTable для нового активного
+
+                            now_tz = datetime.now(self.timezone)
+                            if custom_date is not None and not pd.isna(custom_date):
+                                start_date = custom_date + timedelta(days=1)
+                            else:
+                                start_date = now_tz
+                            end_accr = start_date + timedelta(days=180)
+                            query_main = """
+                                INSERT INTO mainTable (person_id, start_accr, end_accr, black_list, last_checked)
+                                VALUES (%s, %s, %s, FALSE, %s);
+                             """
+                            self.db_manager.execute_query(query_main, (new_person_id, start_date, end_accr, now_tz),
+                                                          commit=True)
+                            self.db_manager.log_transaction(new_person_id, 'Добавлен и Активирован (файл)')
+                            activated_count += 1
                         else:
-                            start_date = now_tz
-                        end_accr = start_date + timedelta(days=180)
-                        query_main = """
-                            INSERT INTO mainTable (person_id, start_accr, end_accr, black_list, last_checked)
-                            VALUES (%s, %s, %s, FALSE, %s);
-                         """
-                        self.db_manager.execute_query(query_main, (new_person_id, start_date, end_accr, now_tz),
-                                                      commit=True)
-                        self.db_manager.log_transaction(new_person_id, 'Добавлен и Активирован (файл)')
-                        activated_count += 1
-                    else:
-                        signals.log.emit(f"Строка {index + 1}: Ошибка добавления нового активного сотрудника.",
-                                         "ERROR")
-                        error_count += 1
-                elif action == 'add_to_td':
-                    # Добавляем в TD
-                    signals.log.emit(f"Строка {index + 1}: Пользователь выбрал 'Добавить в TD'.", "INFO")
-                    td_id = self.db_manager.add_to_td(request_data)
-                    if td_id:
-                        added_td_count += 1
-                    else:
-                        signals.log.emit(f"Строка {index + 1}: Ошибка добавления нового сотрудника в TD.", "ERROR")
-                        error_count += 1
-                else:  # action == 'skip'
-                    signals.log.emit(f"Строка {index + 1}: Сотрудник пропущен по выбору пользователя.", "INFO")
-                    skipped_count += 1
+                            signals.log.emit(f"Строка {index + 1}: Ошибка добавления нового активного сотрудника.",
+                                             "ERROR")
+                            error_count += 1
+                    elif action == 'add_to_td':
+                        # Добавляем в TD
+                        signals.log.emit(f"Строка {index + 1}: Пользователь выбрал 'Добавить в TD'.", "INFO")
+                        td_id = self.db_manager.add_to_td(request_data)
+                        if td_id:
+                            added_td_count += 1
+                        else:
+                            signals.log.emit(f"Строка {index + 1}: Ошибка добавления нового сотрудника в TD.", "ERROR")
+                            error_count += 1
+                    else:  # action == 'skip'
+                        signals.log.emit(f"Строка {index + 1}: Сотрудник пропущен по выбору пользователя.", "INFO")
+                        skipped_count += 1
 
-            else:  # Ошибка активации для существующего сотрудника
-                signals.log.emit(f"Строка {index + 1} ({surname} {name}): Ошибка активации - {message}", "ERROR")
-                error_count += 1
+                else:  # Ошибка активации для существующего сотрудника
+                    signals.log.emit(f"Строка {index + 1} ({surname} {name}): Ошибка активации - {message}", "ERROR")
+                    error_count += 1
 
         signals.progress.emit(100)
-        summary_message = f"Обработка файла активации завершена. Успешно активировано: {activated_count}, Добавлено в TD: {added_td_count}, Пропущено: {skipped_count}, Ошибок: {error_count}."
+        summary_message = f"Обработка файла активации {'отменена после строки ' + str(processed_count) if cancel_token.cancelled else 'завершена'}. Успешно активировано: {activated_count}, Добавлено в TD: {added_td_count}, Пропущено: {skipped_count}, Ошибок: {error_count}."
         signals.log.emit(summary_message, "INFO")
-        return {'status': 'completed', 'message': summary_message, 'activated': activated_count,
+        return {'status': 'cancelled' if cancel_token.cancelled else 'completed', 'message': summary_message, 'activated': activated_count,
                 'added_td': added_td_count, 'skipped': skipped_count, 'errors': error_count}
 
     # --- Методы для запуска фоновых задач ---
 
     def run_task_in_background(self, task_function, on_finished_slot, *args, **kwargs):
-        """Универсальный метод для запуска задачи в фоновом потоке."""
+        """
+        Универсальный метод для запуска задачи в фоновом потоке. Возвращает Worker задачи.
+        Задачи, принимающие cancel_token, можно остановить кнопкой "Отменить".
+        """
         self.logMessage(f"Запуск задачи '{task_function.__name__}'...", "INFO")
         # Блокируем кнопки на время выполнения? (Опционально)
         # self.set_controls_enabled(False)
 
         worker = Worker(task_function, *args, **kwargs)
+        worker.thread_pool = self.thread_pool # Приостановленные задачи продолжаются в том же пуле
         worker.signals.finished.connect(on_finished_slot)
         worker.signals.error.connect(lambda e: self.logMessage(f"Критическая ошибка в задаче: {e}", "CRITICAL"))
-        worker.signals.progress.connect(self.update_progress) # Подключаем прогресс
-        worker.signals.log.connect(self.logMessage) # Подключаем логирование из потока
-        worker.signals.request_confirmation.connect(self.handle_confirmation_request) # Подключаем запрос подтверждения
-        worker.signals.request_new_employee_action.connect(self.handle_new_employee_action_request)
+        # Прогресс и логи складываются в буфер MessageBus прямо в потоке задачи
+        worker.signals.progress.connect(self.message_bus.post_progress, Qt.DirectConnection)
+        worker.signals.log.connect(self.logMessage, Qt.DirectConnection)
+        worker.signals.await_user.connect(self.handle_user_request) # Запросы ответа пользователя из задачи
+        worker.signals.partial_result.connect(self.appendTableRows) # Промежуточные результаты потоковой обработки
+        if worker.cancellable:
+            token = worker.cancel_token
+            self._task_cancel_tokens.append(token)
+            for signal in (worker.signals.finished, worker.signals.error, worker.signals.cancelled):
+                signal.connect(lambda *args, token=token: self._forget_cancel_token(token))
+            self.btnCancelTask.setEnabled(True)
 
         # Добавляем задачу в пул потоков
         self.thread_pool.start(worker)
+        return worker
+
+    def cancel_running_tasks(self):
+        """Отменяет выполняющиеся отменяемые задачи: они останавливаются в ближайшей контрольной точке."""
+        if not self._task_cancel_tokens:
+            return
+        self.logMessage(f"Отмена выполняющихся задач ({len(self._task_cancel_tokens)})...", "WARNING")
+        for token in list(self._task_cancel_tokens):
+            token.cancel()
+        self.btnCancelTask.setEnabled(False)
+
+    def _forget_cancel_token(self, token):
+        if token in self._task_cancel_tokens:
+            self._task_cancel_tokens.remove(token)
+        self.btnCancelTask.setEnabled(any(not t.cancelled for t in self._task_cancel_tokens))
 
     def run_load_and_process_file(self):
-        self.run_task_in_background(self._task_load_and_process_file, self.handle_load_and_process_result)
+        self._cancel_search() # Таблица будет занята результатами файла
+        self._search_state = None
+        worker = self.run_task_in_background(self._task_load_and_process_file, self.handle_load_and_process_result)
+        # Строки отмененной загрузки, уже показанные по мере обработки, из таблицы убираются
+        worker.signals.cancelled.connect(self.tableModel.clear)
+
+    def on_search_text_edited(self, text):
+        """Перезапускает отложенный поиск при каждом изменении текста пользователем."""
+        self.searchTimer.start()
 
     def run_search_people(self):
-         self.run_task_in_background(self._task_search_people, self.handle_search_result)
+        """Поиск по кнопке, Enter или обновлению таблицы: сразу и всегда в БД."""
+        self.searchTimer.stop()
+        self._start_search(allow_local=False)
+
+    def _new_search_query(self):
+        """Новый отменяемый запрос текущего поиска (отменяется при следующем поиске)."""
+        query_handle = CancellableQuery()
+        self._search_queries = [handle for handle in self._search_queries if not handle.cancelled] + [query_handle]
+        return query_handle
+
+    def _cancel_search(self):
+        """Делает результаты текущего поиска устаревшими и отменяет его запросы к БД."""
+        self._search_request_id += 1
+        for query_handle in self._search_queries:
+            query_handle.cancel()
+        self._search_queries = []
+        self.searchCountLabel.setText("")
+
+    def _first_search_page_size(self):
+        """Первая страница поиска - вдвое больше числа строк, помещающихся в таблице (не больше SEARCH_PAGE_SIZE)."""
+        row_height = max(1, self.dataTable.verticalHeader().defaultSectionSize())
+        visible_rows = self.dataTable.viewport().height() // row_height + 1
+        return max(1, min(self.search_config['page_size'], visible_rows * 2))
+
+    def _start_search(self, allow_local):
+        """Запускает поиск с новым номером запроса, отменяя выполняющиеся в БД запросы предыдущего поиска."""
+        search_term = self.searchEdit.text().strip()
+        # Для фильтрации без БД годится только полностью загруженный результат предыдущего поиска
+        previous = self._search_state if allow_local and self._search_state and self._search_state['complete'] else None
+        self._cancel_search()
+        if allow_local and not search_term:
+            # Поле очищено при вводе - просто очищаем таблицу, без запроса и предупреждения
+            self._search_state = None
+            self.tableModel.clear()
+            return
+        self._search_state = {'term': search_term, 'rows': None, 'complete': False, 'loading': True}
+        self.tableModel.set_more_available(False)
+        self.run_task_in_background(self._task_search_people, self.handle_search_result,
+                                    self._search_request_id, search_term, previous, self._new_search_query(),
+                                    self._first_search_page_size())
+
+    def run_fetch_search_page(self):
+        """Загружает следующую страницу результата поиска (таблица прокручена до конца)."""
+        state = self._search_state
+        if state is None or state['loading'] or state['complete'] or state['rows'] is None or state['rows'].empty:
+            return
+        state['loading'] = True
+        last = state['rows'].iloc[-1]
+        after = (last['surname'], last['name'], last['row_id'], last['source'])
+        self.run_task_in_background(self._task_search_people, self.handle_search_page_result,
+                                    self._search_request_id, state['term'], None, self._new_search_query(),
+                                    self.search_config['page_size'], after)
 
     def run_manage_blacklist(self):
          self.run_task_in_background(self._task_manage_blacklist, self.handle_manage_blacklist_result)
@@ -1184,10 +1850,7 @@ class AccreditationApp(QWidget):
 
         if selected_row_index is not None:
             # --- Случай 1: Строка выбрана ---
-            person_id = None
-            person_id_item = self.dataTable.item(selected_row_index, 0)
-            if person_id_item and person_id_item.text().isdigit():
-                person_id = int(person_id_item.text())
+            person_id = self.tableModel.person_id(selected_row_index)
 
             if person_id is None:
                 QMessageBox.warning(self, "Ошибка", "Не найден ID сотрудника в выбранной строке для сохранения примечания.")
@@ -1204,13 +1867,7 @@ class AccreditationApp(QWidget):
                  return
 
             # Получаем ID всех видимых строк с валидным ID AccrTable
-            visible_ids = []
-            for row in range(self.dataTable.rowCount()):
-                 # Проверяем, видима ли строка (если используется фильтрация/скрытие - пока нет)
-                 # if not self.dataTable.isRowHidden(row): # Раскомментировать, если будет фильтрация
-                 id_item = self.dataTable.item(row, 0) # Колонка ID
-                 if id_item and id_item.text().isdigit():
-                     visible_ids.append(int(id_item.text()))
+            visible_ids = self.resultsProxy.person_ids() # Только строки, оставшиеся после фильтров
 
             if not visible_ids:
                  QMessageBox.warning(self, "Нет данных", "В таблице нет сотрудников с ID из основной базы данных, для которых можно было бы сохранить примечание.")
@@ -1228,18 +1885,38 @@ class AccreditationApp(QWidget):
             else:
                  self.logMessage("Массовое сохранение примечаний отменено.", "INFO")
 
+    def _task_fetch_notes(self, person_ids, generation, request_id=None):
+        """
+        Worker: Загружает примечания сотрудников одним запросом и сохраняет их в кэш
+        (если после запуска запроса примечания не сохранялись - поколение кэша generation).
+        """
+        notes = self.db_manager.get_notes_batch(person_ids)
+        if notes is not None:
+            self.notes_cache.store(notes, generation)
+        return {'notes': notes, 'person_ids': person_ids, 'request_id': request_id}
+
+    def _remember_saved_notes(self, person_ids, notes=None):
+        """
+        Сбрасывает кэш примечаний сотрудников после сохранения (в том числе неудачного).
+        Если сохраненный текст известен (notes), он сразу кладется в кэш.
+        """
+        self.notes_cache.invalidate(person_ids)
+        if notes is not None:
+            self.notes_cache.store(dict.fromkeys(person_ids, notes), self.notes_cache.generation)
+
     # --- Старая фоновая задача (теперь для одного) ---
     def _task_save_notes_for_one(self, person_id, notes, signals):
         """Worker: Сохраняет примечания для ОДНОГО выбранного сотрудника."""
         signals.log.emit(f"Сохранение примечаний для ID: {person_id}...", "INFO")
         success = self.db_manager.update_notes(person_id, notes)
+        self._remember_saved_notes([person_id], notes if success else None)
         message = "Примечания успешно сохранены." if success else "Ошибка при сохранении примечаний."
         return {'success': success, 'person_id': person_id, 'message': message}
 
         # --- НОВАЯ фоновая задача (для многих) ---
 
-    def _task_save_notes_for_many(self, person_ids, notes, signals):
-        """Worker: Сохраняет ОДНО примечание для СПИСКА сотрудников."""
+    def _task_save_notes_for_many(self, person_ids, notes, signals, cancel_token):
+        """Worker: Сохраняет ОДНО примечание для СПИСКА сотрудников (при отмене - до текущего ID)."""
         if not person_ids:
             return {'success': False, 'count': 0, 'message': "Список ID пуст."}
 
@@ -1247,24 +1924,30 @@ class AccreditationApp(QWidget):
         success_count = 0
         total_count = len(person_ids)
         errors = []
+        saved_ids = []
 
         for i, person_id in enumerate(person_ids):
+            if cancel_token.cancelled:
+                errors.insert(0, f"Отменено пользователем после {i} из {total_count} ID.")
+                break
             try:
                 success = self.db_manager.update_notes(person_id, notes)
                 if success:
                     success_count += 1
+                    saved_ids.append(person_id)
                 else:
                     errors.append(f"ID {person_id}: Не удалось сохранить")
             except Exception as e:
                 errors.append(f"ID {person_id}: Ошибка - {e}")
             signals.progress.emit(int(100 * (i + 1) / total_count))
+        self._remember_saved_notes(person_ids)
 
         signals.progress.emit(100)
         message = f"Массовое сохранение завершено. Успешно: {success_count}/{total_count}."
         if errors:
             message += f"\nОшибки:\n" + "\n".join(errors[:5])  # Показываем первые 5 ошибок
         return {'success': success_count == total_count, 'count': success_count, 'total': total_count,
-                'message': message}
+                'saved_ids': saved_ids, 'message': message}
 
     def handle_save_notes_mass_result(self, result):
         """Обработка результата МАССОВОГО сохранения примечаний."""
@@ -1274,11 +1957,11 @@ class AccreditationApp(QWidget):
         message = result.get('message', 'Неизвестный результат.')
 
         self.logMessage(message, "INFO" if success else "WARNING")
+        # Отметка 'Прим.' ставится в загруженных строках, без повторного поиска
+        if result.get('saved_ids'):
+            self.tableModel.set_value_for_ids(result['saved_ids'], 'Прим.', '✓')
         if success:
             QMessageBox.information(self, "Успешно", message)
-            # Обновляем индикаторы для всех обработанных строк?
-            # Это может быть медленно, возможно, проще перезагрузить поиск
-            self.refresh_current_view()  # Метод для обновления таблицы
         else:
             QMessageBox.warning(self, "Завершено с ошибками", message)
         self.task_finished_signal.emit("Сохранение примечаний (массовое)")
@@ -1286,110 +1969,29 @@ class AccreditationApp(QWidget):
     # --- Вспомогательные методы GUI ---
 
     def get_selected_row_index(self):
-        """Возвращает индекс выделенной строки или None."""
-        selected_items = self.dataTable.selectedItems()
-        if selected_items:
-            return selected_items[0].row()
+        """Возвращает номер выделенной строки в модели результатов (tableModel) или None."""
+        selected_rows = self.dataTable.selectionModel().selectedRows()
+        if selected_rows:
+            return self.resultsProxy.source_row(selected_rows[0].row())
         return None
 
     def displayTable(self, df_display):
-        """Отображает DataFrame в QTableWidget."""
+        """Отображает DataFrame в таблице (модель хранит колонки, ячейки форматируются при отрисовке)."""
          # Проверка, что вызывается из основного потока
         if QApplication.instance().thread() != QThread.currentThread():
             self.update_table_signal.emit(df_display) # Перенаправляем в основной поток
             return
 
-        self.dataTable.setRowCount(0) # Очищаем таблицу перед заполнением
         if df_display is None or df_display.empty:
+             self.tableModel.clear() # Очищаем таблицу
              self.logMessage("Нет данных для отображения в таблице.", "INFO")
              return
 
         self.logMessage(f"Отображение {len(df_display)} строк в таблице...", "DEBUG")
-        self.dataTable.setRowCount(len(df_display))
-
-        # Определение порядка колонок для отображения
-        display_columns = ['ID', 'Фамилия', 'Имя', 'Отчество', 'Дата рождения',
-                           'Организация', 'Должность', 'Статус БД', 'Статус Проверки',
-                           'Ошибки Валидации', 'Прим.', 'Начало аккр.', 'Конец аккр.']
-
-        status_colors = {
-            "Ранее отведен": QColor("salmon"),
-            "В черном списке": QColor("salmon"),
-            "Активен": QColor("lightgreen"),
-            "Аккредитован": QColor("lightgreen"),
-            "На проверку": QColor("lightblue"),
-            "В ожидании": QColor("lightblue"),
-            "Истек срок": QColor("lightcoral"),
-            "НЕ ПОДТВЕРЖДЕНО": QColor("yellow"),
-            "Ошибка": QColor("orangered"),
-        }
-
-        for row_idx, (index, row_data) in enumerate(df_display.iterrows()):
-            for col_idx, col_name in enumerate(display_columns):
-                value = row_data.get(col_name)  # Используем get для безопасности
-                if col_name in row_data:
-                     value = row_data[col_name]
-                     # --- Преобразование перед отображением ---
-                     if pd.isna(value):
-                         display_value = ""
-                     elif col_name == 'ID' and not isinstance(value,
-                                                              (int, float)):  # Если ID не число (напр. "N/A (TD)")
-                         display_value = str(value)
-                     elif col_name == 'ID':  # ID числовой
-                         display_value = str(int(value))  # Преобразуем float ID (если вдруг) в int строку
-                     elif col_name in ['Дата рождения', 'Начало аккр.', 'Конец аккр.']:
-                         # Даты уже должны быть строками после _task_search_people
-                         # Но на всякий случай проверим
-                         if isinstance(value, (date, datetime)):
-                             try:
-                                 if col_name == 'Дата рождения' or col_name == 'Конец аккр.':
-                                     display_value = value.strftime('%d.%m.%Y')
-                                 else:  # Начало аккр.
-                                     display_value = value.strftime('%d.%m.%Y %H:%M')
-                             except:
-                                 display_value = str(value)  # Если ошибка форматирования
-                         else:
-                             display_value = str(value)  # Если пришло не датой
-                     else:
-                         display_value = str(value)
-
-                     item = QTableWidgetItem(display_value)
-
-                     # Раскраска статусов и ошибок
-                     cell_color = None
-                     if col_name == 'Статус Проверки':
-                         for status, color in status_colors.items():
-                             if status.lower() in display_value.lower():
-                                 cell_color = color
-                                 break
-                     elif col_name == 'Статус БД':
-                          for status, color in status_colors.items():
-                             if status.lower() in display_value.lower():
-                                 cell_color = color
-                                 break
-                     elif col_name == 'Validation_Errors' and display_value:
-                          cell_color = status_colors.get("Ошибка", QColor("orangered"))
-                          if "НЕ ПОДТВЕРЖДЕНО" in display_value:
-                               cell_color = status_colors.get("НЕ ПОДТВЕРЖДЕНО", QColor("yellow"))
-
-
-                     if cell_color:
-                          item.setBackground(QBrush(cell_color))
-                          # Делаем текст черным для светлых фонов для лучшей читаемости
-                          if cell_color.lightness() > 180:
-                               item.setForeground(QBrush(QColor("black")))
-
-                        # Выравнивание по центру для колонки "Прим."
-                     if col_name == 'Прим.':
-                        item.setTextAlignment(Qt.AlignCenter)
-
-
-                     self.dataTable.setItem(row_idx, col_idx, item)
-                else:
-                    self.dataTable.setItem(row_idx, col_idx, QTableWidgetItem("")) # Пустая ячейка, если колонки нет
+        self.tableModel.set_frame(df_display)
+        self.dataTable.scrollToTop()
 
         self.update_column_visibility(df_display) # <--- Вызов метода
-        self.dataTable.resizeColumnsToContents() # Подгонка ширины колонок - может быть медленно
 
         self.logMessage("Таблица обновлена.", "DEBUG")
         # Очищаем поле примечаний при обновлении таблицы
@@ -1398,6 +2000,16 @@ class AccreditationApp(QWidget):
         self.btnSaveNotes.setEnabled(False)
 
 
+    def appendTableRows(self, df_rows, reset=False):
+        """Добавляет строки в конец таблицы (промежуточные результаты потоковой обработки файла)."""
+        if reset:
+            self.tableModel.clear()
+        if df_rows is None or df_rows.empty:
+            return
+        self.tableModel.append_frame(df_rows)
+        if reset:
+            self.update_column_visibility(df_rows)
+
     def save_generated_reports(self):
         """Сохраняет отчеты, сгенерированные после проверки файла."""
         if not self.current_reports:
@@ -1408,25 +2020,29 @@ class AccreditationApp(QWidget):
 
         # --- Метод on_table_selection_changed теперь только загружает и управляет кнопкой "Сохранить (выбранному)" ---
     def on_table_selection_changed(self):
-        selected_rows = self.dataTable.selectionModel().selectedRows()
+        selected_row_index = self.get_selected_row_index()
+        self._notes_request_id += 1  # Ответ на запрос примечаний ранее выбранной строки будет отброшен
         person_id = None
         can_save_to_selected_accr = False
 
-        if selected_rows:
-            selected_row_index = selected_rows[0].row()
-            person_id_item = self.dataTable.item(selected_row_index, 0)
+        if selected_row_index is not None:
+            person_id = self.tableModel.person_id(selected_row_index)
 
-            if person_id_item and person_id_item.text().isdigit():
-                person_id = int(person_id_item.text())
+            if person_id is not None:
                 can_save_to_selected_accr = True
-                self.logMessage(f"Выбрана строка с ID: {person_id}. Загрузка примечаний...", "DEBUG")
-                self.notesEdit.setPlaceholderText("Загрузка примечаний...")
-                self.notesEdit.clear()
-                self.notesEdit.setReadOnly(True)
-                worker = Worker(self.db_manager.get_notes, person_id)
-                worker.signals.finished.connect(self.update_notes_signal.emit)  # Используем общий сигнал
-                worker.signals.error.connect(lambda e: self.logMessage(f"Ошибка загрузки примечаний: {e}", "ERROR"))
-                self.thread_pool.start(worker)
+                notes = self.notes_cache.get(person_id)
+                if notes is not None:
+                    self.displayNotes(notes)  # Примечания уже загружены вместе с видимыми строками
+                else:
+                    self.logMessage(f"Выбрана строка с ID: {person_id}. Загрузка примечаний...", "DEBUG")
+                    self.notesEdit.setPlaceholderText("Загрузка примечаний...")
+                    self.notesEdit.clear()
+                    self.notesEdit.setReadOnly(True)
+                    worker = Worker(self._task_fetch_notes, [person_id], self.notes_cache.generation,
+                                    request_id=self._notes_request_id)
+                    worker.signals.finished.connect(self.handle_selected_notes_result)
+                    worker.signals.error.connect(lambda e: self.logMessage(f"Ошибка загрузки примечаний: {e}", "ERROR"))
+                    self.thread_pool.start(worker)
             else:
                 self.notesEdit.setPlaceholderText(
                     "Нет ID в БД. Примечания не загружены. Можно ввести общие примечания.")
@@ -1448,28 +2064,68 @@ class AccreditationApp(QWidget):
         self.notesEdit.setPlaceholderText("Редактируйте примечания здесь...")
         # Кнопка "Сохранить (выбранному)" уже управляется из on_table_selection_changed
 
-    @pyqtSlot(str, int)
-    def handle_confirmation_request(self, message, row_index):
-        """Обрабатывает запрос на подтверждение данных от пользователя (в основном потоке)."""
-        dialog = ConfirmationDialog(message, self)
-        confirmed = dialog.exec_() == QDialog.Accepted and dialog.is_confirmed()
-        self.user_confirmations[row_index] = confirmed # Сохраняем результат
-        self.logMessage(f"Пользователь {'подтвердил' if confirmed else 'не подтвердил'} данные для строки {row_index+1}", "INFO")
+    def handle_selected_notes_result(self, result):
+        """Показывает примечания выбранной строки, если за время запроса не была выбрана другая."""
+        if result['request_id'] != self._notes_request_id:
+            return
+        if result['notes'] is None:
+            self.logMessage("Ошибка загрузки примечаний из БД.", "ERROR")
+            self.displayNotes("")
+            return
+        self.displayNotes(result['notes'].get(result['person_ids'][0], ""))
+
+    def visible_person_ids(self, margin=0):
+        """ID сотрудников в видимых строках таблицы и в margin строках выше и ниже них."""
+        row_count = self.resultsProxy.rowCount()
+        if not row_count:
+            return []
+        first = self.dataTable.rowAt(0)
+        last = self.dataTable.rowAt(self.dataTable.viewport().height() - 1)
+        first = 0 if first < 0 else first
+        last = row_count - 1 if last < 0 else last
+        person_ids = (self.tableModel.person_id(self.resultsProxy.source_row(row))
+                      for row in range(max(0, first - margin), min(row_count, last + margin + 1)))
+        return [person_id for person_id in person_ids if person_id is not None]
+
+    def prefetch_visible_notes(self):
+        """Загружает одним запросом примечания видимых строк (и соседних), которых еще нет в кэше."""
+        if not self.notes_cache.max_entries:
+            return
+        if self._notes_prefetch_running:
+            self._notes_prefetch_pending = True  # Повторим после завершения текущего запроса
+            return
+        person_ids = self.notes_cache.missing(self.visible_person_ids(self.notes_cache_config['prefetch_rows']))
+        if not person_ids:
+            return
+        self._notes_prefetch_running = True
+        worker = Worker(self._task_fetch_notes, person_ids, self.notes_cache.generation)
+        worker.signals.finished.connect(self._finish_notes_prefetch)
+        worker.signals.error.connect(self._finish_notes_prefetch)
+        self.thread_pool.start(worker)
+
+    def _finish_notes_prefetch(self, _result=None):
+        self._notes_prefetch_running = False
+        if self._notes_prefetch_pending:
+            self._notes_prefetch_pending = False
+            self.notesPrefetchTimer.start()
+
+    def handle_name_review_request(self, request):
+        """Показывает окно проверки необычных ФИО (в основном потоке) и передает решения приостановленной задаче."""
+        rows = request.payload['rows']
+        accepted = set()
+        try:
+            dialog = NameReviewDialog(rows, request.payload['rule_descriptions'], self)
+            dialog.exec_()
+            accepted = dialog.accepted_indices()
+        finally:
+            # Задача продолжается в любом случае: при ошибке окна все строки считаются неподтвержденными
+            request.resolve(accepted)
+        self.logMessage(f"Проверка ФИО: подтверждено {len(accepted)} из {len(rows)} строк.", "INFO")
 
 
     def update_progress(self, value):
-        """Обновляет индикатор прогресса (можно добавить QProgressBar)."""
-        # Пока просто логируем
-        self.logMessage(f"Прогресс задачи: {value}%", "DEBUG")
-        # Пример с QProgressDialog (требует доработки управления им):
-        # if not hasattr(self, 'progress_dialog'):
-        #     self.progress_dialog = QProgressDialog("Выполнение операции...", "Отмена", 0, 100, self)
-        #     self.progress_dialog.setWindowModality(Qt.WindowModal)
-        #     self.progress_dialog.setAutoClose(True)
-        #     self.progress_dialog.setAutoReset(True)
-        # self.progress_dialog.setValue(value)
-        # if value == 100:
-        #      self.progress_dialog.reset()
+        """Обновляет индикатор прогресса (значения приходят не чаще PROGRESS_MAX_PER_SEC раз в секунду)."""
+        self.progressBar.setValue(value)
 
         # --- Слоты для обработки активации ---
     def handle_set_active_result(self, result):
@@ -1482,11 +2138,8 @@ class AccreditationApp(QWidget):
             self.logMessage(message, "INFO")
             # Обновляем статус в таблице UI
             if row_index is not None:
-                status_item = QTableWidgetItem("Аккредитован")
-                status_item.setBackground(QBrush(QColor("lightgreen")))
-                status_item.setForeground(QBrush(QColor("black")))
-                self.dataTable.setItem(row_index, 7, status_item)  # Колонка 'Статус БД'
-                self.dataTable.setItem(row_index, 8, QTableWidgetItem("Аккредитован"))  # Колонка 'Статус Проверки'
+                self.tableModel.set_value(row_index, 'Статус БД', "Аккредитован")
+                self.tableModel.set_value(row_index, 'Статус Проверки', "Аккредитован")
         else:
             self.logMessage(f"Ошибка активации для ID {person_id}: {message}", "ERROR")
             QMessageBox.warning(self, "Ошибка активации", message)
@@ -1562,9 +2215,7 @@ class AccreditationApp(QWidget):
         selected_row_index = self.get_selected_row_index()
         person_id = None
         if selected_row_index is not None:
-            person_id_item = self.dataTable.item(selected_row_index, 0)  # Колонка ID
-            if person_id_item and person_id_item.text().isdigit():
-                person_id = int(person_id_item.text())
+            person_id = self.tableModel.person_id(selected_row_index)
 
         if person_id is None:
             QMessageBox.warning(self, "Ошибка", "Выберите строку с сотрудником (с ID), чтобы посмотреть историю.")
@@ -1582,12 +2233,16 @@ class AccreditationApp(QWidget):
 
         if reply == QMessageBox.Yes:
             self.logMessage("Начало закрытия фоновых задач UI...", "INFO")
+            # Отменяемые задачи останавливаются в ближайшей контрольной точке, а не работают до конца ожидания
+            self.cancel_running_tasks()
             # Даем задачам ограниченное время на завершение
             if not self.thread_pool.waitForDone(5000):  # Ждем 5 секунд
                 self.logMessage("Не все фоновые задачи UI завершились за 5 секунд. Возможны активные задачи.",
                                 "WARNING")
             else:
                 self.logMessage("Все фоновые задачи UI завершены.", "INFO")
+            # Останавливаем пул процессов обработки файлов
+            self.processing_executor.shutdown()
 
             # Сигнал для основного потока main.py, что можно начинать закрытие
             # (если закрытие пула БД и планировщика происходит в main.py)